@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+SILHOUETTE SEARCH - Benchmark de Arranque en Frío
+=============================================
+
+Arranca el servidor en un subproceso (uvicorn) con cada modo de
+BROWSER_STARTUP y mide el tiempo hasta que /healthz responde (el proceso
+atiende tráfico) y hasta que /readyz devuelve 200. Informa también el tiempo
+de importar chroma_agent.server en un intérprete limpio.
+
+Uso:
+    python benchmarks/bench_cold_start.py --runs 5 --modes eager background lazy
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import statistics
+import urllib.request
+import urllib.error
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def import_seconds() -> float:
+    code = "import time; t = time.perf_counter(); import chroma_agent.server; print(time.perf_counter() - t)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def cold_start(mode: str, timeout: float, require_browser: bool):
+    """(segundos hasta /healthz, segundos hasta /readyz o None)"""
+    port = free_port()
+    env = {**os.environ, "BROWSER_STARTUP": mode, "READYZ_REQUIRE_BROWSER": str(require_browser).lower()}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "chroma_agent.server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{port}"
+    live = ready = None
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and ready is None:
+            if live is None and status(f"{base}/healthz") == 200:
+                live = time.perf_counter() - started
+            if live is not None and status(f"{base}/readyz") == 200:
+                ready = time.perf_counter() - started
+            time.sleep(0.01)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return live, ready
+
+
+def summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return "   n/d"
+    return f"{statistics.median(values) * 1000:6.0f} ms (min {min(values) * 1000:.0f})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", default=["eager", "background", "lazy"])
+    parser.add_argument("--timeout", type=float, default=60, help="segundos máximos por arranque")
+    parser.add_argument("--require-browser", action="store_true", help="/readyz espera a Chromium")
+    args = parser.parse_args()
+
+    imports = [import_seconds() for _ in range(args.runs)]
+    print(f"Importar chroma_agent.server: {summary(imports)}")
+
+    for mode in args.modes:
+        results = [cold_start(mode, args.timeout, args.require_browser) for _ in range(args.runs)]
+        print(f"{mode:>10}: /healthz {summary([r[0] for r in results])}  /readyz {summary([r[1] for r in results])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+SILHOUETTE SEARCH - Benchmark de Deduplicación Perceptual
+====================================================
+
+Genera imágenes sintéticas (con un porcentaje de copias ligeramente
+alteradas: ruido, brillo, recorte) y mide por separado la decodificación
+JPEG con Pillow y el cálculo vectorizado de hashes, puntuaciones y
+deduplicación. Informa imágenes/s y la precisión de la detección.
+
+Uso:
+    python benchmarks/bench_image_dedup.py --images 5000 --duplicates 0.2
+"""
+import io
+import sys
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chroma_agent.image_dedup import GRID, PIL_AVAILABLE, compute_features, decode_grid, deduplicate
+
+
+def synthetic_images(count: int, duplicate_ratio: float, seed: int = 7):
+    """Imágenes suaves aleatorias; las duplicadas son variaciones de una original"""
+    rng = np.random.default_rng(seed)
+    originals = int(count * (1 - duplicate_ratio))
+    base = rng.normal(128, 60, size=(originals, 8, 8))
+    # Interpolación a 128x128 para tener estructura de baja frecuencia
+    images = np.kron(base, np.ones((16, 16)))
+    images += rng.normal(0, 10, size=images.shape)
+    sources = rng.integers(0, originals, size=count - originals)
+    copies = images[sources] * rng.uniform(0.9, 1.1, size=(len(sources), 1, 1)) + rng.normal(0, 6, size=(len(sources), 128, 128))
+    copies = np.roll(copies, rng.integers(-2, 3), axis=2)
+    labels = np.concatenate([np.arange(originals), sources])
+    return np.clip(np.concatenate([images, copies]), 0, 255).astype(np.uint8), labels
+
+
+def to_jpeg(pixels: np.ndarray) -> bytes:
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="fracción de copias alteradas")
+    parser.add_argument("--workers", type=int, default=8, help="hilos de decodificación")
+    args = parser.parse_args()
+
+    pixels, labels = synthetic_images(args.images, args.duplicates)
+    print(f"{len(pixels)} imágenes sintéticas ({args.duplicates:.0%} duplicadas)")
+
+    if PIL_AVAILABLE:
+        payloads = [to_jpeg(p) for p in pixels]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.workers) as pool:
+            grids = np.stack(list(pool.map(decode_grid, payloads)))
+        elapsed = time.perf_counter() - started
+        print(f"Decodificación JPEG ({args.workers} hilos): {len(grids) / elapsed:,.0f} imágenes/s")
+    else:
+        print("Pillow no instalado: se omite la decodificación")
+        grids = pixels.reshape(len(pixels), GRID, 2, GRID, 2).mean(axis=(2, 4)).astype(np.uint8)
+
+    started = time.perf_counter()
+    features = compute_features(grids)
+    hashed = time.perf_counter()
+    kept, duplicate_of = deduplicate(features)
+    finished = time.perf_counter()
+
+    print(f"Hashes y puntuaciones: {len(grids) / (hashed - started):,.0f} imágenes/s")
+    print(f"Deduplicación: {len(grids) / (finished - hashed):,.0f} imágenes/s")
+
+    flagged = np.flatnonzero(duplicate_of >= 0)
+    correct = sum(labels[i] == labels[duplicate_of[i]] for i in flagged)
+    expected = len(labels) - len(np.unique(labels))
+    print(f"Conservadas {len(kept)}, duplicadas detectadas {len(flagged)} de {expected} "
+          f"(precisión {correct / max(1, len(flagged)):.1%}, exhaustividad {correct / max(1, expected):.1%})")
+
+
+if __name__ == "__main__":
+    main()
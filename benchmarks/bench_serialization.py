@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+SILHOUETTE SEARCH - Microbenchmark de Serialización JSON
+=====================================================
+
+Compara el coste de codificar payloads grandes de búsqueda, imágenes y
+equipos con la ruta por defecto de FastAPI (jsonable_encoder + JSONResponse)
+frente a FastJSONResponse (orjson) y al payload precodificado de /v4/teams.
+
+Uso:
+    python benchmarks/bench_serialization.py --repeat 2000
+"""
+import sys
+import timeit
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from chroma_agent.serialization import FastJSONResponse, RawJSONResponse, dumps, orjson
+
+
+def search_payload(results: int = 100) -> dict:
+    return {
+        "success": True,
+        "query": "inteligencia artificial aplicada",
+        "results": [
+            {
+                "title": f"Resultado {i}: inteligencia artificial en la industria",
+                "link": f"https://example.com/articulo/{i}",
+                "snippet": "La inteligencia artificial está transformando la industria con modelos " * 3,
+                "position": i + 1,
+                "sitelinks": [{"title": f"Sección {j}", "link": f"https://example.com/{i}/{j}"} for j in range(4)],
+                "date": "2025-11-10"
+            }
+            for i in range(results)
+        ],
+        "count": results,
+        "search_info": {"took_ms": None, "api": "SERPER"}
+    }
+
+
+def image_payload(images: int = 30) -> dict:
+    return {
+        "success": True,
+        "query": "montañas",
+        "images": [
+            {
+                "id": f"photo{i:06d}",
+                "description": "Montañas nevadas al amanecer",
+                "alt_description": "mountain landscape",
+                "urls": {k: f"https://images.unsplash.com/photo-{i}?w={w}" for k, w in (("small", 400), ("regular", 1080), ("full", 4000))},
+                "user": {"name": "Fotógrafo", "username": "fotografo"},
+                "links": {"html": f"https://unsplash.com/photos/{i}", "download": f"https://unsplash.com/photos/{i}/download"}
+            }
+            for i in range(images)
+        ],
+        "total": 10000,
+        "total_pages": 334,
+        "api": "UNSPLASH"
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    from optimized_server import V4_TEAMS, V4_CATEGORIES, _TEAMS_PAYLOAD_PREFIX
+
+    teams = {"teams": V4_TEAMS, "total": len(V4_TEAMS), "categories": V4_CATEGORIES, "timestamp": datetime.now().isoformat()}
+    payloads = {"search (100)": search_payload(), "images (30)": image_payload(), "teams (64)": teams}
+
+    print(f"⚙️  orjson {'disponible' if orjson else 'NO instalado (fallback json)'}; {args.repeat} iteraciones")
+    print(f"{'payload':<14}{'bytes':>8}{'fastapi µs':>12}{'fast µs':>10}{'speedup':>9}")
+    for name, payload in payloads.items():
+        default = timeit.timeit(lambda: JSONResponse(jsonable_encoder(payload)), number=args.repeat) / args.repeat
+        fast = timeit.timeit(lambda: FastJSONResponse(payload), number=args.repeat) / args.repeat
+        size = len(dumps(payload))
+        print(f"{name:<14}{size:>8}{default * 1e6:>12.1f}{fast * 1e6:>10.1f}{default / fast:>8.1f}x")
+
+    precoded = timeit.timeit(
+        lambda: RawJSONResponse(_TEAMS_PAYLOAD_PREFIX + dumps(datetime.now().isoformat()) + b"}"),
+        number=args.repeat
+    ) / args.repeat
+    print(f"{'teams precod.':<14}{len(_TEAMS_PAYLOAD_PREFIX):>8}{'':>12}{precoded * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+SILHOUETTE SEARCH - Prueba de Carga del Servidor
+=============================================
+
+Lanza peticiones concurrentes contra los endpoints de búsqueda, chat e
+imágenes y reporta throughput y percentiles de latencia. Pensado para
+ejecutarse contra el servidor apuntado a benchmarks/mock_upstreams.py.
+
+Uso:
+    python benchmarks/load_test.py --url http://localhost:8000 --concurrency 200 --duration 30
+"""
+import time
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+
+import aiohttp
+
+QUERIES = ["inteligencia artificial", "python asyncio", "mejores cafés madrid",
+           "machine learning", "fotografía nocturna", "cloud computing"]
+
+SCENARIOS = {
+    "search": lambda base: ("GET", f"{base}/api/busqueda/real", {"params": {"query": random.choice(QUERIES)}}),
+    "images": lambda base: ("GET", f"{base}/api/imagenes/real", {"params": {"query": random.choice(QUERIES)}}),
+    "chat": lambda base: ("POST", f"{base}/api/chat/real", {"json": {"message": random.choice(QUERIES)}}),
+}
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+async def worker(session, base, scenarios, deadline, latencies, errors):
+    while time.monotonic() < deadline:
+        name = random.choice(scenarios)
+        method, url, kwargs = SCENARIOS[name](base)
+        started = time.monotonic()
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                body = await response.json()
+                ok = response.status == 200 and body.get("success", True)
+        except Exception:
+            ok = False
+        latencies[name].append(time.monotonic() - started)
+        if not ok:
+            errors[name] += 1
+
+
+async def run(args):
+    latencies, errors = defaultdict(list), defaultdict(int)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(
+            worker(session, args.url.rstrip("/"), args.scenarios, deadline, latencies, errors)
+            for _ in range(args.concurrency)
+        ))
+
+    print(f"📊 {args.concurrency} clientes concurrentes durante {args.duration}s")
+    print(f"{'escenario':<10}{'req':>8}{'req/s':>10}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name in args.scenarios:
+        values = latencies[name]
+        print(f"{name:<10}{len(values):>8}{len(values) / args.duration:>10.1f}{errors[name]:>6}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+SILHOUETTE SEARCH - Servidores Simulados de SERPER, OpenRouter y Unsplash
+=====================================================================
+
+Sustitutos locales con la misma forma de respuesta que parsean los motores
+(`organic`, `choices`, `results`/`urls`), latencia inyectada, tasa de errores
+configurable y streaming SSE para OpenRouter. Permiten hacer pruebas de carga
+del servidor sin consumir cuota de las APIs reales.
+
+Uso:
+    python benchmarks/mock_upstreams.py --port 9100 --latency lognormal:80:0.5 --error-rate 0.01
+
+Y arrancar el servidor apuntando a los sustitutos:
+    SERPER_BASE_URL=http://localhost:9100/serper \\
+    OPENROUTER_BASE_URL=http://localhost:9100/openrouter/api/v1 \\
+    UNSPLASH_BASE_URL=http://localhost:9100/unsplash \\
+    SERPER_API_KEY=mock OPENROUTER_API_KEY=mock UNSPLASH_ACCESS_KEY=mock \\
+    python -m uvicorn chroma_agent.server:app --port 8000
+"""
+import json
+import math
+import time
+import zlib
+import struct
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Optional
+
+from aiohttp import web
+
+
+class LatencyModel:
+    """Distribución de latencia: fixed:MS, uniform:MIN:MAX, lognormal:MEDIAN:SIGMA o exp:MEAN"""
+
+    def __init__(self, spec: str):
+        kind, *args = spec.split(":")
+        self.kind = kind
+        self.args = [float(a) for a in args]
+        if kind not in ("fixed", "uniform", "lognormal", "exp"):
+            raise ValueError(f"Distribución de latencia desconocida: {spec}")
+
+    def sample(self) -> float:
+        """Latencia en segundos"""
+        if self.kind == "fixed":
+            ms = self.args[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(self.args[0], self.args[1])
+        elif self.kind == "lognormal":
+            ms = random.lognormvariate(math.log(self.args[0]), self.args[1])
+        else:
+            ms = random.expovariate(1 / self.args[0])
+        return max(0.0, ms) / 1000
+
+
+class UpstreamProfile:
+    """Comportamiento simulado de un upstream"""
+
+    def __init__(self, latency: LatencyModel, error_rate: float, rate_limit_rate: float):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.requests = 0
+
+    async def before_response(self) -> Optional[web.Response]:
+        """Aplica la latencia y, según las tasas configuradas, devuelve un error"""
+        self.requests += 1
+        await asyncio.sleep(self.latency.sample())
+        roll = random.random()
+        if roll < self.error_rate:
+            return web.json_response({"error": "mock upstream error"}, status=500)
+        if roll < self.error_rate + self.rate_limit_rate:
+            return web.json_response({"error": "rate limited"}, status=429, headers={"Retry-After": "1"})
+        return None
+
+
+def _words(seed: str, count: int):
+    rng = random.Random(seed)
+    vocabulary = ["silhouette", "agent", "browser", "python", "cloud", "vision", "data",
+                  "design", "search", "model", "image", "stream", "future", "network"]
+    return [rng.choice(vocabulary) for _ in range(count)]
+
+
+def make_png(seed: str, width: int, height: int) -> bytes:
+    """Genera un PNG en escala de grises determinista a partir de una semilla"""
+    rng = random.Random(seed)
+    fx, fy, phase = rng.uniform(0.02, 0.2), rng.uniform(0.02, 0.2), rng.uniform(0, 6.28)
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)
+        rows.extend(int(127 + 127 * math.sin(fx * x + fy * y + phase)) for x in range(width))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(bytes(rows), 6)) + chunk(b"IEND", b"")
+
+
+def create_app(profiles: dict, token_delay: float, public_url: str) -> web.Application:
+    """Crea la aplicación con las rutas de los tres upstreams"""
+
+    async def serper_search(request: web.Request) -> web.Response:
+        error = await profiles["serper"].before_response()
+        if error:
+            return error
+        body = await request.json()
+        query, num, page = body.get("q", ""), int(body.get("num", 10)), int(body.get("page", 1))
+        organic = []
+        for i in range(num):
+            position = (page - 1) * num + i + 1
+            title = " ".join(_words(f"{query}:{position}", 5)).title()
+            organic.append({
+                "title": title,
+                "link": f"https://example.com/{hashlib.md5(f'{query}:{position}'.encode()).hexdigest()[:12]}",
+                "snippet": " ".join(_words(f"{query}:{position}:s", 24)),
+                "position": position
+            })
+        return web.json_response({
+            "searchParameters": {"q": query, "num": num, "page": page, "type": "search"},
+            "organic": organic
+        })
+
+    async def unsplash_search(request: web.Request) -> web.Response:
+        error = await profiles["unsplash"].before_response()
+        if error:
+            return error
+        query = request.query.get("query", "")
+        per_page = min(int(request.query.get("per_page", 10)), 30)
+        page = int(request.query.get("page", 1))
+        total = 1000
+        results = []
+        for i in range(per_page):
+            index = (page - 1) * per_page + i
+            if index >= total:
+                break
+            photo_id = hashlib.md5(f"{query}:{index}".encode()).hexdigest()[:11]
+            image_url = f"{public_url}/unsplash/images/{photo_id}"
+            results.append({
+                "id": photo_id,
+                "description": " ".join(_words(photo_id, 6)),
+                "alt_description": " ".join(_words(photo_id + "alt", 4)),
+                "downloads": random.randint(0, 10000),
+                "urls": {
+                    "raw": image_url,
+                    "full": f"{image_url}?w=1080",
+                    "regular": f"{image_url}?w=400",
+                    "small": f"{image_url}?w=200",
+                    "thumb": f"{image_url}?w=100"
+                },
+                "user": {"name": "Mock Photographer", "username": "mock"},
+                "links": {
+                    "html": f"https://unsplash.com/photos/{photo_id}",
+                    "download": f"{image_url}?w=1080"
+                }
+            })
+        return web.json_response(
+            {"total": total, "total_pages": math.ceil(total / per_page), "results": results},
+            headers={"X-Ratelimit-Limit": "5000", "X-Ratelimit-Remaining": "4999"}
+        )
+
+    async def unsplash_image(request: web.Request) -> web.Response:
+        error = await profiles["unsplash"].before_response()
+        if error:
+            return error
+        photo_id = request.match_info["photo_id"]
+        width = min(int(request.query.get("w", 200)), 1080)
+        height = max(1, width * 2 // 3)
+        body = make_png(photo_id, width, height)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(body=body, content_type="image/png", headers={"ETag": etag, "Cache-Control": "max-age=3600"})
+
+    async def openrouter_completions(request: web.Request) -> web.StreamResponse:
+        error = await profiles["openrouter"].before_response()
+        if error:
+            return error
+        body = await request.json()
+        model = body.get("model", "mock/model")
+        prompt = " ".join(str(m.get("content", "")) for m in body.get("messages", []))
+        tokens = _words(prompt, min(int(body.get("max_tokens", 1000)), 60))
+        usage = {
+            "prompt_tokens": max(1, len(prompt) // 4),
+            "completion_tokens": len(tokens),
+            "total_tokens": max(1, len(prompt) // 4) + len(tokens)
+        }
+        completion_id = f"gen-{int(time.time() * 1000)}"
+
+        if not body.get("stream"):
+            await asyncio.sleep(token_delay * len(tokens))
+            return web.json_response({
+                "id": completion_id,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(tokens)}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(token_delay)
+            chunk = {
+                "id": completion_id,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": token if i == 0 else " " + token}, "finish_reason": None}]
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        final = {
+            "id": completion_id,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": usage
+        }
+        await response.write(f"data: {json.dumps(final)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response({name: profile.requests for name, profile in profiles.items()})
+
+    app = web.Application()
+    app.router.add_post("/serper/search", serper_search)
+    app.router.add_get("/unsplash/search/photos", unsplash_search)
+    app.router.add_get("/unsplash/images/{photo_id}", unsplash_image)
+    app.router.add_post("/openrouter/api/v1/chat/completions", openrouter_completions)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="lognormal:80:0.5", help="Distribución por defecto para los tres upstreams")
+    parser.add_argument("--serper-latency")
+    parser.add_argument("--openrouter-latency", default="lognormal:400:0.6")
+    parser.add_argument("--unsplash-latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de respuestas 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fracción de respuestas 429")
+    parser.add_argument("--token-delay-ms", type=float, default=20, help="Retraso entre tokens del streaming")
+    args = parser.parse_args()
+
+    profiles = {
+        name: UpstreamProfile(
+            LatencyModel(getattr(args, f"{name}_latency") or args.latency),
+            args.error_rate,
+            args.rate_limit_rate
+        )
+        for name in ("serper", "openrouter", "unsplash")
+    }
+    public_url = f"http://{args.host}:{args.port}"
+    print(f"🧪 Upstreams simulados en {public_url} (serper, openrouter, unsplash)")
+    web.run_app(create_app(profiles, args.token_delay_ms / 1000, public_url), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
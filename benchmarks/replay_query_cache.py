@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+SILHOUETTE SEARCH - Replay de Consultas contra la Cache
+====================================================
+
+Reproduce un log de peticiones y compara la tasa de aciertos de la cache con
+claves crudas, con consultas canonicalizadas y con detección de casi
+duplicados por MinHash.
+
+Formatos de log aceptados (una petición por línea):
+- Texto plano con la consulta
+- JSONL con campo "query" o "q"
+- Logs de acceso de uvicorn/nginx con "?query=..." o "?q=..." en la URL
+
+Uso:
+    python benchmarks/replay_query_cache.py data/logs/access.log --thresholds 0.7 0.8
+"""
+import sys
+import json
+import argparse
+import re
+from pathlib import Path
+from urllib.parse import unquote_plus
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chroma_agent.query_normalizer import QueryCache
+
+_URL_QUERY = re.compile(r"[?&](?:query|q)=([^&\s\"]+)")
+
+
+def extract_query(line: str):
+    """Extrae la consulta de una línea del log"""
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        try:
+            record = json.loads(line)
+            return record.get("query") or record.get("q")
+        except json.JSONDecodeError:
+            return None
+    match = _URL_QUERY.search(line)
+    if match:
+        return unquote_plus(match.group(1))
+    if "HTTP/" in line:
+        return None
+    return line
+
+
+class RawCache:
+    """Cache de referencia con la consulta literal como clave"""
+
+    def __init__(self):
+        self.keys = set()
+        self.hits = 0
+        self.lookups = 0
+
+    def lookup(self, query: str):
+        self.lookups += 1
+        if query in self.keys:
+            self.hits += 1
+        else:
+            self.keys.add(query)
+
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+def replay(queries, max_entries: int, threshold=None) -> dict:
+    """Reproduce las consultas contra una QueryCache y devuelve sus estadísticas"""
+    cache = QueryCache(ttl=float("inf"), max_entries=max_entries, near_duplicate_threshold=threshold)
+    for query in queries:
+        if cache.get(query) is None:
+            cache.set(query, True)
+    return cache.get_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="Ficheros de log a reproducir")
+    parser.add_argument("--max-entries", type=int, default=1024)
+    parser.add_argument("--thresholds", type=float, nargs="*", default=[0.8])
+    args = parser.parse_args()
+
+    queries = []
+    for path in args.logs:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            queries.extend(q for q in map(extract_query, f) if q)
+
+    if not queries:
+        print("❌ No se encontraron consultas en los logs")
+        sys.exit(1)
+
+    raw = RawCache()
+    for query in queries:
+        raw.lookup(query)
+
+    print(f"📊 Consultas reproducidas: {len(queries)}")
+    print(f"{'estrategia':<28}{'hit rate':>10}")
+    print(f"{'clave cruda':<28}{raw.hit_rate():>10.2%}")
+    canonical = replay(queries, args.max_entries)
+    print(f"{'canónica':<28}{canonical['hit_rate']:>10.2%}")
+    for threshold in args.thresholds:
+        stats = replay(queries, args.max_entries, threshold)
+        label = f"canónica + MinHash >= {threshold}"
+        print(f"{label:<28}{stats['hit_rate']:>10.2%}  (casi duplicados: {stats['near_hits']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+SILHOUETTE SEARCH - Control de Admisión de Chat
+==========================================
+
+Token buckets por modelo y por API key con una cola de prioridad
+(interactivo antes que batch). Si una petición no puede entrar antes de su
+plazo se rechaza con AdmissionRejected para responder 429 + Retry-After.
+Con varios workers los buckets viven en el estado compartido, así la cuota
+es por host; la cola de cada worker sigue siendo local.
+"""
+import os
+import math
+import time
+import heapq
+import hashlib
+import asyncio
+import itertools
+import logging
+from typing import Dict, Any, List, Optional
+
+from starlette.requests import HTTPConnection
+
+from chroma_agent.resilience import LatencyTracker
+from chroma_agent.shared_state import SharedTokenBucket, shared_store
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class AdmissionRejected(Exception):
+    """La petición no se admite: la cola supera el plazo o el tamaño máximo"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    """Token bucket clásico: `rate` tokens por segundo hasta `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self) -> float:
+        """Segundos hasta que haya un token disponible (0 si ya lo hay)"""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+def client_digest(api_key: str) -> str:
+    """Identificador estable de un cliente sin guardar su credencial en claro"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
+def client_key(connection: HTTPConnection) -> str:
+    """Identifica al cliente (petición HTTP o WebSocket) para los límites por API key.
+
+    Devuelve un hash: la credencial de la cabecera no llega a colas ni a disco.
+    """
+    return client_digest(
+        connection.headers.get("x-api-key")
+        or connection.headers.get("authorization")
+        or (connection.client.host if connection.client else "anonymous")
+    )
+
+
+def make_bucket(key: str, rate: float, capacity: float):
+    """TokenBucket local o, con varios workers, uno compartido por todo el host"""
+    if shared_store is not None:
+        return SharedTokenBucket(shared_store, key, rate, capacity)
+    return TokenBucket(rate, capacity)
+
+
+async def take_tokens(*buckets) -> bool:
+    """Consume un token de cada bucket solo si todos tienen uno.
+
+    Los buckets compartidos se comprueban y descuentan en una sola
+    transacción: dos workers no pueden gastar el mismo token.
+    """
+    if isinstance(buckets[0], SharedTokenBucket):
+        return await buckets[0].store.try_take(buckets)
+    if any(bucket.wait_time() > 0 for bucket in buckets):
+        return False
+    for bucket in buckets:
+        bucket.take()
+    return True
+
+
+class _Ticket:
+    __slots__ = ("model", "api_key", "priority", "future", "enqueued_at")
+
+    def __init__(self, model: str, api_key: str, priority: int):
+        self.model = model
+        self.api_key = api_key
+        self.priority = priority
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    """Cola de prioridad con límites por modelo y por API key"""
+
+    def __init__(
+        self,
+        model_rate: float = 5.0,
+        model_burst: float = 10.0,
+        key_rate: float = 1.0,
+        key_burst: float = 5.0,
+        max_queue: int = 500,
+        deadlines: Optional[Dict[str, float]] = None
+    ):
+        self.model_rate = model_rate
+        self.model_burst = model_burst
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.max_queue = max_queue
+        self.deadlines = deadlines or {"interactive": 10.0, "batch": 300.0}
+        self._model_buckets: Dict[str, TokenBucket] = {}
+        self._key_buckets: Dict[str, TokenBucket] = {}
+        self._queue: List = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.queue_time = {name: LatencyTracker() for name in PRIORITIES}
+        self.stats = {name: {"admitted": 0, "rejected": 0} for name in PRIORITIES}
+
+    def _model_bucket(self, model: str) -> TokenBucket:
+        if model not in self._model_buckets:
+            self._model_buckets[model] = make_bucket(f"model:{model}", self.model_rate, self.model_burst)
+        return self._model_buckets[model]
+
+    def _key_bucket(self, api_key: str) -> TokenBucket:
+        if api_key not in self._key_buckets:
+            self._key_buckets[api_key] = make_bucket(
+                # La API key no se guarda en claro en el estado compartido
+                "key:" + client_digest(api_key),
+                self.key_rate,
+                self.key_burst
+            )
+        return self._key_buckets[api_key]
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            # Se descartan de la cabeza los tickets cancelados o expirados
+            while self._queue and self._queue[0][2].future.done():
+                heapq.heappop(self._queue)
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # Primer ticket admisible en orden de prioridad: un modelo saturado
+            # no bloquea a los demás
+            min_wait = None
+            for entry in sorted(self._queue):
+                ticket = entry[2]
+                if ticket.future.done():
+                    continue
+                model_bucket = self._model_bucket(ticket.model)
+                key_bucket = self._key_bucket(ticket.api_key)
+                # Estimación local (sin E/S); el consumo real es atómico en take_tokens
+                wait = max(model_bucket.wait_time(), key_bucket.wait_time())
+                if wait == 0 and await take_tokens(model_bucket, key_bucket):
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    if not ticket.future.done():
+                        ticket.future.set_result(time.monotonic() - ticket.enqueued_at)
+                    min_wait = 0
+                    break
+                if wait == 0:
+                    # Otro worker gastó el token: la estimación ya está actualizada
+                    wait = max(model_bucket.wait_time(), key_bucket.wait_time(), 0.001)
+                min_wait = wait if min_wait is None else min(min_wait, wait)
+
+            if min_wait:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _estimate_wait(self, model: str, api_key: str) -> float:
+        pending = sum(1 for entry in self._queue if entry[2].model == model)
+        return max((pending + 1) / self.model_rate, self._key_bucket(api_key).wait_time())
+
+    async def admit(self, model: str, api_key: str, priority: str = "interactive") -> float:
+        """Espera turno para llamar al modelo; devuelve el tiempo en cola (s)"""
+        if priority not in PRIORITIES:
+            priority = "interactive"
+        if len(self._queue) >= self.max_queue:
+            self.stats[priority]["rejected"] += 1
+            raise AdmissionRejected("Cola de chat llena", self._estimate_wait(model, api_key))
+
+        self._ensure_dispatcher()
+        ticket = _Ticket(model, api_key, PRIORITIES[priority])
+        heapq.heappush(self._queue, (ticket.priority, next(self._seq), ticket))
+        self._wakeup.set()
+
+        try:
+            waited = await asyncio.wait_for(asyncio.shield(ticket.future), timeout=self.deadlines[priority])
+        except asyncio.TimeoutError:
+            ticket.future.cancel()
+            self.stats[priority]["rejected"] += 1
+            raise AdmissionRejected("Plazo de cola superado", self._estimate_wait(model, api_key))
+        except asyncio.CancelledError:
+            ticket.future.cancel()
+            raise
+
+        self.queue_time[priority].record(waited)
+        self.stats[priority]["admitted"] += 1
+        return waited
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de la cola: admitidos, rechazados y tiempos de espera"""
+        stats = {"queue_depth": len(self._queue)}
+        for name in PRIORITIES:
+            p50 = self.queue_time[name].percentile(50)
+            p99 = self.queue_time[name].percentile(99)
+            stats[name] = {
+                **self.stats[name],
+                "queue_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "queue_p99_ms": round(p99 * 1000, 1) if p99 is not None else None
+            }
+        return stats
+
+
+def admission_from_env() -> AdmissionController:
+    """Crea el controlador de admisión desde variables de entorno"""
+    return AdmissionController(
+        model_rate=float(os.getenv("CHAT_MODEL_RPS", "5")),
+        model_burst=float(os.getenv("CHAT_MODEL_BURST", "10")),
+        key_rate=float(os.getenv("CHAT_KEY_RPS", "1")),
+        key_burst=float(os.getenv("CHAT_KEY_BURST", "5")),
+        max_queue=int(os.getenv("CHAT_MAX_QUEUE", "500")),
+        deadlines={
+            "interactive": float(os.getenv("CHAT_QUEUE_DEADLINE", "10")),
+            "batch": float(os.getenv("CHAT_BATCH_QUEUE_DEADLINE", "300"))
+        }
+    )
+
+
+# Instancia global
+chat_admission = admission_from_env()
@@ -0,0 +1,482 @@
+"""
+SILHOUETTE SEARCH - Trabajos de Chat por Lotes
+=========================================
+
+Procesa listas grandes de prompts fuera de línea a través de ChatEngine. Cada
+trabajo vive en su propio directorio:
+
+    input.jsonl     prompts normalizados ({"index", "id", "messages", "model"})
+    results.jsonl   un resultado por línea, añadido al terminar cada prompt
+    meta.json       estado y contadores del trabajo
+
+results.jsonl es el checkpoint: al reiniciar el servidor se reanudan los
+trabajos pendientes saltando los prompts que ya tienen resultado. La
+concurrencia se ajusta a los límites de admisión (ley de Little: tasa
+permitida x latencia observada) y cada petición pasa por la cola con
+prioridad batch para no desplazar al tráfico interactivo.
+
+Con varios workers cada trabajo lo ejecuta el proceso que tiene el bloqueo
+de su directorio (flock sobre `lock`); los demás lo leen del disco para
+consultar estado y resultados, y cancelan dejando un archivo `cancel` que
+el propietario comprueba entre prompt y prompt.
+"""
+import os
+import re
+import json
+import math
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Tuple, AsyncIterator
+
+from chroma_agent.admission import chat_admission, AdmissionRejected, client_digest
+from chroma_agent.chat_engine import chat_engine
+from chroma_agent.serialization import dumps
+from chroma_agent.shared_state import try_lock_file, unlock_file
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, COMPLETED, CANCELLED, FAILED = "pending", "running", "completed", "cancelled", "failed"
+
+# Latencia supuesta para calcular la concurrencia antes de tener mediciones
+_DEFAULT_LATENCY = 2.0
+
+_JOB_ID = re.compile(r"[0-9a-f]{32}")
+
+# Límite de max_tokens por prompt (los modelos de OpenRouter no pasan de ahí)
+MAX_TOKENS_LIMIT = 32000
+
+
+def _valid_messages(messages: Any) -> bool:
+    return isinstance(messages, list) and bool(messages) and all(
+        isinstance(m, dict) and isinstance(m.get("role"), str) and isinstance(m.get("content"), str)
+        for m in messages
+    )
+
+
+def parse_prompts(items: List[Any]) -> List[Dict[str, Any]]:
+    """Normaliza la entrada: cadenas o {"id", "message" | "messages", "model"}"""
+    prompts = []
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {"message": item}
+        if not isinstance(item, dict):
+            raise ValueError(f"Prompt {index}: se esperaba texto u objeto")
+        if "messages" in item:
+            messages = item["messages"]
+            if not _valid_messages(messages):
+                raise ValueError(f"Prompt {index}: messages debe ser una lista de {{role, content}} con texto")
+        elif isinstance(item.get("message"), str) and item["message"]:
+            messages = [{"role": "user", "content": item["message"]}]
+        else:
+            raise ValueError(f"Prompt {index}: message o messages requerido")
+        if item.get("model") is not None and not isinstance(item["model"], str):
+            raise ValueError(f"Prompt {index}: model debe ser texto")
+        prompts.append({
+            "index": index,
+            "id": str(item.get("id", index)),
+            "messages": messages,
+            "model": item.get("model")
+        })
+    return prompts
+
+
+def parse_jsonl(text: str) -> List[Any]:
+    """Una línea por prompt: JSON (objeto o cadena) o texto plano"""
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line) if line[0] in "{\"" else line)
+        except json.JSONDecodeError:
+            items.append(line)
+    return items
+
+
+def _migrate_meta(meta: Dict[str, Any]) -> Dict[str, Any]:
+    # Lotes antiguos guardaban la API key en claro
+    if "api_key" in meta:
+        meta["client"] = client_digest(meta.pop("api_key") or "anonymous")
+    return meta
+
+
+class BatchJob:
+    """Estado de un trabajo y acceso a sus ficheros"""
+
+    def __init__(self, directory: Path, meta: Dict[str, Any]):
+        self.directory = directory
+        self.meta = _migrate_meta(meta)
+        self.task: Optional[asyncio.Task] = None
+        # Descriptor del bloqueo del directorio mientras este proceso lo ejecuta
+        self.lock_fd: Optional[int] = None
+        self._cancelled = False
+        self._cancel_checked_at = 0.0
+        self._meta_saved_at = 0.0
+        # save_meta() puede correr en varios hilos a la vez (checkpoint y apagado)
+        self._meta_lock = threading.Lock()
+
+    @property
+    def id(self) -> str:
+        return self.meta["id"]
+
+    @property
+    def results_path(self) -> Path:
+        return self.directory / "results.jsonl"
+
+    @property
+    def cancel_path(self) -> Path:
+        return self.directory / "cancel"
+
+    def cancel_requested(self) -> bool:
+        return self.cancel_path.exists()
+
+    async def poll_cancel(self, interval: float) -> bool:
+        """cancel_requested() consultando el disco como mucho una vez por intervalo"""
+        now = time.monotonic()
+        if not self._cancelled and now - self._cancel_checked_at >= interval:
+            self._cancel_checked_at = now
+            self._cancelled = await asyncio.to_thread(self.cancel_requested)
+        return self._cancelled
+
+    def reload_meta(self):
+        self.meta = _migrate_meta(json.loads((self.directory / "meta.json").read_text(encoding="utf-8")))
+
+    def save_meta(self):
+        # Escritura atómica: un reinicio nunca deja meta.json a medias
+        tmp = self.directory / "meta.json.tmp"
+        with self._meta_lock:
+            tmp.write_bytes(dumps(self.meta))
+            os.replace(tmp, self.directory / "meta.json")
+
+    async def checkpoint_meta(self, interval: float = 0.0):
+        """save_meta() en un hilo, como mucho una vez por intervalo.
+
+        Los contadores se recalculan desde results.jsonl al reanudar: un
+        meta.json algo atrasado no pierde trabajo.
+        """
+        now = time.monotonic()
+        if now - self._meta_saved_at < interval:
+            return
+        self._meta_saved_at = now
+        await asyncio.to_thread(self.save_meta)
+
+    def load_prompts(self) -> List[Dict[str, Any]]:
+        with open(self.directory / "input.jsonl", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def ends_with_newline(self) -> bool:
+        with open(self.results_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def scan_results(self) -> Tuple[Set[int], int, int]:
+        """Prompts con resultado ya guardado y contadores (se ignora una última línea truncada)"""
+        done, completed, failed = set(), 0, 0
+        if self.results_path.exists():
+            with open(self.results_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    done.add(result["index"])
+                    if result.get("success"):
+                        completed += 1
+                    else:
+                        failed += 1
+        return done, completed, failed
+
+
+class BatchJobManager:
+    """Crea, ejecuta, reanuda y cancela trabajos por lotes"""
+
+    def __init__(
+        self,
+        jobs_dir: str = None,
+        max_concurrency: int = None,
+        engine=None,
+        admission=None,
+        checkpoint_interval: float = None
+    ):
+        self.jobs_dir = Path(jobs_dir or os.getenv("BATCH_JOBS_DIR", "data/batch_jobs"))
+        self.max_concurrency = max_concurrency or int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+        # Segundos entre escrituras de meta.json y comprobaciones del archivo cancel
+        self.checkpoint_interval = (
+            checkpoint_interval if checkpoint_interval is not None
+            else float(os.getenv("BATCH_CHECKPOINT_INTERVAL", "1.0"))
+        )
+        self.engine = engine or chat_engine
+        self.admission = admission or chat_admission
+        self.jobs: Dict[str, BatchJob] = {}
+
+    def concurrency_for(self, model: str) -> int:
+        """Peticiones en vuelo necesarias para aprovechar la tasa permitida"""
+        rate = min(self.admission.model_rate, self.admission.key_rate)
+        latency = self.engine.router.stats[model].latency if model in self.engine.router.stats else None
+        wanted = math.ceil(rate * (latency or _DEFAULT_LATENCY))
+        return max(1, min(self.max_concurrency, wanted))
+
+    async def create(
+        self,
+        items: List[Any],
+        client: str,
+        model: str = None,
+        policy: str = None,
+        max_tokens: int = 1000
+    ) -> BatchJob:
+        if not isinstance(items, list):
+            raise ValueError("prompts debe ser una lista")
+        if isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or not 1 <= max_tokens <= MAX_TOKENS_LIMIT:
+            raise ValueError(f"max_tokens debe ser un entero entre 1 y {MAX_TOKENS_LIMIT}")
+        for name, value in (("model", model), ("policy", policy)):
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{name} debe ser texto")
+        prompts = parse_prompts(items)
+        if not prompts:
+            raise ValueError("El lote no contiene prompts")
+
+        job_id = uuid.uuid4().hex
+        directory = self.jobs_dir / job_id
+        await asyncio.to_thread(self._write_input, directory, prompts)
+
+        job = BatchJob(directory, {
+            "id": job_id,
+            "status": PENDING,
+            # Hash del cliente (admission.client_key), nunca la API key en claro
+            "client": client,
+            "model": model,
+            "policy": policy,
+            "max_tokens": max_tokens,
+            "total": len(prompts),
+            "completed": 0,
+            "failed": 0,
+            "created_at": time.time(),
+            "finished_at": None
+        })
+        await asyncio.to_thread(job.save_meta)
+        self.jobs[job_id] = job
+        self._start(job)
+        logger.info(f"📦 Lote {job_id} creado con {len(prompts)} prompts")
+        return job
+
+    @staticmethod
+    def _write_input(directory: Path, prompts: List[Dict[str, Any]]):
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "input.jsonl", "wb") as f:
+            for prompt in prompts:
+                f.write(dumps(prompt) + b"\n")
+
+    def _start(self, job: BatchJob) -> bool:
+        """Ejecuta el trabajo si ningún otro worker lo tiene ya"""
+        job.lock_fd = try_lock_file(job.directory / "lock")
+        if job.lock_fd is None:
+            return False
+        job.task = asyncio.create_task(self._run(job))
+        job.task.add_done_callback(lambda _: self._release(job))
+        return True
+
+    @staticmethod
+    def _release(job: BatchJob):
+        unlock_file(job.lock_fd)
+        job.lock_fd = None
+
+    async def _run(self, job: BatchJob):
+        meta = job.meta
+        done, meta["completed"], meta["failed"] = await asyncio.to_thread(job.scan_results)
+        pending = [p for p in await asyncio.to_thread(job.load_prompts) if p["index"] not in done]
+        meta["status"] = RUNNING
+        await job.checkpoint_meta()
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for prompt in pending:
+            queue.put_nowait(prompt)
+        workers = self.concurrency_for(meta["model"] or self.engine.router.candidates(meta["policy"])[0])
+        logger.info(f"📦 Lote {job.id}: {len(pending)} prompts pendientes con {workers} en paralelo")
+
+        results = await asyncio.to_thread(open, job.results_path, "ab")
+        try:
+            if results.tell() and not await asyncio.to_thread(job.ends_with_newline):
+                # Última línea cortada por un reinicio: se cierra para no mezclarla
+                await asyncio.to_thread(results.write, b"\n")
+            write_lock = asyncio.Lock()
+
+            def append(data: bytes):
+                results.write(data)
+                results.flush()
+
+            async def worker():
+                while not queue.empty() and not await job.poll_cancel(self.checkpoint_interval):
+                    prompt = queue.get_nowait()
+                    try:
+                        line = await self._process(job, prompt)
+                    except Exception as e:
+                        # Un prompt que falla no tumba el lote: queda como resultado con error
+                        logger.warning(f"⚠️ Lote {job.id}, prompt {prompt['index']}: {e}")
+                        line = {
+                            "index": prompt["index"],
+                            "id": prompt["id"],
+                            "success": False,
+                            "error": str(e) or type(e).__name__
+                        }
+                    # Una línea completa por resultado: es el checkpoint del trabajo
+                    async with write_lock:
+                        await asyncio.to_thread(append, dumps(line) + b"\n")
+                    meta["completed" if line["success"] else "failed"] += 1
+                    await job.checkpoint_meta(self.checkpoint_interval)
+
+            try:
+                await asyncio.gather(*(worker() for _ in range(min(workers, len(pending)) or 1)))
+            except asyncio.CancelledError:
+                # Apagado del servidor: el trabajo queda "running" para reanudarse
+                job.save_meta()
+                raise
+            except Exception as e:
+                logger.error(f"Error en lote {job.id}: {e}")
+                meta["status"] = FAILED
+                meta["error"] = str(e)
+                meta["finished_at"] = time.time()
+                await job.checkpoint_meta()
+                return
+        finally:
+            await asyncio.to_thread(results.close)
+
+        if await job.poll_cancel(0):
+            # Cancelado desde otro worker
+            meta["status"] = CANCELLED
+            meta["finished_at"] = time.time()
+            await job.checkpoint_meta()
+            logger.info(f"📦 Lote {job.id} cancelado")
+            return
+
+        meta["status"] = COMPLETED
+        meta["finished_at"] = time.time()
+        await job.checkpoint_meta()
+        logger.info(f"📦 Lote {job.id} terminado: {meta['completed']} ok, {meta['failed']} con error")
+
+    async def _process(self, job: BatchJob, prompt: Dict[str, Any]) -> Dict[str, Any]:
+        meta = job.meta
+        model = prompt.get("model") or meta["model"]
+        while True:
+            try:
+                await self.admission.admit(
+                    model or self.engine.router.candidates(meta["policy"])[0],
+                    meta["client"],
+                    "batch"
+                )
+                break
+            except AdmissionRejected as e:
+                # Un lote no falla por saturación: espera y vuelve a la cola
+                await asyncio.sleep(e.retry_after)
+
+        result = await self.engine.complete(
+            prompt["messages"],
+            model,
+            max_tokens=meta["max_tokens"],
+            policy=meta["policy"]
+        )
+        return {
+            "index": prompt["index"],
+            "id": prompt["id"],
+            "success": result.get("success", False),
+            "response": result.get("response"),
+            "model": result.get("model"),
+            "usage": result.get("usage"),
+            "cached": result.get("cached", False),
+            "error": result.get("error")
+        }
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        job = self.jobs.get(job_id)
+        if job is not None and job.task is not None:
+            return job
+        # Trabajo de otro worker o ya terminado: el disco manda
+        if not _JOB_ID.fullmatch(job_id):
+            return None
+        directory = self.jobs_dir / job_id
+        try:
+            meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+        if job is None:
+            job = self.jobs[job_id] = BatchJob(directory, meta)
+        else:
+            job.meta = _migrate_meta(meta)
+        return job
+
+    def status(self, job: BatchJob) -> Dict[str, Any]:
+        meta = {k: v for k, v in job.meta.items() if k != "client"}
+        meta["progress"] = round((meta["completed"] + meta["failed"]) / meta["total"], 4)
+        return meta
+
+    async def cancel(self, job: BatchJob) -> bool:
+        if job.meta["status"] not in (PENDING, RUNNING):
+            return False
+        if job.task is None:
+            lock_fd = try_lock_file(job.directory / "lock")
+            if lock_fd is None:
+                # Lo ejecuta otro worker: se le avisa y lo marcará al terminar los prompts en curso
+                job.cancel_path.touch()
+                job.meta["status"] = CANCELLED
+                return True
+            # Nadie lo ejecuta (su worker se detuvo): se cancela aquí
+            try:
+                job.meta["status"] = CANCELLED
+                job.meta["finished_at"] = time.time()
+                job.save_meta()
+            finally:
+                unlock_file(lock_fd)
+            return True
+        job.task.cancel()
+        try:
+            await job.task
+        except asyncio.CancelledError:
+            pass
+        job.meta["status"] = CANCELLED
+        job.meta["finished_at"] = time.time()
+        job.save_meta()
+        return True
+
+    async def stream_results(self, job: BatchJob, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """Resultados guardados hasta ahora (JSONL), leídos por bloques"""
+        if not job.results_path.exists():
+            return
+        with open(job.results_path, "rb") as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def resume(self):
+        """Carga los trabajos del disco y reanuda los que no terminaron"""
+        if not self.jobs_dir.exists():
+            return
+        resumed = 0
+        for meta_path in self.jobs_dir.glob("*/meta.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"⚠️ Lote ilegible {meta_path.parent.name}: {e}")
+                continue
+            job = BatchJob(meta_path.parent, meta)
+            self.jobs[job.id] = job
+            if meta["status"] in (PENDING, RUNNING) and self._start(job):
+                resumed += 1
+        if resumed:
+            logger.info(f"📦 {resumed} lotes reanudados")
+
+    async def close(self):
+        """Detiene los trabajos en curso; se reanudarán en el próximo arranque"""
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Instancia global
+batch_manager = BatchJobManager()
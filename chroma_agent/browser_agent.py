@@ -1,12 +1,21 @@
 """
 SILHOUETTE SEARCH - Navegación Web Real
 ===================================
+
+Playwright se importa y Chromium se lanza al primer uso (o en segundo plano
+durante el arranque), así el servidor acepta tráfico sin esperar al navegador.
 """
+import os
+import time
+import importlib
 import asyncio
 import logging
-from playwright.async_api import async_playwright
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
 import json
 
+from chroma_agent.shared_state import ProcessSlots, shared_store, worker_count
+
 logger = logging.getLogger(__name__)
 
 class BrowserAgent:
@@ -16,17 +25,111 @@ class BrowserAgent:
         self.playwright = None
         self.browser = None
         self.page = None
+        # stopped -> starting -> ready | failed
+        self.state = "stopped"
+        self.last_error: Optional[str] = None
+        self.launch_seconds: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Navegaciones en curso en este worker
+        self.active_pages = 0
+        # eager: el arranque espera a Chromium; background: se lanza en paralelo; lazy: en la primera navegación.
+        # Con varios workers se difiere por defecto: solo lanzan Chromium los que navegan
+        default_mode = "lazy" if worker_count() > 1 else "background"
+        self.startup_mode = os.getenv("BROWSER_STARTUP", default_mode).lower()
+        # Páginas activas en todo el host (solo con varios workers)
+        self.slots = None
+        if shared_store is not None:
+            self.slots = ProcessSlots(
+                os.getenv("BROWSER_SLOTS_DIR", "data/browser_slots"),
+                int(os.getenv("BROWSER_MAX_ACTIVE_PAGES", str(max(1, (os.cpu_count() or 2) // 2)))),
+                name="page"
+            )
     
     async def start(self):
         """Inicia el navegador"""
-        self.playwright = await async_playwright().start()
+        # Importar Playwright cuesta decenas de ms: fuera del bucle de eventos
+        playwright_api = await asyncio.to_thread(importlib.import_module, "playwright.async_api")
+        self.playwright = await playwright_api.async_playwright().start()
         self.browser = await self.playwright.chromium.launch(headless=True)
         self.page = await self.browser.new_page()
         logger.info("🌐 Navegador iniciado")
     
+    async def ensure_started(self):
+        """Lanza el navegador si aún no está listo (una sola vez aunque haya llamadas concurrentes)"""
+        if self.state == "ready":
+            return
+        async with self._lock:
+            if self.state == "ready":
+                return
+            self.state = "starting"
+            started = time.monotonic()
+            try:
+                await self.start()
+            except Exception as e:
+                self.state = "failed"
+                self.last_error = str(e)
+                await self._stop()
+                raise
+            self.launch_seconds = round(time.monotonic() - started, 3)
+            self.state = "ready"
+            self.last_error = None
+    
+    def start_in_background(self) -> asyncio.Task:
+        """Lanza el navegador sin bloquear el arranque del servidor"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._background_start())
+        return self._task
+    
+    async def _background_start(self):
+        try:
+            await self.ensure_started()
+        except Exception as e:
+            logger.warning(f"⚠️ Error inicializando navegador: {e}")
+    
+    @asynccontextmanager
+    async def _slot(self):
+        """Reserva un hueco de navegación compartido por todos los workers"""
+        fd = None
+        if self.slots is not None:
+            fd = await self.slots.acquire(float(os.getenv("BROWSER_SLOT_TIMEOUT", "60")))
+        self.active_pages += 1
+        try:
+            yield
+        finally:
+            self.active_pages -= 1
+            if self.slots is not None:
+                self.slots.release(fd)
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "startup_mode": self.startup_mode,
+            "launch_seconds": self.launch_seconds,
+            "error": self.last_error,
+            "active_pages": self.active_pages,
+            "slots": self.slots.get_stats() if self.slots else None
+        }
+    
     async def navigate_to(self, url: str) -> dict:
         """Navega a una URL y extrae contenido"""
         try:
+            async with self._slot():
+                return await self._navigate_to(url)
+        except TimeoutError as e:
+            return {"success": False, "error": str(e), "url": url}
+    
+    async def extract_elements(self, url: str, selectors: list) -> dict:
+        """Extrae elementos específicos de una página"""
+        try:
+            async with self._slot():
+                return await self._extract_elements(url, selectors)
+        except TimeoutError as e:
+            return {"success": False, "error": str(e), "url": url}
+    
+    async def _navigate_to(self, url: str) -> dict:
+        try:
+            await self.ensure_started()
             await self.page.goto(url, wait_until="networkidle")
             
             # Extraer título
@@ -57,9 +160,9 @@ class BrowserAgent:
                 "url": url
             }
     
-    async def extract_elements(self, url: str, selectors: list) -> dict:
-        """Extrae elementos específicos de una página"""
+    async def _extract_elements(self, url: str, selectors: list) -> dict:
         try:
+            await self.ensure_started()
             await self.page.goto(url, wait_until="networkidle")
             
             results = {}
@@ -85,12 +188,22 @@ class BrowserAgent:
                 "url": url
             }
     
+    async def _stop(self):
+        browser, playwright = self.browser, self.playwright
+        self.playwright = self.browser = self.page = None
+        if browser:
+            await browser.close()
+        if playwright:
+            await playwright.stop()
+    
     async def close(self):
         """Cierra el navegador"""
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        async with self._lock:
+            await self._stop()
+            self.state = "stopped"
         logger.info("🌐 Navegador cerrado")
 
 # Instancia global
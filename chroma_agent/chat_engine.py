@@ -2,78 +2,302 @@
 SILHOUETTE SEARCH - Motor de Chat IA Real
 ====================================
 """
-import os
+import json
+import time
+import asyncio
 import aiohttp
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, AsyncIterator
+
+from chroma_agent.http_client import http_session
+from chroma_agent.resilience import model_guard, CircuitOpenError, UpstreamGuard
+from chroma_agent.response_cache import chat_cache_from_env
+from chroma_agent.model_router import router_from_env
+from chroma_agent.usage_store import usage_recorder
+from chroma_agent.settings import settings, Settings
 
 logger = logging.getLogger(__name__)
 
+# Fallos del upstream que justifican probar otro modelo; un 4xx o un error
+# propio de la petición fallaría igual con cualquier candidato
+_TRANSIENT_ERRORS = (asyncio.TimeoutError, aiohttp.ClientError)
+
+
 class ChatEngine:
     """Motor de chat usando OPENROUTER API"""
     
     def __init__(self):
-        self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.base_url = "https://openrouter.ai/api/v1"
-        self.default_model = "anthropic/claude-3.5-sonnet"
+        self._apply_settings(None, settings.current)
+        # Nueva clave o URL sin reiniciar: los streams abiertos conservan sus cabeceras
+        settings.subscribe(self._apply_settings, {"openrouter_api_key", "openrouter_base_url"})
+        self.router = router_from_env("anthropic/claude-3.5-sonnet")
+        self.default_model = self.router.default_model
+        self.cache = chat_cache_from_env()
     
-    async def chat(self, message: str, model: str = None) -> Dict[str, Any]:
-        """Envía mensaje al chat IA"""
-        if not self.api_key:
-            return {
-                "success": False,
-                "error": "OPENROUTER_API_KEY no configurada",
-                "message": message
-            }
-        
-        if not model:
-            model = self.default_model
-        
-        headers = {
+    def _apply_settings(self, previous: Optional[Settings], current: Settings, changed=None):
+        self.api_key = current.openrouter_api_key
+        self.base_url = current.openrouter_base_url
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
             "HTTP-Referer": "https://chroma-agent.local",
             "X-Title": "Chroma Agent"
         }
-        
+    
+    def _payload(self, messages: List[Dict[str, Any]], model: str, stream: bool = False, max_tokens: int = 1000) -> Dict[str, Any]:
         payload = {
             "model": model,
-            "messages": [
-                {"role": "user", "content": message}
-            ],
-            "max_tokens": 1000
+            "messages": messages,
+            "max_tokens": max_tokens
         }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+    
+    async def chat(self, message: str, model: str = None, use_cache: bool = True, policy: str = None) -> Dict[str, Any]:
+        """Envía mensaje al chat IA (use_cache=False omite la cache de respuestas)"""
+        result = await self.complete([{"role": "user", "content": message}], model, use_cache, policy=policy)
+        return {**result, "message": message}
+    
+    def _account(self, model: str, started: float, status: Any, usage: Dict[str, Any] = None, transient: bool = False):
+        """Registra el resultado en el router y en la contabilidad de uso.
         
+        status=None indica que el circuito cortó la llamada antes de salir y
+        no se registra nada. El router solo cuenta como fallo del modelo los
+        transitorios (5xx, 429, timeouts y errores de conexión).
+        """
+        if status is None:
+            return
+        latency = time.monotonic() - started
+        if status == 200 or transient:
+            self.router.record(model, latency, status == 200, usage)
+        usage_recorder.record("openrouter", status, latency, model, usage, self.router.estimate_cost(model, usage))
+    
+    def _candidates(self, model: str = None, policy: str = None) -> List[str]:
+        """Un modelo explícito se respeta; si no, el router decide el orden"""
+        return [model] if model else self.router.candidates(policy)
+    
+    async def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        model: str = None,
+        use_cache: bool = True,
+        max_tokens: int = 1000,
+        policy: str = None
+    ) -> Dict[str, Any]:
+        """Envía una conversación completa (lista de mensajes) al chat IA.
+        
+        Sin modelo explícito se prueban los candidatos del router en orden
+        mientras fallen por causas transitorias (5xx, 429, timeout, conexión
+        o circuito abierto); un 4xx se devuelve sin probar más modelos.
+        """
+        if not self.api_key:
+            return {
+                "success": False,
+                "error": "OPENROUTER_API_KEY no configurada"
+            }
+        
+        candidates = self._candidates(model, policy)
+        for index, candidate in enumerate(candidates):
+            result = await self._complete_with(candidate, messages, use_cache, max_tokens)
+            if result["success"] or not result.get("retryable") or index == len(candidates) - 1:
+                break
+            logger.warning(f"⚠️ Modelo {candidate} falló ({result.get('error')}), probando alternativa")
+        if index:
+            result["fallback_from"] = candidates[:index]
+        return result
+    
+    async def _complete_with(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        use_cache: bool,
+        max_tokens: int
+    ) -> Dict[str, Any]:
+        headers = self._headers()
+        payload = self._payload(messages, model, max_tokens=max_tokens)
+        cache_params = {k: v for k, v in payload.items() if k not in ("model", "messages")}
+        
+        use_cache = use_cache and self.cache is not None
+        if use_cache:
+            cached = await self.cache.aget(model, messages, cache_params)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
+        async def _request(timeout):
+            async with http_session() as session, session.post(
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json=payload,
+                timeout=timeout
+            ) as response:
+                if response.status == 200:
+                    return response.status, await response.json()
+                return response.status, None
+        
+        started = time.monotonic()
         try:
-            async with aiohttp.ClientSession() as session:
+            status, data = await model_guard(model).call(_request)
+            if status == 200:
+                result = {
+                    "success": True,
+                    "response": data["choices"][0]["message"]["content"],
+                    "model": model,
+                    "usage": data.get("usage", {}),
+                    "api": "OPENROUTER"
+                }
+                self._account(model, started, status, result["usage"])
+                if use_cache:
+                    self.cache.set(model, messages, cache_params, result)
+                return result
+            else:
+                transient = UpstreamGuard.is_failure_status(status)
+                self._account(model, started, status, transient=transient)
+                return {
+                    "success": False,
+                    "error": f"API error: {status}",
+                    "retryable": transient,
+                    "model": model
+                }
+        except CircuitOpenError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "retry_after": round(e.retry_after, 1),
+                "retryable": True,
+                "model": model
+            }
+        except Exception as e:
+            logger.error(f"Error en chat: {e}")
+            transient = isinstance(e, _TRANSIENT_ERRORS)
+            self._account(model, started, "error", transient=transient)
+            return {
+                "success": False,
+                "error": str(e) or type(e).__name__,
+                "retryable": transient,
+                "model": model
+            }
+
+    async def chat_stream(
+        self,
+        message: str = None,
+        model: str = None,
+        messages: List[Dict[str, Any]] = None,
+        policy: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Envía mensaje (o conversación) al chat IA y produce los tokens a medida que llegan.
+
+        Eventos: {"type": "delta", "content"}, y al final {"type": "done", "usage", ...}
+        o {"type": "error", "error"}. Si un modelo falla por una causa
+        transitoria antes del primer token se pasa al siguiente candidato del
+        router.
+        """
+        if not self.api_key:
+            yield {"type": "error", "error": "OPENROUTER_API_KEY no configurada"}
+            return
+        
+        messages = messages or [{"role": "user", "content": message}]
+        failed: List[str] = []
+        for candidate in self._candidates(model, policy):
+            streamed = False
+            error = None
+            events = self._stream_with(candidate, messages)
+            try:
+                async for event in events:
+                    if event["type"] == "error" and not streamed:
+                        error = event
+                        break
+                    streamed = streamed or event["type"] == "delta"
+                    if event["type"] == "done" and failed:
+                        event["fallback_from"] = failed
+                    yield event
+            finally:
+                # Cierra ya el generador (y su conexión) en vez de esperar al recolector
+                await events.aclose()
+            if error is None:
+                return
+            if not error.get("retryable"):
+                break
+            failed.append(candidate)
+            logger.warning(f"⚠️ Modelo {candidate} falló ({error.get('error')}), probando alternativa")
+        yield error
+    
+    async def _stream_with(self, model: str, messages: List[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        started = time.monotonic()
+        first_token_at = None
+        usage: Dict[str, Any] = {}
+        finish_reason = None
+        status_error = None
+        guard = model_guard(model)
+        
+        try:
+            async with http_session() as session, guard.track() as outcome:
+                # Sin timeout total: se limita el tiempo de espera entre fragmentos
+                timeout = aiohttp.ClientTimeout(total=None, sock_read=guard.current_timeout())
                 async with session.post(
                     f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=payload
+                    headers=self._headers(),
+                    json=self._payload(messages, model, stream=True),
+                    timeout=timeout
                 ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            "success": True,
-                            "message": message,
-                            "response": data["choices"][0]["message"]["content"],
-                            "model": model,
-                            "usage": data.get("usage", {}),
-                            "api": "OPENROUTER"
-                        }
-                    else:
-                        return {
-                            "success": False,
+                    outcome["status"] = response.status
+                    if response.status != 200:
+                        transient = guard.is_failure_status(response.status)
+                        self._account(model, started, response.status, transient=transient)
+                        status_error = {
+                            "type": "error",
                             "error": f"API error: {response.status}",
-                            "message": message
+                            "retryable": transient,
+                            "model": model
                         }
+                    else:
+                        # aiohttp entrega el cuerpo línea a línea y solo lee más cuando
+                        # el consumidor pide el siguiente evento (backpressure)
+                        async for raw_line in response.content:
+                            line = raw_line.decode("utf-8").strip()
+                            if not line.startswith("data:"):
+                                continue  # comentarios SSE (": OPENROUTER PROCESSING") y líneas vacías
+                            data = line[5:].strip()
+                            if data == "[DONE]":
+                                break
+                            chunk = json.loads(data)
+                            if chunk.get("usage"):
+                                usage = chunk["usage"]
+                            for choice in chunk.get("choices", []):
+                                finish_reason = choice.get("finish_reason") or finish_reason
+                                content = choice.get("delta", {}).get("content")
+                                if content:
+                                    if first_token_at is None:
+                                        first_token_at = time.monotonic()
+                                    yield {"type": "delta", "content": content}
+            # El error de estado se entrega fuera de track(): así el circuito registra
+            # el 5xx/429 aunque el consumidor abandone el generador tras recibirlo
+            if status_error is not None:
+                yield status_error
+                return
+        except CircuitOpenError as e:
+            yield {"type": "error", "error": str(e), "retry_after": round(e.retry_after, 1), "retryable": True, "model": model}
+            return
         except Exception as e:
-            logger.error(f"Error en chat: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "message": message
-            }
+            logger.error(f"Error en chat streaming: {e}")
+            transient = isinstance(e, _TRANSIENT_ERRORS)
+            self._account(model, started, "error", transient=transient)
+            yield {"type": "error", "error": str(e) or type(e).__name__, "retryable": transient, "model": model}
+            return
+        
+        self._account(model, started, 200, usage)
+        yield {
+            "type": "done",
+            "model": model,
+            "usage": usage,
+            "finish_reason": finish_reason,
+            "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "api": "OPENROUTER"
+        }
 
 # Instancia global
 chat_engine = ChatEngine()
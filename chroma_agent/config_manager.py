@@ -2,40 +2,46 @@
 SILHOUETTE SEARCH - Gestor de Configuración
 =====================================
 """
-import os
 from typing import Dict, Any, Optional
-from dotenv import load_dotenv
 
-load_dotenv()
+from chroma_agent.settings import settings
 
 class ConfigManager:
     """Gestor centralizado de configuración"""
     
     def __init__(self):
+        # Atributo de Settings que guarda cada clave
         self.required_apis = {
             "OPENROUTER_API_KEY": {
                 "name": "OPENROUTER",
+                "setting": "openrouter_api_key",
                 "description": "Chat inteligente con IA",
                 "required": True
             },
             "SERPER_API_KEY": {
                 "name": "SERPER", 
+                "setting": "serper_api_key",
                 "description": "Búsqueda web en Google",
                 "required": True
             },
             "UNSPLASH_ACCESS_KEY": {
                 "name": "UNSPLASH",
+                "setting": "unsplash_access_key",
                 "description": "Búsqueda de imágenes HD",
                 "required": False
             }
         }
     
+    @staticmethod
+    def _configured(info: Dict[str, Any]) -> bool:
+        return bool(getattr(settings.current, info["setting"]))
+    
     def get_api_status(self) -> Dict[str, Any]:
         """Obtiene el estado de configuración de las APIs"""
         status = {}
         for key, info in self.required_apis.items():
             status[info["name"]] = {
-                "configured": bool(os.getenv(key)),
+                "configured": self._configured(info),
                 "required": info["required"],
                 "description": info["description"]
             }
@@ -52,7 +58,7 @@ class ConfigManager:
     def is_fully_configured(self) -> bool:
         """Verifica si todas las APIs requeridas están configuradas"""
         for key, info in self.required_apis.items():
-            if info["required"] and not os.getenv(key):
+            if info["required"] and not self._configured(info):
                 return False
         return True
     
@@ -60,7 +66,7 @@ class ConfigManager:
         """Retorna lista de APIs faltantes"""
         missing = []
         for key, info in self.required_apis.items():
-            if info["required"] and not os.getenv(key):
+            if info["required"] and not self._configured(info):
                 missing.append(info["name"])
         return missing
 
@@ -0,0 +1,116 @@
+"""
+SILHOUETTE SEARCH - Cliente HTTP Compartido
+======================================
+
+Una única aiohttp.ClientSession por proceso para reutilizar conexiones
+keep-alive contra SERPER, OpenRouter y Unsplash.
+
+Las peticiones toman la sesión con `async with http_session()`, que cuenta
+cuántas la usan. Al cambiar los límites del pool se crea una sesión nueva
+para las peticiones siguientes y la anterior se cierra cuando termina la
+última petición que la usaba (un stream de chat incluido).
+"""
+import asyncio
+import aiohttp
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+
+from chroma_agent.settings import settings, Settings
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[aiohttp.ClientSession] = None
+_lock = asyncio.Lock()
+# Peticiones en curso por sesión y sesiones sustituidas pendientes de cerrar
+_leases: Dict[aiohttp.ClientSession, int] = {}
+_retired: Set[aiohttp.ClientSession] = set()
+_closing: Set[asyncio.Task] = set()
+
+
+def _new_session(current: Settings) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=current.max_connections,
+        limit_per_host=current.max_connections_per_host,
+        ttl_dns_cache=300
+    )
+    # Sin timeout total por defecto: cada upstream fija el suyo
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=None, connect=10)
+    )
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Obtiene (creándola si hace falta) la sesión HTTP compartida.
+
+    Para hacer peticiones usar http_session(): una sesión obtenida aquí
+    puede cerrarse si cambian los límites del pool.
+    """
+    global _session
+    if _session is None or _session.closed:
+        async with _lock:
+            if _session is None or _session.closed:
+                _session = _new_session(settings.current)
+                logger.info("🔌 Sesión HTTP compartida creada")
+    return _session
+
+
+@asynccontextmanager
+async def http_session() -> AsyncIterator[aiohttp.ClientSession]:
+    """Sesión compartida reservada mientras dure el bloque (petición y lectura del cuerpo)"""
+    session = await get_session()
+    _leases[session] = _leases.get(session, 0) + 1
+    try:
+        yield session
+    finally:
+        _leases[session] -= 1
+        if not _leases[session]:
+            del _leases[session]
+            if session in _retired:
+                _close_later(session)
+
+
+def _close_later(session: aiohttp.ClientSession):
+    _retired.discard(session)
+    task = asyncio.get_running_loop().create_task(session.close())
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+def _apply_limits(previous: Settings, current: Settings, changed=None):
+    """Aplica los límites del pool con una sesión nueva.
+
+    Las peticiones en curso terminan en la sesión anterior, que se cierra
+    cuando deja de usarse; las siguientes ya usan el pool nuevo.
+    """
+    global _session
+    if _session is None or _session.closed:
+        return
+    old, _session = _session, _new_session(current)
+    if _leases.get(old):
+        _retired.add(old)
+    else:
+        _close_later(old)
+    logger.info(
+        f"🔌 Pool HTTP: limit={current.max_connections}, "
+        f"limit_per_host={current.max_connections_per_host}"
+    )
+
+
+settings.subscribe(_apply_limits, {"max_connections", "max_connections_per_host"})
+
+
+async def close_session():
+    """Cierra la sesión HTTP compartida y las sustituidas que aún estuvieran abiertas"""
+    global _session
+    sessions = set(_retired)
+    if _session is not None:
+        sessions.add(_session)
+    _retired.clear()
+    _session = None
+    for session in sessions:
+        if not session.closed:
+            await session.close()
+    if _closing:
+        await asyncio.gather(*_closing, return_exceptions=True)
@@ -0,0 +1,247 @@
+"""
+SILHOUETTE SEARCH - Deduplicación Perceptual y Puntuación de Imágenes
+================================================================
+
+Etapa por lotes pensada para los servicios image-quality-verifier e
+image-search-team:
+
+1. Descarga concurrente de miniaturas (a través de la cache de miniaturas,
+   así repetir un análisis no consume ancho de banda).
+2. Decodificación con Pillow en un pool de hilos a una rejilla de 64x64 en
+   escala de grises (el modo draft de JPEG reduce al decodificar).
+3. Cálculo vectorizado con NumPy sobre todo el lote: dHash (gradientes 8x8),
+   pHash (DCT 32x32 como producto de matrices), nitidez (varianza del
+   laplaciano) y exposición (brillo medio y píxeles saturados).
+4. Orden por calidad y descarte de casi duplicados por distancia de Hamming.
+
+Pillow es opcional: sin él la etapa no está disponible (ImageDedupUnavailable).
+"""
+import os
+import io
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from chroma_agent.image_proxy import thumbnail_cache, ImageProxyError
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+GRID = 64
+_PHASH_SIZE = 32
+# Bordes de las 9 columnas del dHash sobre la rejilla de 64 (anchos 7,7,...,8)
+_DHASH_COLUMNS = np.array([0, 7, 14, 21, 28, 35, 42, 49, 56])
+
+
+class ImageDedupUnavailable(Exception):
+    """Falta Pillow para decodificar imágenes"""
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT = _dct_matrix(_PHASH_SIZE)
+
+# Tabla de bits a 1 por byte para numpy < 2.0 (sin np.bitwise_count)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """Bits a 1 de cada uint64"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def _pack_bits(bits: np.ndarray) -> np.ndarray:
+    """(N, 64) bool -> (N,) uint64"""
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def decode_grid(data: bytes) -> Optional[np.ndarray]:
+    """Bytes de imagen -> rejilla GRIDxGRID uint8 en escala de grises"""
+    if not PIL_AVAILABLE:
+        raise ImageDedupUnavailable("Pillow no está instalado")
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.draft("L", (GRID * 2, GRID * 2))
+            return np.asarray(image.convert("L").resize((GRID, GRID), Image.BILINEAR), dtype=np.uint8)
+    except Exception as e:
+        logger.debug(f"Imagen no decodificable: {e}")
+        return None
+
+
+def compute_features(grids: np.ndarray) -> Dict[str, np.ndarray]:
+    """Hashes y puntuaciones de un lote (N, GRID, GRID) en una sola pasada vectorizada"""
+    pixels = grids.astype(np.float32)
+    n = len(pixels)
+
+    # dHash: 8 bandas de filas x 9 de columnas, se compara cada celda con la siguiente
+    rows = pixels.reshape(n, 8, GRID // 8, GRID).mean(axis=2)
+    cells = np.add.reduceat(rows, _DHASH_COLUMNS, axis=2) / np.diff(np.append(_DHASH_COLUMNS, GRID))
+    dhash = _pack_bits((cells[:, :, 1:] > cells[:, :, :-1]).reshape(n, 64))
+
+    # pHash: DCT 2D de la imagen 32x32, bloque 8x8 de baja frecuencia contra su mediana
+    small = pixels.reshape(n, _PHASH_SIZE, 2, _PHASH_SIZE, 2).mean(axis=(2, 4))
+    low = (_DCT @ small @ _DCT.T)[:, :8, :8].reshape(n, 64)
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    phash = _pack_bits(low > median)
+
+    # Nitidez: varianza del laplaciano
+    laplacian = (
+        pixels[:, :-2, 1:-1] + pixels[:, 2:, 1:-1] + pixels[:, 1:-1, :-2] + pixels[:, 1:-1, 2:]
+        - 4 * pixels[:, 1:-1, 1:-1]
+    )
+    sharpness = laplacian.reshape(n, -1).var(axis=1)
+
+    # Exposición: 1 con brillo medio 0.5, penalizada por píxeles quemados o negros
+    brightness = pixels.reshape(n, -1).mean(axis=1) / 255.0
+    clipped = ((grids <= 5) | (grids >= 250)).reshape(n, -1).mean(axis=1)
+    exposure = np.clip(1.0 - 2.0 * np.abs(brightness - 0.5) - clipped, 0.0, 1.0)
+
+    # Calidad: nitidez normalizada (log, relativa al lote) por exposición
+    log_sharp = np.log1p(sharpness)
+    span = log_sharp.max() - log_sharp.min() if n else 0.0
+    sharp_norm = (log_sharp - log_sharp.min()) / span if span > 0 else np.ones(n, dtype=np.float32)
+    quality = 0.6 * sharp_norm + 0.4 * exposure
+
+    return {
+        "dhash": dhash,
+        "phash": phash,
+        "sharpness": sharpness,
+        "brightness": brightness,
+        "exposure": exposure,
+        "quality": quality
+    }
+
+
+def deduplicate(
+    features: Dict[str, np.ndarray],
+    phash_threshold: int = 10,
+    dhash_threshold: int = 12
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Recorre por calidad descendente y descarta lo que se parece a algo ya elegido.
+
+    Devuelve (índices conservados en orden de calidad, índice del original por
+    imagen o -1). Dos imágenes son duplicadas si ambos hashes están cerca.
+    """
+    order = np.argsort(-features["quality"], kind="stable")
+    phash, dhash = features["phash"], features["dhash"]
+    duplicate_of = np.full(len(order), -1, dtype=np.int64)
+    kept: List[int] = []
+    for index in order:
+        if kept:
+            kept_array = np.asarray(kept)
+            close = (
+                (popcount(phash[kept_array] ^ phash[index]) <= phash_threshold)
+                & (popcount(dhash[kept_array] ^ dhash[index]) <= dhash_threshold)
+            )
+            if close.any():
+                duplicate_of[index] = kept_array[np.argmax(close)]
+                continue
+        kept.append(index)
+    return np.asarray(kept, dtype=np.int64), duplicate_of
+
+
+class ImageBatchScorer:
+    """Descarga, puntúa y deduplica lotes de imágenes"""
+
+    def __init__(
+        self,
+        concurrency: int = 16,
+        phash_threshold: int = 10,
+        dhash_threshold: int = 12,
+        cache=None
+    ):
+        self.concurrency = concurrency
+        self.phash_threshold = phash_threshold
+        self.dhash_threshold = dhash_threshold
+        self.cache = cache or thumbnail_cache
+
+    @staticmethod
+    def image_url(image: Dict[str, Any]) -> Optional[str]:
+        """Miniatura a analizar: urls.small (resultado de ImageEngine), thumb o url"""
+        urls = image.get("urls")
+        url = (urls.get("small") if isinstance(urls, dict) else None) or image.get("thumb") or image.get("url")
+        return url if isinstance(url, str) else None
+
+    async def _load(self, url: str, semaphore: asyncio.Semaphore) -> Optional[bytes]:
+        async with semaphore:
+            try:
+                entry = await self.cache.get(url)
+                return await asyncio.to_thread(self.cache.blob_path(entry["content_hash"]).read_bytes)
+            except (ImageProxyError, OSError) as e:
+                logger.debug(f"No se pudo descargar {url}: {e}")
+                return None
+
+    async def score(self, images: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Devuelve las imágenes únicas ordenadas por calidad y las duplicadas"""
+        if not PIL_AVAILABLE:
+            raise ImageDedupUnavailable("Pillow no está instalado")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        urls = [self.image_url(image) for image in images]
+        payloads = await asyncio.gather(*(
+            self._load(url, semaphore) if url else asyncio.sleep(0) for url in urls
+        ))
+
+        # Pillow libera el GIL al decodificar: los hilos trabajan en paralelo
+        grids = await asyncio.gather(*(
+            asyncio.to_thread(decode_grid, data) for data in payloads if data
+        ))
+        valid = [i for i, data in enumerate(payloads) if data]
+        decoded = [(i, grid) for i, grid in zip(valid, grids) if grid is not None]
+        failed = sorted(set(range(len(images))) - {i for i, _ in decoded})
+        if not decoded:
+            return {"images": [], "duplicates": [], "failed": [images[i] for i in failed]}
+
+        positions = [i for i, _ in decoded]
+        features = compute_features(np.stack([grid for _, grid in decoded]))
+        kept, duplicate_of = deduplicate(features, self.phash_threshold, self.dhash_threshold)
+
+        def annotate(local: int) -> Dict[str, Any]:
+            return {
+                **images[positions[local]],
+                "phash": f"{int(features['phash'][local]):016x}",
+                "dhash": f"{int(features['dhash'][local]):016x}",
+                "sharpness": round(float(features["sharpness"][local]), 2),
+                "exposure": round(float(features["exposure"][local]), 4),
+                "quality": round(float(features["quality"][local]), 4)
+            }
+
+        duplicates = []
+        for local in np.flatnonzero(duplicate_of >= 0):
+            original = images[positions[duplicate_of[local]]]
+            duplicates.append({**annotate(local), "duplicate_of": original.get("id", self.image_url(original))})
+
+        return {
+            "images": [annotate(local) for local in kept],
+            "duplicates": duplicates,
+            "failed": [images[i] for i in failed]
+        }
+
+
+def scorer_from_env() -> ImageBatchScorer:
+    """Crea la etapa de puntuación desde variables de entorno"""
+    return ImageBatchScorer(
+        concurrency=int(os.getenv("IMAGE_DEDUP_CONCURRENCY", "16")),
+        phash_threshold=int(os.getenv("IMAGE_PHASH_THRESHOLD", "10")),
+        dhash_threshold=int(os.getenv("IMAGE_DHASH_THRESHOLD", "12"))
+    )
+
+
+# Instancia global
+image_scorer = scorer_from_env()
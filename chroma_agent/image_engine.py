@@ -3,9 +3,20 @@ SILHOUETTE SEARCH - Motor de Imágenes Real
 =====================================
 """
 import os
-import aiohttp
+import math
+import time
+import asyncio
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, AsyncIterator
+
+from chroma_agent.http_client import http_session
+from chroma_agent.pagination import encode_cursor, decode_cursor, prefetcher_from_env
+from chroma_agent.query_normalizer import cache_from_env
+from chroma_agent.resilience import upstreams, CircuitOpenError
+from chroma_agent.usage_store import usage_recorder
+from chroma_agent.projection import ImageHit, Fields, render_hits
+from chroma_agent.admission import make_bucket, take_tokens
+from chroma_agent.settings import settings, Settings
 
 logger = logging.getLogger(__name__)
 
@@ -13,11 +24,33 @@ class ImageEngine:
     """Motor de búsqueda de imágenes usando Unsplash API"""
     
     def __init__(self):
-        self.api_key = os.getenv("UNSPLASH_ACCESS_KEY")
-        self.base_url = "https://api.unsplash.com"
+        self._apply_settings(None, settings.current)
+        # Nueva clave o URL sin reiniciar: las peticiones en curso conservan sus cabeceras
+        settings.subscribe(self._apply_settings, {"unsplash_access_key", "unsplash_base_url"})
+        self.cache = cache_from_env("IMAGE_CACHE")
+        self.guard = upstreams["unsplash"]
+        self.prefetcher = prefetcher_from_env()
+        self.proxy_enabled = os.getenv("IMAGE_PROXY_ENABLED", "true").lower() == "true"
+        # Búsquedas de varias páginas: paralelismo, ritmo y cuota a reservar
+        self.fanout_concurrency = int(os.getenv("IMAGE_FANOUT_CONCURRENCY", "4"))
+        self.fanout_max_pages = int(os.getenv("IMAGE_FANOUT_MAX_PAGES", "10"))
+        self.fanout_bucket = make_bucket(
+            "unsplash:fanout",
+            float(os.getenv("IMAGE_FANOUT_RPS", "5")),
+            float(os.getenv("IMAGE_FANOUT_BURST", "5"))
+        )
+        self.rate_limit_reserve = int(os.getenv("UNSPLASH_RATE_LIMIT_RESERVE", "5"))
+        self.rate_limit_remaining: Optional[int] = None
+    
+    def _apply_settings(self, previous: Optional[Settings], current: Settings, changed=None):
+        self.api_key = current.unsplash_access_key
+        self.base_url = current.unsplash_base_url
+        if previous is not None and previous.unsplash_access_key != current.unsplash_access_key:
+            # La cuota restante era de la clave anterior
+            self.rate_limit_remaining = None
     
-    async def search_images(self, query: str, per_page: int = 10) -> Dict[str, Any]:
-        """Busca imágenes en Unsplash"""
+    async def search_images(self, query: str, per_page: int = 10, page: int = 1, fields: Fields = None) -> Dict[str, Any]:
+        """Busca imágenes en Unsplash (fields limita los campos de cada imagen)"""
         if not self.api_key:
             return {
                 "success": False,
@@ -25,59 +58,66 @@ class ImageEngine:
                 "query": query
             }
         
+        cached = await self.cache.aget(query, per_page=per_page, page=page)
+        if cached is not None:
+            return {**cached, "query": query, "cached": True, "images": self._render(cached["images"], fields)}
+        
         headers = {
             "Authorization": f"Client-ID {self.api_key}"
         }
         
         params = {
             "query": query,
-            "per_page": per_page
+            "per_page": per_page,
+            "page": page
         }
         
+        async def _request(timeout):
+            async with http_session() as session, session.get(
+                f"{self.base_url}/search/photos",
+                headers=headers,
+                params=params,
+                timeout=timeout
+            ) as response:
+                remaining = response.headers.get("X-Ratelimit-Remaining")
+                if remaining is not None and remaining.isdigit():
+                    self.rate_limit_remaining = int(remaining)
+                if response.status == 200:
+                    return response.status, await response.json()
+                return response.status, None
+        
+        started = time.monotonic()
+        status = "error"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/search/photos",
-                    headers=headers,
-                    params=params
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        images = []
-                        for photo in data.get("results", []):
-                            images.append({
-                                "id": photo["id"],
-                                "description": photo.get("description", ""),
-                                "alt_description": photo.get("alt_description", ""),
-                                "urls": {
-                                    "small": photo["urls"]["small"],
-                                    "regular": photo["urls"]["regular"],
-                                    "full": photo["urls"]["full"]
-                                },
-                                "user": {
-                                    "name": photo["user"]["name"],
-                                    "username": photo["user"]["username"]
-                                },
-                                "links": {
-                                    "html": photo["links"]["html"],
-                                    "download": photo["links"]["download"]
-                                }
-                            })
-                        
-                        return {
-                            "success": True,
-                            "query": query,
-                            "images": images,
-                            "total": data.get("total", 0),
-                            "total_pages": data.get("total_pages", 0),
-                            "api": "UNSPLASH"
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "error": f"API error: {response.status}",
-                            "query": query
-                        }
+            status, data = await self.guard.call(_request)
+            if status == 200:
+                # La cache guarda las fotos compactas; el JSON se arma al responder
+                images = [ImageHit(photo) for photo in data.get("results", [])]
+                
+                result = {
+                    "success": True,
+                    "query": query,
+                    "images": images,
+                    "total": data.get("total", 0),
+                    "total_pages": data.get("total_pages", 0),
+                    "api": "UNSPLASH"
+                }
+                self.cache.set(query, result, per_page=per_page, page=page)
+                return {**result, "images": self._render(images, fields)}
+            else:
+                return {
+                    "success": False,
+                    "error": f"API error: {status}",
+                    "query": query
+                }
+        except CircuitOpenError as e:
+            status = None
+            return {
+                "success": False,
+                "error": str(e),
+                "retry_after": round(e.retry_after, 1),
+                "query": query
+            }
         except Exception as e:
             logger.error(f"Error buscando imágenes: {e}")
             return {
@@ -85,6 +125,125 @@ class ImageEngine:
                 "error": str(e),
                 "query": query
             }
+        finally:
+            # Las llamadas cortadas por el circuito no llegan al upstream
+            if status is not None:
+                usage_recorder.record("unsplash", status, time.monotonic() - started)
+
+    async def search_images_page(
+        self,
+        query: Optional[str] = None,
+        cursor: Optional[str] = None,
+        per_page: int = 10,
+        fields: Fields = None
+    ) -> Dict[str, Any]:
+        """Búsqueda de imágenes paginada con cursor; precarga la página siguiente"""
+        page = 1
+        if cursor:
+            state = decode_cursor(cursor)
+            query, page, per_page = state["q"], state["p"], state["n"]
+        if not query:
+            raise ValueError("Consulta o cursor requeridos")
+        per_page = max(1, min(per_page, 30))  # máximo de Unsplash por página
+        
+        # Si la página se está precargando se espera a que termine y se sirve de la cache
+        await self.prefetcher.join(self.cache.make_key(query, per_page=per_page, page=page))
+        result = await self.search_images(query, per_page, page=page, fields=fields)
+        result = {**result, "query": query, "page": page, "next_cursor": None}
+        
+        if result["success"] and page < result.get("total_pages", 0):
+            next_page = page + 1
+            result["next_cursor"] = encode_cursor({"q": query, "p": next_page, "n": per_page})
+            self.prefetcher.schedule(
+                self.cache.make_key(query, per_page=per_page, page=next_page),
+                next_page,
+                lambda: self.search_images(query, per_page, page=next_page)
+            )
+        return result
+
+    def _render(self, images: List[ImageHit], fields: Fields) -> List[Dict[str, Any]]:
+        return render_hits(images, fields, proxy=self.proxy_enabled)
+
+    def _quota_exhausted(self) -> bool:
+        return self.rate_limit_remaining is not None and self.rate_limit_remaining <= self.rate_limit_reserve
+
+    async def _paced_page(self, query: str, per_page: int, page: int, fields: Fields = None) -> Dict[str, Any]:
+        """Una página respetando el ritmo máximo de peticiones al upstream"""
+        while not await take_tokens(self.fanout_bucket):
+            await asyncio.sleep(max(self.fanout_bucket.wait_time(), 0.001))
+        return {**await self.search_images(query, per_page, page=page, fields=fields), "page": page}
+
+    async def search_images_many(
+        self,
+        query: str,
+        target: int = 100,
+        per_page: int = 30,
+        fields: Fields = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Reúne hasta `target` imágenes pidiendo varias páginas en paralelo.
+
+        Produce {"type": "images", "images", "page", "collected"} por cada página
+        con imágenes nuevas (sin repetir id) y al final {"type": "done", ...}.
+        """
+        per_page = max(1, min(per_page, 30))  # máximo de Unsplash por página
+        if fields is not None and "id" not in fields:
+            fields = ("id",) + fields  # necesario para deduplicar
+        seen = set()
+        pages_fetched = 0
+        errors: List[str] = []
+        
+        def merge(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+            fresh = [image for image in result.get("images", []) if image["id"] not in seen]
+            seen.update(image["id"] for image in fresh)
+            return fresh[:max(0, target - (len(seen) - len(fresh)))]
+        
+        # La primera página indica cuántas hay en total
+        first = await self._paced_page(query, per_page, 1, fields)
+        pages_fetched += 1
+        if not first["success"]:
+            yield {"type": "error", "error": first.get("error"), "retry_after": first.get("retry_after")}
+            return
+        images = merge(first)
+        if images:
+            yield {"type": "images", "images": images, "page": 1, "collected": min(len(seen), target)}
+        
+        last_page = min(first.get("total_pages", 1), math.ceil(target / per_page), self.fanout_max_pages)
+        pending_pages = list(range(2, last_page + 1))
+        semaphore = asyncio.Semaphore(self.fanout_concurrency)
+        
+        async def fetch(page: int) -> Dict[str, Any]:
+            async with semaphore:
+                if self._quota_exhausted():
+                    return {"success": False, "error": "Cuota de Unsplash reservada", "page": page}
+                return await self._paced_page(query, per_page, page, fields)
+        
+        tasks = [asyncio.create_task(fetch(page)) for page in pending_pages]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                if len(seen) >= target:
+                    break
+                result = await next_done
+                pages_fetched += 1
+                if not result["success"]:
+                    errors.append(f"página {result['page']}: {result.get('error')}")
+                    continue
+                images = merge(result)
+                if images:
+                    yield {"type": "images", "images": images, "page": result["page"], "collected": min(len(seen), target)}
+        finally:
+            # Objetivo alcanzado o cliente desconectado: no se piden más páginas
+            for task in tasks:
+                task.cancel()
+        
+        yield {
+            "type": "done",
+            "query": query,
+            "collected": min(len(seen), target),
+            "target": target,
+            "pages_fetched": pages_fetched,
+            "total_available": first.get("total", 0),
+            "errors": errors
+        }
 
 # Instancia global
 image_engine = ImageEngine()
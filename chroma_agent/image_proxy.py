@@ -0,0 +1,354 @@
+"""
+SILHOUETTE SEARCH - Proxy y Cache de Miniaturas
+==========================================
+
+Descarga las imágenes de Unsplash una vez y las sirve desde disco:
+
+- Los ficheros se guardan por hash SHA-256 del contenido, así dos URLs con la
+  misma imagen comparten un solo fichero y el hash sirve de ETag fuerte.
+- Expulsión LRU por bytes totales (IMAGE_PROXY_MAX_BYTES).
+- Pasado el TTL se revalida con If-None-Match / If-Modified-Since: un 304
+  del upstream no consume ancho de banda; si el upstream falla se sirve la
+  copia guardada.
+- Las respuestas son FileResponse: con servidores que soportan la extensión
+  ASGI `http.response.pathsend` el envío es zero-copy y, si no, por bloques.
+  Un fichero que se está enviando no se expulsa ni se borra hasta terminar.
+- Escrituras, borrados y el recorrido inicial de metadatos van en hilos para
+  no bloquear el bucle de eventos.
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from urllib.parse import urlparse, quote
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import aiohttp
+from starlette.responses import FileResponse
+
+from chroma_agent.http_client import http_session
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 64 * 1024
+
+
+class ImageProxyError(Exception):
+    """La imagen no se puede servir (host no permitido, upstream caído, demasiado grande)"""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _unlink(paths: List[Path]):
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+class _BlobResponse(FileResponse):
+    """FileResponse que mantiene el fichero reservado hasta terminar el envío"""
+
+    def __init__(self, cache: "ThumbnailCache", content_hash: str, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+        self.content_hash = content_hash
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.cache._release(self.content_hash)
+
+
+class ThumbnailCache:
+    """Cache en disco direccionada por contenido con LRU por bytes"""
+
+    def __init__(
+        self,
+        cache_dir: str = "data/thumbnails",
+        max_bytes: int = 512 * 1024 * 1024,
+        ttl: float = 86400.0,
+        max_image_bytes: int = 10 * 1024 * 1024,
+        allowed_hosts: tuple = ("images.unsplash.com", "plus.unsplash.com")
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_image_bytes = max_image_bytes
+        self.allowed_hosts = allowed_hosts
+        self.timeout = aiohttp.ClientTimeout(total=30, connect=10)
+        # clave de URL -> metadatos; el orden es el de uso (LRU)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # hash de contenido -> (bytes, URLs que lo usan)
+        self._blobs: Dict[str, Dict[str, Any]] = {}
+        self.total_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # hash de contenido -> respuestas enviándolo; sin URLs se borra al terminar
+        self._serving: Dict[str, int] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stale_served": 0, "evicted": 0}
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def blob_path(self, content_hash: str) -> Path:
+        return self.cache_dir / "blobs" / content_hash[:2] / content_hash
+
+    def _meta_path(self, key: str) -> Path:
+        return self.cache_dir / "meta" / f"{key}.json"
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        """Metadatos en disco con su fichero presente (bloqueante: ejecutar en un hilo)"""
+        for sub in ("blobs", "meta", "tmp"):
+            (self.cache_dir / sub).mkdir(parents=True, exist_ok=True)
+        entries = []
+        for meta_path in (self.cache_dir / "meta").glob("*.json"):
+            try:
+                entry = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                continue
+            if self.blob_path(entry["content_hash"]).exists():
+                entries.append(entry)
+        return entries
+
+    async def _load(self):
+        """Reconstruye el índice desde los metadatos en disco (una vez por proceso)"""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            entries = await asyncio.to_thread(self._scan)
+            for entry in sorted(entries, key=lambda e: e["last_access"]):
+                self._add(entry)
+            self._loaded = True
+        if entries:
+            logger.info(f"🖼️ Cache de miniaturas: {len(entries)} entradas, {self.total_bytes} bytes")
+
+    def _add(self, entry: Dict[str, Any]):
+        self._entries[entry["key"]] = entry
+        blob = self._blobs.setdefault(entry["content_hash"], {"size": entry["size"], "urls": set()})
+        if not blob["urls"]:
+            self.total_bytes += entry["size"]
+        blob["urls"].add(entry["key"])
+
+    def _remove(self, key: str) -> List[Path]:
+        """Quita la entrada del índice y devuelve los ficheros que hay que borrar"""
+        entry = self._entries.pop(key)
+        paths = [self._meta_path(key)]
+        blob = self._blobs[entry["content_hash"]]
+        blob["urls"].discard(key)
+        if not blob["urls"]:
+            del self._blobs[entry["content_hash"]]
+            self.total_bytes -= blob["size"]
+            # Si se está enviando, lo borra _release() al terminar
+            if entry["content_hash"] not in self._serving:
+                paths.append(self.blob_path(entry["content_hash"]))
+        return paths
+
+    async def _delete(self, key: str):
+        await asyncio.to_thread(_unlink, self._remove(key))
+
+    def _write_meta(self, entry: Dict[str, Any]):
+        path = self._meta_path(entry["key"])
+        tmp = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps(entry), encoding="utf-8")
+        os.replace(tmp, path)
+
+    async def _save_meta(self, entry: Dict[str, Any]):
+        await asyncio.to_thread(self._write_meta, dict(entry))
+
+    async def _evict(self):
+        paths = []
+        for key in list(self._entries):
+            if self.total_bytes <= self.max_bytes or len(self._entries) <= 1:
+                break
+            if self._entries[key]["content_hash"] in self._serving:
+                continue
+            paths.extend(self._remove(key))
+            self.stats["evicted"] += 1
+        if paths:
+            await asyncio.to_thread(_unlink, paths)
+
+    def response(self, entry: Dict[str, Any], headers: Dict[str, str]) -> FileResponse:
+        """FileResponse del fichero de `entry`, protegido de la expulsión mientras se envía"""
+        content_hash = entry["content_hash"]
+        self._serving[content_hash] = self._serving.get(content_hash, 0) + 1
+        return _BlobResponse(
+            self, content_hash, self.blob_path(content_hash), media_type=entry["content_type"], headers=headers
+        )
+
+    async def _release(self, content_hash: str):
+        self._serving[content_hash] -= 1
+        if self._serving[content_hash]:
+            return
+        del self._serving[content_hash]
+        if content_hash not in self._blobs:
+            # Expulsado o sustituido mientras se enviaba
+            await asyncio.to_thread(_unlink, [self.blob_path(content_hash)])
+        elif self.total_bytes > self.max_bytes:
+            await self._evict()
+
+    def check_url(self, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or parsed.netloc not in self.allowed_hosts:
+            raise ImageProxyError(f"Host no permitido: {parsed.netloc or url}", 400)
+
+    async def get(self, url: str) -> Dict[str, Any]:
+        """Devuelve los metadatos de la imagen guardada, descargándola si hace falta"""
+        self.check_url(url)
+        await self._load()
+        key = self.url_key(url)
+        entry = self._entries.get(key)
+        if entry is not None and not self.blob_path(entry["content_hash"]).exists():
+            # Otro worker lo desalojó: se vuelve a descargar
+            await self._delete(key)
+            entry = None
+
+        if entry is not None and time.time() - entry["fetched_at"] < self.ttl:
+            self.stats["hits"] += 1
+            return self._touch(entry)
+
+        # Peticiones simultáneas de la misma URL comparten una sola descarga
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._fetch(url, key, entry)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Si nadie más esperaba, se marca la excepción como consumida
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def _touch(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        entry["last_access"] = time.time()
+        self._entries.move_to_end(entry["key"])
+        return entry
+
+    async def _fetch(self, url: str, key: str, entry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            async with http_session() as session, session.get(url, headers=headers, timeout=self.timeout) as response:
+                if response.status == 304 and entry is not None:
+                    self.stats["revalidated"] += 1
+                    entry["fetched_at"] = time.time()
+                    await self._save_meta(entry)
+                    return self._touch(entry)
+                if response.status != 200:
+                    raise ConnectionError(f"Upstream respondió {response.status}")
+                if response.content_length and response.content_length > self.max_image_bytes:
+                    raise ImageProxyError("Imagen demasiado grande", 413)
+
+                content_hash, size = await self._download(response)
+                new_entry = {
+                    "key": key,
+                    "url": url,
+                    "content_hash": content_hash,
+                    "size": size,
+                    "content_type": response.headers.get("Content-Type", "image/jpeg"),
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "fetched_at": time.time(),
+                    "last_access": time.time()
+                }
+        except ImageProxyError:
+            raise
+        except Exception as e:
+            if entry is not None:
+                # Upstream caído: mejor una copia algo antigua que un error
+                logger.warning(f"⚠️ Revalidación fallida para {url}: {e}")
+                self.stats["stale_served"] += 1
+                return self._touch(entry)
+            raise ImageProxyError(f"Error descargando imagen: {e}")
+
+        self.stats["misses"] += 1
+        if entry is not None:
+            if entry["content_hash"] == new_entry["content_hash"]:
+                # Mismo contenido con otros validadores: solo cambian los metadatos
+                entry.update(new_entry)
+                await self._save_meta(entry)
+                return self._touch(entry)
+            if key in self._entries:
+                await self._delete(key)
+        await self._save_meta(new_entry)
+        self._add(new_entry)
+        await self._evict()
+        return new_entry
+
+    async def _download(self, response) -> tuple:
+        """Copia el cuerpo a disco por bloques calculando el hash al vuelo"""
+        tmp_dir = self.cache_dir / "tmp"
+        tmp_path = tmp_dir / uuid.uuid4().hex
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            f = await asyncio.to_thread(open, tmp_path, "wb")
+            try:
+                async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        raise ImageProxyError("Imagen demasiado grande", 413)
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            content_hash = digest.hexdigest()
+            await asyncio.to_thread(self._commit_blob, tmp_path, self.blob_path(content_hash))
+            return content_hash, size
+        finally:
+            await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+
+    @staticmethod
+    def _commit_blob(tmp_path: Path, blob: Path):
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, blob)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "files": len(self._blobs),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            **self.stats
+        }
+
+
+def proxy_url(url: str) -> str:
+    """Ruta del proxy para una URL de imagen"""
+    return f"/api/imagenes/proxy?url={quote(url, safe='')}"
+
+
+def thumbnail_cache_from_env() -> ThumbnailCache:
+    """Crea la cache de miniaturas desde variables de entorno"""
+    hosts = os.getenv("IMAGE_PROXY_ALLOWED_HOSTS", "images.unsplash.com,plus.unsplash.com")
+    return ThumbnailCache(
+        cache_dir=os.getenv("IMAGE_PROXY_DIR", "data/thumbnails"),
+        max_bytes=int(os.getenv("IMAGE_PROXY_MAX_BYTES", str(512 * 1024 * 1024))),
+        ttl=float(os.getenv("IMAGE_PROXY_TTL", "86400")),
+        max_image_bytes=int(os.getenv("IMAGE_PROXY_MAX_IMAGE_BYTES", str(10 * 1024 * 1024))),
+        allowed_hosts=tuple(h.strip() for h in hosts.split(",") if h.strip())
+    )
+
+
+# Instancia global
+thumbnail_cache = thumbnail_cache_from_env()
@@ -0,0 +1,175 @@
+"""
+SILHOUETTE SEARCH - Salud del Bucle de Eventos
+==========================================
+
+Detecta trabajo síncrono que bloquea el bucle de eventos (lecturas de
+archivos, load_dotenv, CPU dentro de un handler...):
+
+- Un latido asíncrono duerme `interval` y mide cuánto tarde despierta: ese
+  retraso es el lag del bucle. Se guarda en una ventana para percentiles y
+  se exporta como métrica.
+- Un hilo vigilante comprueba que el latido avanza. Si el bucle lleva más de
+  `threshold` sin latir, captura la pila del hilo del bucle *mientras sigue
+  bloqueado* y la registra: la traza señala la línea culpable, no la que
+  se ejecute después.
+
+El coste es un temporizador cada `interval` y un hilo que despierta cada
+threshold / 2.
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+from chroma_agent.metrics import metrics
+from chroma_agent.resilience import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (50, 90, 99)
+
+
+class LoopMonitor:
+    """Mide el lag del bucle de eventos y captura la pila de los bloqueos"""
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        window: int = 600,
+        max_stalls: int = 20,
+        stack_limit: int = 30
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_limit = stack_limit
+        self.lag = LatencyTracker(window)
+        self.stalls: deque = deque(maxlen=max_stalls)
+        self.max_lag = 0.0
+        self._loop_thread: Optional[int] = None
+        self._last_beat = time.monotonic()
+        # Latido en el que se registró el último bloqueo (uno por bloqueo)
+        self._stall_beat: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {"beats": 0, "stalls": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Arranca latido y vigilante (requiere un bucle de eventos activo)"""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        metrics.register_gauge(
+            "event_loop_lag_quantile_seconds", "Percentiles del lag del bucle en la ventana reciente", ["quantile"],
+            self._quantiles
+        )
+        logger.info(f"🩺 Vigilando el bucle de eventos (latido {self.interval}s, bloqueo > {self.threshold}s)")
+
+    async def close(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, self.threshold)
+            self._thread = None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            previous_beat = self._last_beat
+            self._last_beat = time.monotonic()
+            self.stats["beats"] += 1
+            self.lag.record(lag)
+            self.max_lag = max(self.max_lag, lag)
+            metrics.observe_loop_lag(lag)
+            if lag >= self.threshold and self._stall_beat == previous_beat and self.stalls:
+                # El vigilante ya capturó la pila: se completa con la duración real
+                self.stalls[-1]["seconds"] = round(lag, 3)
+                logger.warning(f"🐢 El bucle de eventos estuvo bloqueado {lag:.3f}s")
+
+    def _watchdog(self):
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or beat == self._stall_beat:
+                continue
+            self._stall_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = traceback.format_stack(frame, self.stack_limit) if frame is not None else []
+            del frame
+            self.stats["stalls"] += 1
+            metrics.count_loop_stall()
+            self.stalls.append({
+                "at": time.time(),
+                "seconds": round(blocked, 3),
+                "stack": [line.rstrip() for line in stack]
+            })
+            logger.warning(
+                f"🐢 Bucle de eventos bloqueado más de {blocked:.3f}s; pila del bucle:\n{''.join(stack).rstrip()}"
+            )
+
+    def _quantiles(self):
+        for q in QUANTILES:
+            yield (str(q / 100),), self.lag.percentile(q)
+
+    def get_stats(self, stacks: bool = False) -> Dict[str, Any]:
+        """Percentiles del lag (ms) y bloqueos recientes; con stacks=True incluye sus pilas"""
+        percentiles = {}
+        for q in QUANTILES:
+            value = self.lag.percentile(q)
+            percentiles[f"p{q}_ms"] = round(value * 1000, 1) if value is not None else None
+        recent: List[Dict[str, Any]] = [
+            stall if stacks else {
+                "at": stall["at"],
+                "seconds": stall["seconds"],
+                "where": stall["stack"][-1].strip().splitlines()[0] if stall["stack"] else None
+            }
+            for stall in self.stalls
+        ]
+        return {
+            "running": self.running,
+            "interval_s": self.interval,
+            "threshold_s": self.threshold,
+            **percentiles,
+            "max_ms": round(self.max_lag * 1000, 1),
+            **self.stats,
+            "recent_stalls": recent
+        }
+
+
+def loop_monitor_from_env() -> Optional[LoopMonitor]:
+    """Crea el monitor del bucle desde variables de entorno (None si está desactivado)"""
+    if os.getenv("LOOP_MONITOR_ENABLED", "true").lower() != "true":
+        return None
+    return LoopMonitor(
+        interval=float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1")),
+        threshold=float(os.getenv("LOOP_MONITOR_THRESHOLD", "0.25")),
+        stack_limit=int(os.getenv("LOOP_MONITOR_STACK_LIMIT", "30"))
+    )
+
+
+# Instancia global (None con LOOP_MONITOR_ENABLED=false)
+loop_monitor = loop_monitor_from_env()
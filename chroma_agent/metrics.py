@@ -0,0 +1,250 @@
+"""
+SILHOUETTE SEARCH - Métricas Prometheus
+===================================
+
+Instrumentación común para el servidor de chroma_agent, el servidor
+unificado y el API Gateway de V4:
+
+- MetricsMiddleware (ASGI puro): peticiones por ruta, método y estado,
+  histograma de latencia y peticiones en curso. La ruta es la plantilla
+  (`/api/chat/lotes/{job_id}`), no la URL, para no disparar la cardinalidad.
+- Tiempos de cada intento contra los upstreams (SERPER, Unsplash, OpenRouter)
+  que registra resilience.UpstreamGuard.
+- Lag del bucle de eventos y bloqueos que detecta loop_monitor.
+- Gauges calculados al hacer scrape (estado del navegador, circuitos,
+  cola de admisión) con register_gauge().
+
+Requiere el paquete opcional `prometheus-client`; sin él todo es no-op y
+/metrics responde 503. Con varios workers, definir PROMETHEUS_MULTIPROC_DIR
+(directorio vacío al arrancar) para que cualquier worker devuelva la suma de
+todos; los gauges calculados describen solo al worker que responde.
+"""
+import os
+import time
+import logging
+from typing import Dict, Any, Callable, Iterable, Optional, Sequence, Tuple
+
+from starlette.responses import Response, PlainTextResponse
+
+try:
+    from prometheus_client import (
+        REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    )
+    from prometheus_client.core import GaugeMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:  # sin prometheus-client no se instrumenta nada
+    PROMETHEUS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Desde respuestas servidas de cache (ms) hasta chats largos de OpenRouter
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Lag del bucle de eventos: de sub-milisegundo a bloqueos de segundos
+LOOP_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+UNMATCHED_ROUTE = "unmatched"
+
+GaugeReader = Callable[[], Iterable[Tuple[Sequence[str], Optional[float]]]]
+
+
+class _CallbackCollector:
+    """Gauge cuyo valor se calcula al hacer scrape"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], read: GaugeReader):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = list(labelnames)
+        self.read = read
+
+    def describe(self):
+        # Sin descripción previa el registro no llama a collect() al registrarse
+        return []
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+        try:
+            for labels, value in self.read():
+                if value is not None:
+                    family.add_metric([str(label) for label in labels], float(value))
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo calcular la métrica {self.name}: {e}")
+            return
+        yield family
+
+
+class Metrics:
+    """Métricas del proceso; sin prometheus-client todos los métodos son no-op"""
+
+    def __init__(self, namespace: str = "silhouette", enabled: bool = True):
+        self.namespace = namespace
+        self.enabled = enabled and PROMETHEUS_AVAILABLE
+        self.multiprocess_dir = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+        self.started_at = time.time()
+        self._collectors: Dict[str, _CallbackCollector] = {}
+        if not self.enabled:
+            return
+
+        self.requests = Counter(
+            "http_requests_total", "Peticiones HTTP atendidas",
+            ["method", "route", "status"], namespace=namespace
+        )
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Duración de las peticiones HTTP hasta el último byte",
+            ["method", "route"], namespace=namespace, buckets=LATENCY_BUCKETS
+        )
+        self.in_flight = Gauge(
+            "http_requests_in_flight", "Peticiones HTTP en curso",
+            namespace=namespace, multiprocess_mode="livesum"
+        )
+        self.upstream_latency = Histogram(
+            "upstream_request_duration_seconds", "Duración de cada intento contra un upstream",
+            ["upstream", "outcome"], namespace=namespace, buckets=LATENCY_BUCKETS
+        )
+        self.loop_lag = Histogram(
+            "event_loop_lag_seconds", "Retraso del latido del bucle de eventos",
+            namespace=namespace, buckets=LOOP_LAG_BUCKETS
+        )
+        self.loop_stalls = Counter(
+            "event_loop_stalls", "Bloqueos del bucle de eventos por encima del umbral",
+            namespace=namespace
+        )
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        if self.enabled:
+            self.requests.labels(method, route, str(status)).inc()
+            self.latency.labels(method, route).observe(seconds)
+
+    def observe_upstream(self, upstream: str, outcome: str, seconds: float):
+        """outcome: ok, failure (5xx/429), error (excepción) o cancelled (hedge descartado)"""
+        if self.enabled:
+            self.upstream_latency.labels(upstream, outcome).observe(seconds)
+
+    def observe_loop_lag(self, seconds: float):
+        if self.enabled:
+            self.loop_lag.observe(seconds)
+
+    def count_loop_stall(self):
+        if self.enabled:
+            self.loop_stalls.inc()
+
+    def register_gauge(self, name: str, documentation: str, labelnames: Sequence[str], read: GaugeReader):
+        """Registra un gauge calculado en cada scrape.
+
+        read() devuelve pares (valores de etiquetas, valor); los valores None
+        se omiten. Registrar dos veces el mismo nombre reemplaza la función.
+        """
+        if not self.enabled:
+            return
+        full_name = f"{self.namespace}_{name}"
+        previous = self._collectors.pop(full_name, None)
+        if previous is not None:
+            REGISTRY.unregister(previous)
+        collector = _CallbackCollector(full_name, documentation, labelnames, read)
+        REGISTRY.register(collector)
+        self._collectors[full_name] = collector
+
+    def _registry(self):
+        if not self.multiprocess_dir:
+            return REGISTRY
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in self._collectors.values():
+            registry.register(collector)
+        return registry
+
+    def response(self) -> Response:
+        """Respuesta de /metrics en formato de exposición de texto"""
+        if not self.enabled:
+            reason = "desactivadas (METRICS_ENABLED=false)" if PROMETHEUS_AVAILABLE else "no disponibles: instalar prometheus-client"
+            return PlainTextResponse(f"Métricas {reason}\n", status_code=503)
+        return Response(generate_latest(self._registry()), media_type=CONTENT_TYPE_LATEST)
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen legible de las peticiones por ruta (para endpoints de analytics)"""
+        if not self.enabled:
+            return {"available": False}
+        routes: Dict[str, Dict[str, Any]] = {}
+        for metric in self.requests.collect():
+            for sample in metric.samples:
+                if not sample.name.endswith("_total"):
+                    continue
+                route = routes.setdefault(sample.labels["route"], {"requests": 0, "errors": 0, "seconds": 0.0})
+                route["requests"] += int(sample.value)
+                if sample.labels["status"].startswith("5"):
+                    route["errors"] += int(sample.value)
+        for metric in self.latency.collect():
+            for sample in metric.samples:
+                if sample.name.endswith("_sum") and sample.labels["route"] in routes:
+                    routes[sample.labels["route"]]["seconds"] += sample.value
+
+        total = sum(r["requests"] for r in routes.values())
+        errors = sum(r["errors"] for r in routes.values())
+        return {
+            "available": True,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "requests": total,
+            "errors": errors,
+            "success_rate": round(1 - errors / total, 4) if total else None,
+            "in_flight": int(sum(s.value for m in self.in_flight.collect() for s in m.samples)),
+            "routes": {
+                name: {
+                    "requests": r["requests"],
+                    "errors": r["errors"],
+                    "avg_ms": round(r["seconds"] / r["requests"] * 1000, 1) if r["requests"] else None
+                }
+                for name, r in sorted(routes.items())
+            }
+        }
+
+
+class MetricsMiddleware:
+    """Middleware ASGI que mide cada petición HTTP por plantilla de ruta"""
+
+    def __init__(self, app, metrics: "Metrics"):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.in_flight.dec()
+            # El router deja la ruta resuelta en el scope compartido
+            route = scope.get("route")
+            self.metrics.observe_request(
+                scope["method"],
+                getattr(route, "path", None) or UNMATCHED_ROUTE,
+                status,
+                time.perf_counter() - started
+            )
+
+
+def metrics_from_env() -> Metrics:
+    """Crea las métricas del proceso desde variables de entorno"""
+    metrics = Metrics(
+        namespace=os.getenv("METRICS_NAMESPACE", "silhouette"),
+        enabled=os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    )
+    if not PROMETHEUS_AVAILABLE:
+        logger.info("📊 prometheus-client no instalado: /metrics desactivado")
+    return metrics
+
+
+# Instancia global
+metrics = metrics_from_env()
@@ -0,0 +1,177 @@
+"""
+SILHOUETTE SEARCH - Enrutado de Modelos de Chat
+==========================================
+
+Mide latencia, tasa de error y coste de cada modelo con medias móviles
+exponenciales (EWMA) a partir de las respuestas reales, y ordena los modelos
+permitidos según una política (fastest, cheapest, quality) para elegir el
+primero y tener alternativas si el upstream falla.
+"""
+import os
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("fastest", "cheapest", "quality")
+
+
+def _parse_prices(spec: str) -> Dict[str, float]:
+    """Precios por 1K tokens: "modelo=0.003,otro=0.0004" """
+    prices = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, price = item.partition("=")
+        try:
+            prices[model.strip()] = float(price)
+        except ValueError:
+            logger.warning(f"⚠️ Precio inválido para {model}: {price}")
+    return prices
+
+
+class ModelStats:
+    """Estadísticas EWMA de un modelo"""
+
+    def __init__(self, alpha: float, error_half_life: float = 60.0):
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self.latency: Optional[float] = None
+        # Tasa de error en el instante updated_at; decae con el tiempo sin llamadas
+        self._error_rate = 0.0
+        self.updated_at = time.monotonic()
+        self.cost_per_1k: Optional[float] = None
+        self.calls = 0
+        self.failures = 0
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        return value if current is None else self.alpha * value + (1 - self.alpha) * current
+
+    @property
+    def error_rate(self) -> float:
+        """Tasa de error EWMA que se reduce a la mitad cada error_half_life sin muestras.
+
+        Un modelo relegado tras una caída no recibe llamadas que la corrijan:
+        sin decaimiento quedaría al final de la lista para siempre.
+        """
+        if self.error_half_life <= 0:
+            return self._error_rate
+        idle = time.monotonic() - self.updated_at
+        return self._error_rate * 0.5 ** (idle / self.error_half_life)
+
+    def record(self, latency: float, success: bool, cost_per_1k: Optional[float]):
+        self.calls += 1
+        self._error_rate = self._ewma(self.error_rate if self.calls > 1 else None, 0.0 if success else 1.0)
+        self.updated_at = time.monotonic()
+        if success:
+            self.latency = self._ewma(self.latency, latency)
+            if cost_per_1k is not None:
+                self.cost_per_1k = self._ewma(self.cost_per_1k, cost_per_1k)
+        else:
+            self.failures += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "ewma_latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "cost_per_1k_tokens": round(self.cost_per_1k, 6) if self.cost_per_1k is not None else None,
+            "calls": self.calls,
+            "failures": self.failures
+        }
+
+
+class ModelRouter:
+    """Elige el modelo por política y proporciona el orden de fallback"""
+
+    def __init__(
+        self,
+        allowed_models: List[str],
+        policy: str = "quality",
+        alpha: float = 0.2,
+        max_error_rate: float = 0.5,
+        prices: Optional[Dict[str, float]] = None,
+        max_attempts: int = 3,
+        error_half_life: float = 60.0
+    ):
+        if not allowed_models:
+            raise ValueError("Se necesita al menos un modelo permitido")
+        # El orden de allowed_models es el ranking de calidad
+        self.allowed_models = allowed_models
+        self.policy = policy if policy in POLICIES else "quality"
+        self.max_error_rate = max_error_rate
+        self.prices = prices or {}
+        self.max_attempts = max_attempts
+        self.error_half_life = error_half_life
+        self.stats = {model: ModelStats(alpha, error_half_life) for model in allowed_models}
+
+    @property
+    def default_model(self) -> str:
+        return self.allowed_models[0]
+
+    def _stats(self, model: str) -> ModelStats:
+        if model not in self.stats:
+            self.stats[model] = ModelStats(self.stats[self.default_model].alpha, self.error_half_life)
+        return self.stats[model]
+
+    def _cost(self, model: str) -> float:
+        stats = self._stats(model)
+        if stats.cost_per_1k is not None:
+            return stats.cost_per_1k
+        return self.prices.get(model, float("inf"))
+
+    def candidates(self, policy: Optional[str] = None) -> List[str]:
+        """Modelos en orden de preferencia; los que fallan demasiado van al final"""
+        policy = policy if policy in POLICIES else self.policy
+        quality_rank = {model: i for i, model in enumerate(self.allowed_models)}
+
+        if policy == "fastest":
+            # Sin datos se considera latencia 0 para que el modelo se explore
+            key = lambda m: (self._stats(m).latency or 0.0, quality_rank[m])
+        elif policy == "cheapest":
+            key = lambda m: (self._cost(m), quality_rank[m])
+        else:
+            key = lambda m: quality_rank[m]
+
+        ordered = sorted(self.allowed_models, key=key)
+        healthy = [m for m in ordered if self._stats(m).error_rate <= self.max_error_rate]
+        degraded = [m for m in ordered if m not in healthy]
+        return (healthy + degraded)[:self.max_attempts]
+
+    def estimate_cost(self, model: str, usage: Optional[Dict[str, Any]]) -> Optional[float]:
+        """Coste de una llamada: el informado por OpenRouter o el de la tabla de precios"""
+        usage = usage or {}
+        if usage.get("cost") is not None:
+            return float(usage["cost"])
+        total_tokens = usage.get("total_tokens") or 0
+        if total_tokens and model in self.prices:
+            return self.prices[model] * total_tokens / 1000
+        return None
+
+    def record(self, model: str, latency: float, success: bool, usage: Optional[Dict[str, Any]] = None):
+        """Registra el resultado real de una llamada"""
+        cost_per_1k = None
+        total_tokens = (usage or {}).get("total_tokens") or 0
+        cost = self.estimate_cost(model, usage)
+        if success and total_tokens and cost is not None:
+            cost_per_1k = cost / total_tokens * 1000
+        self._stats(model).record(latency, success, cost_per_1k)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "allowed_models": self.allowed_models,
+            "models": {model: stats.as_dict() for model, stats in self.stats.items()}
+        }
+
+
+def router_from_env(default_model: str) -> ModelRouter:
+    """Crea el router desde variables de entorno"""
+    allowed = [m.strip() for m in os.getenv("CHAT_ALLOWED_MODELS", default_model).split(",") if m.strip()]
+    return ModelRouter(
+        allowed_models=allowed,
+        policy=os.getenv("CHAT_ROUTING_POLICY", "quality"),
+        alpha=float(os.getenv("CHAT_ROUTING_EWMA_ALPHA", "0.2")),
+        max_error_rate=float(os.getenv("CHAT_ROUTING_MAX_ERROR_RATE", "0.5")),
+        prices=_parse_prices(os.getenv("CHAT_MODEL_PRICES", "")),
+        max_attempts=int(os.getenv("CHAT_MAX_MODEL_ATTEMPTS", "3")),
+        error_half_life=float(os.getenv("CHAT_ROUTING_ERROR_HALF_LIFE", "60"))
+    )
@@ -0,0 +1,96 @@
+"""
+SILHOUETTE SEARCH - Paginación con Cursores y Precarga
+=================================================
+
+Cursores opacos para paginar búsquedas e imágenes, y precarga especulativa
+de la página siguiente en la cache con un presupuesto configurable.
+"""
+import os
+import json
+import base64
+import asyncio
+import logging
+from typing import Dict, Any, Awaitable, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(state: Dict[str, Any]) -> str:
+    """Codifica el estado de paginación como token opaco"""
+    raw = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Decodifica un cursor; lanza ValueError si no es válido"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if not isinstance(state, dict) or not isinstance(state.get("q"), str):
+        raise ValueError("Cursor inválido")
+    if not isinstance(state.get("p"), int) or not isinstance(state.get("n"), int) or state["p"] < 1 or state["n"] < 1:
+        raise ValueError("Cursor inválido")
+    return state
+
+
+class Prefetcher:
+    """Lanza precargas en segundo plano respetando un presupuesto de concurrencia y profundidad"""
+
+    def __init__(self, max_inflight: int = 4, max_page: int = 5, enabled: bool = True):
+        self.max_inflight = max_inflight
+        self.max_page = max_page
+        self.enabled = enabled
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"scheduled": 0, "skipped": 0, "joined": 0}
+
+    def schedule(self, key: Hashable, page: int, factory: Callable[[], Awaitable[Any]]) -> bool:
+        """Programa la precarga de una página si el presupuesto lo permite"""
+        if (
+            not self.enabled
+            or page > self.max_page
+            or key in self._inflight
+            or len(self._inflight) >= self.max_inflight
+        ):
+            self.stats["skipped"] += 1
+            return False
+
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+
+        def _done(finished: asyncio.Task):
+            self._inflight.pop(key, None)
+            if not finished.cancelled() and finished.exception() is not None:
+                logger.warning(f"⚠️ Error en precarga: {finished.exception()}")
+
+        task.add_done_callback(_done)
+        self.stats["scheduled"] += 1
+        return True
+
+    async def join(self, key: Hashable) -> Optional[Any]:
+        """Si la página se está precargando, espera su resultado en lugar de repetir la llamada"""
+        task = self._inflight.get(key)
+        if task is None:
+            return None
+        self.stats["joined"] += 1
+        # shield: si el cliente cancela, la precarga sigue llenando la cache
+        return await asyncio.shield(task)
+
+    async def close(self):
+        """Cancela las precargas pendientes"""
+        for task in list(self._inflight.values()):
+            task.cancel()
+        self._inflight.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "inflight": len(self._inflight)}
+
+
+def prefetcher_from_env() -> Prefetcher:
+    """Crea un Prefetcher configurado desde variables de entorno"""
+    return Prefetcher(
+        max_inflight=int(os.getenv("PREFETCH_MAX_INFLIGHT", "4")),
+        max_page=int(os.getenv("PREFETCH_MAX_PAGE", "5")),
+        enabled=os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+    )
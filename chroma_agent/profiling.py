@@ -0,0 +1,280 @@
+"""
+SILHOUETTE SEARCH - Perfilado en Caliente
+=====================================
+
+Herramientas para ver qué hace el proceso en producción sin reiniciarlo:
+
+- SamplingProfiler: un hilo muestrea cada pocos ms la pila del bucle de
+  eventos (o de todos los hilos) con sys._current_frames() y agrega las pilas
+  en formato "collapsed" (`a;b;c 42`), listo para flamegraph.pl, speedscope
+  o inferno. El coste es el de leer unas pilas cada intervalo: apto para
+  producción durante unos segundos.
+- cProfile durante una ventana de tiempo sobre el hilo del bucle: todas las
+  corrutinas que se ejecutan en ese intervalo quedan registradas (texto de
+  pstats o volcado .prof para snakeviz).
+- MemoryTracker: instantáneas de tracemalloc y diferencia con la anterior
+  para localizar crecimiento de memoria en servidores de larga duración.
+
+Solo se permite un perfil a la vez.
+"""
+import io
+import os
+import sys
+import time
+import pstats
+import marshal
+import cProfile
+import asyncio
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Origen de las asignaciones que no interesan (el propio tracemalloc, importlib)
+_MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class ProfilerBusy(RuntimeError):
+    """Ya hay un perfil en curso"""
+
+
+def _short_path(filename: str) -> str:
+    if "site-packages" in filename:
+        return filename.rsplit("site-packages" + os.sep, 1)[-1]
+    cwd = os.getcwd() + os.sep
+    if filename.startswith(cwd):
+        return filename[len(cwd):]
+    return os.path.basename(filename)
+
+
+class SamplingProfiler:
+    """Perfilador estadístico por muestreo de pilas y ventanas de cProfile"""
+
+    def __init__(self, max_seconds: float = 60.0, min_interval: float = 0.001):
+        self.max_seconds = max_seconds
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        # code object -> nombre de marco (se calcula una vez por función)
+        self._names: Dict[Any, str] = {}
+        self.stats = {"profiles": 0, "samples": 0, "rejected": 0}
+
+    @property
+    def busy(self) -> bool:
+        return self._lock.locked()
+
+    def _acquire(self):
+        if not self._lock.acquire(blocking=False):
+            self.stats["rejected"] += 1
+            raise ProfilerBusy("Ya hay un perfil en curso")
+        self.stats["profiles"] += 1
+
+    def clamp(self, seconds: float) -> float:
+        return min(max(seconds, 0.1), self.max_seconds)
+
+    def _frame_name(self, code) -> str:
+        name = self._names.get(code)
+        if name is None:
+            qualname = getattr(code, "co_qualname", code.co_name)
+            # Sin ';' ni espacios finales: son separadores del formato collapsed
+            name = f"{qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+            self._names[code] = name
+        return name
+
+    @staticmethod
+    def _is_idle(frame) -> bool:
+        # El bucle de asyncio espera eventos dentro de selectors.*.select
+        code = frame.f_code
+        return code.co_name in ("select", "poll") and code.co_filename.endswith("selectors.py")
+
+    def _stack(self, frame) -> List[str]:
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_name(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def sample(
+        self,
+        seconds: float,
+        interval: float = 0.01,
+        thread_ids: Optional[Set[int]] = None,
+        include_idle: bool = False
+    ) -> Counter:
+        """Muestrea las pilas durante `seconds` (bloqueante: ejecutar en un hilo).
+
+        Con thread_ids=None se muestrean todos los hilos y cada pila empieza
+        por el nombre del hilo.
+        """
+        self._acquire()
+        try:
+            counts: Counter = Counter()
+            me = threading.get_ident()
+            interval = max(interval, self.min_interval)
+            deadline = time.monotonic() + self.clamp(seconds)
+            while time.monotonic() < deadline:
+                names = None if thread_ids is not None else {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me or (thread_ids is not None and ident not in thread_ids):
+                        continue
+                    if not include_idle and self._is_idle(frame):
+                        continue
+                    stack = self._stack(frame)
+                    if names is not None:
+                        stack.insert(0, f"thread:{names.get(ident, ident)}")
+                    counts[";".join(stack)] += 1
+                self.stats["samples"] += 1
+                time.sleep(interval)
+            return counts
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def collapsed(counts: Counter) -> str:
+        """Formato de flamegraph.pl: una pila por línea seguida del número de muestras"""
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    async def cprofile(self, seconds: float) -> cProfile.Profile:
+        """cProfile sobre el hilo del bucle durante `seconds` (todas las corrutinas que corran)"""
+        self._acquire()
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await asyncio.sleep(self.clamp(seconds))
+            finally:
+                profile.disable()
+            return profile
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def pstats_text(profile: cProfile.Profile, sort: str = "cumulative", limit: int = 60) -> str:
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    @staticmethod
+    def pstats_dump(profile: cProfile.Profile) -> bytes:
+        """Mismo contenido que Profile.dump_stats() (formato .prof), sin pasar por disco"""
+        profile.create_stats()
+        return marshal.dumps(profile.stats)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"busy": self.busy, "max_seconds": self.max_seconds, **self.stats}
+
+
+class MemoryTracker:
+    """Instantáneas de tracemalloc y crecimiento entre ellas"""
+
+    def __init__(self, frames: int = 25, limit: int = 30):
+        self.frames = frames
+        self.limit = limit
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_at: Optional[float] = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: Optional[int] = None):
+        if not self.tracing:
+            tracemalloc.start(frames or self.frames)
+            logger.info(f"🧠 tracemalloc activado ({tracemalloc.get_traceback_limit()} marcos)")
+        self.baseline = None
+
+    def stop(self):
+        if self.tracing:
+            tracemalloc.stop()
+            logger.info("🧠 tracemalloc desactivado")
+        self.baseline = None
+        self.baseline_at = None
+
+    def _take(self) -> tracemalloc.Snapshot:
+        if not self.tracing:
+            raise RuntimeError("tracemalloc no está activo (POST /debug/tracemalloc/start o PYTHONTRACEMALLOC)")
+        return tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+
+    @staticmethod
+    def _where(stat, key_type: str) -> Any:
+        if key_type == "traceback":
+            return stat.traceback.format()
+        frame = stat.traceback[0]
+        return f"{_short_path(frame.filename)}:{frame.lineno}" if key_type == "lineno" else _short_path(frame.filename)
+
+    def _totals(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory()
+        return {"traced_kb": round(current / 1024, 1), "peak_kb": round(peak / 1024, 1)}
+
+    def snapshot(self, key_type: str = "lineno", limit: Optional[int] = None) -> Dict[str, Any]:
+        """Toma una instantánea, la guarda como referencia y devuelve los mayores consumos"""
+        snapshot = self._take()
+        self.baseline = snapshot
+        self.baseline_at = time.time()
+        top = snapshot.statistics(key_type)[:limit or self.limit]
+        return {
+            **self._totals(),
+            "key_type": key_type,
+            "top": [
+                {"where": self._where(stat, key_type), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in top
+            ]
+        }
+
+    def diff(self, key_type: str = "lineno", limit: Optional[int] = None, reset: bool = False) -> Dict[str, Any]:
+        """Crecimiento desde la instantánea de referencia (reset=True la sustituye por la actual)"""
+        if self.baseline is None:
+            raise RuntimeError("No hay instantánea de referencia (POST /debug/tracemalloc/snapshot)")
+        snapshot = self._take()
+        since = round(time.time() - self.baseline_at, 1)
+        top = snapshot.compare_to(self.baseline, key_type)[:limit or self.limit]
+        if reset:
+            self.baseline = snapshot
+            self.baseline_at = time.time()
+        return {
+            **self._totals(),
+            "key_type": key_type,
+            "seconds_since_baseline": since,
+            "top": [
+                {
+                    "where": self._where(stat, key_type),
+                    "size_kb": round(stat.size / 1024, 1),
+                    "size_diff_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count,
+                    "count_diff": stat.count_diff
+                }
+                for stat in top
+            ]
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {"tracing": self.tracing, "baseline": self.baseline is not None}
+        if self.tracing:
+            stats.update(self._totals())
+        return stats
+
+
+def profiler_from_env() -> SamplingProfiler:
+    """Crea el perfilador desde variables de entorno"""
+    return SamplingProfiler(max_seconds=float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "60")))
+
+
+def memory_tracker_from_env() -> MemoryTracker:
+    """Crea el seguimiento de memoria desde variables de entorno"""
+    return MemoryTracker(
+        frames=int(os.getenv("DEBUG_TRACEMALLOC_FRAMES", "25")),
+        limit=int(os.getenv("DEBUG_TRACEMALLOC_LIMIT", "30"))
+    )
+
+
+# Instancias globales
+profiler = profiler_from_env()
+memory_tracker = memory_tracker_from_env()
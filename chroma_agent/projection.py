@@ -0,0 +1,143 @@
+"""
+SILHOUETTE SEARCH - Resultados Compactos y Proyección de Campos
+==========================================================
+
+Los resultados de SERPER y Unsplash se guardan como objetos con __slots__
+(sin un dict por instancia ni dicts anidados por foto) y se convierten a
+JSON solo al responder. Con `fields=` el cliente pide únicamente los campos
+que usa (`title,link` o `id,urls.small`) y la respuesta se construye con
+ellos, reduciendo asignaciones, serialización y tamaño del payload.
+"""
+from typing import Dict, Any, List, Optional, Tuple
+
+from chroma_agent.image_proxy import proxy_url
+
+Fields = Optional[Tuple[str, ...]]
+
+
+def parse_fields(spec: Optional[str], allowed: Optional[Dict[str, Any]] = None) -> Fields:
+    """"a,b.c" -> ("a", "b.c"); None o vacío = todos los campos"""
+    if not spec:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in spec.split(",") if f.strip()))
+    if allowed is not None:
+        unknown = [f for f in fields if f not in allowed]
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(unknown)} (disponibles: {', '.join(allowed)})")
+    return fields or None
+
+
+class SearchHit:
+    """Resultado orgánico de SERPER"""
+
+    __slots__ = ("title", "link", "snippet", "position", "date", "sitelinks", "extra")
+
+    # Campos conocidos; los demás del resultado original se conservan en `extra`
+    KNOWN = ("title", "link", "snippet", "position", "date", "sitelinks")
+
+    def __init__(self, item: Dict[str, Any]):
+        self.title = item.get("title")
+        self.link = item.get("link")
+        self.snippet = item.get("snippet")
+        self.position = item.get("position")
+        self.date = item.get("date")
+        self.sitelinks = item.get("sitelinks")
+        extra = {k: v for k, v in item.items() if k not in self.KNOWN}
+        self.extra = extra or None
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.KNOWN if getattr(self, name) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def project(self, fields: Fields) -> Dict[str, Any]:
+        if fields is None:
+            return self.as_dict()
+        extra = self.extra or {}
+        return {
+            name: getattr(self, name) if name in self.KNOWN else extra.get(name)
+            for name in fields
+        }
+
+
+class ImageHit:
+    """Foto de Unsplash aplanada en atributos"""
+
+    __slots__ = (
+        "id", "description", "alt_description",
+        "url_small", "url_regular", "url_full",
+        "user_name", "user_username",
+        "link_html", "link_download"
+    )
+
+    # Ruta pública (la forma anidada de siempre) -> atributo
+    PATHS = {
+        "id": "id",
+        "description": "description",
+        "alt_description": "alt_description",
+        "urls.small": "url_small",
+        "urls.regular": "url_regular",
+        "urls.full": "url_full",
+        "user.name": "user_name",
+        "user.username": "user_username",
+        "links.html": "link_html",
+        "links.download": "link_download"
+    }
+    GROUPS = ("urls", "user", "links", "proxy")
+    FIELDS = {**PATHS, **{group: group for group in GROUPS}, "proxy.small": None, "proxy.regular": None}
+
+    def __init__(self, photo: Dict[str, Any]):
+        self.id = photo["id"]
+        self.description = photo.get("description", "")
+        self.alt_description = photo.get("alt_description", "")
+        self.url_small = photo["urls"]["small"]
+        self.url_regular = photo["urls"]["regular"]
+        self.url_full = photo["urls"]["full"]
+        self.user_name = photo["user"]["name"]
+        self.user_username = photo["user"]["username"]
+        self.link_html = photo["links"]["html"]
+        self.link_download = photo["links"]["download"]
+
+    def _value(self, path: str) -> Any:
+        if path == "proxy.small":
+            return proxy_url(self.url_small)
+        if path == "proxy.regular":
+            return proxy_url(self.url_regular)
+        return getattr(self, self.PATHS[path])
+
+    def as_dict(self, proxy: bool = False) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "description": self.description,
+            "alt_description": self.alt_description,
+            "urls": {"small": self.url_small, "regular": self.url_regular, "full": self.url_full},
+            "user": {"name": self.user_name, "username": self.user_username},
+            "links": {"html": self.link_html, "download": self.link_download}
+        }
+        if proxy:
+            # Rutas servidas desde la cache local de miniaturas
+            data["proxy"] = {"small": proxy_url(self.url_small), "regular": proxy_url(self.url_regular)}
+        return data
+
+    def project(self, fields: Fields, proxy: bool = False) -> Dict[str, Any]:
+        if fields is None:
+            return self.as_dict(proxy)
+        data: Dict[str, Any] = {}
+        for field in fields:
+            if field in self.GROUPS:
+                prefix = field + "."
+                paths = [p for p in self.FIELDS if p.startswith(prefix)]
+            else:
+                paths = [field]
+            for path in paths:
+                head, _, leaf = path.partition(".")
+                if leaf:
+                    data.setdefault(head, {})[leaf] = self._value(path)
+                else:
+                    data[head] = self._value(path)
+        return data
+
+
+def render_hits(hits: List[Any], fields: Fields, **options: Any) -> List[Dict[str, Any]]:
+    return [hit.project(fields, **options) for hit in hits]
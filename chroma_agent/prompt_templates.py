@@ -0,0 +1,203 @@
+"""
+SILHOUETTE SEARCH - Registro de Plantillas de Prompts
+================================================
+
+Plantillas con variables `{nombre}` que se compilan una sola vez: se separan
+los fragmentos literales de las variables, se valida que cada render reciba
+exactamente las variables declaradas y se precalcula el prefijo estático
+(todo lo anterior a la primera variable) con su tamaño en tokens.
+
+Mantener el contenido fijo al principio permite reutilizar la cache de
+prompts del proveedor: OpenAI la aplica sola sobre prefijos idénticos y para
+Anthropic/Gemini vía OpenRouter se marca el prefijo con `cache_control`.
+"""
+import os
+import logging
+from pathlib import Path
+from string import Formatter
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Proveedores que necesitan marcar explícitamente el bloque cacheable
+_CACHE_CONTROL_PREFIXES = ("anthropic/", "google/gemini")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida de tokens (~4 caracteres por token)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+class PromptTemplate:
+    """Plantilla compilada: fragmentos literales, variables y prefijo estático"""
+
+    def __init__(self, name: str, template: str, description: str = "", render_cache_size: int = 256):
+        self.name = name
+        self.template = template
+        self.description = description
+        self.segments: List[Tuple[str, Optional[str]]] = []
+        variables: List[str] = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if field is not None:
+                if not field.isidentifier() or spec or conversion:
+                    raise ValueError(f"Plantilla {name}: variable no soportada {{{field}}}")
+                if field not in variables:
+                    variables.append(field)
+            self.segments.append((literal, field))
+        self.variables = tuple(variables)
+
+        prefix = []
+        for literal, field in self.segments:
+            prefix.append(literal)
+            if field is not None:
+                break
+        self.static_prefix = "".join(prefix)
+        self.static_prefix_tokens = estimate_tokens(self.static_prefix) if self.static_prefix else 0
+
+        self._renders: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._render_cache_size = render_cache_size
+        self.stats = {"renders": 0, "cache_hits": 0, "tokens_total": 0}
+
+    def validate(self, variables: Dict[str, Any]):
+        missing = [v for v in self.variables if v not in variables]
+        unknown = [v for v in variables if v not in self.variables]
+        if missing or unknown:
+            raise ValueError(
+                f"Plantilla {self.name}: faltan {missing or '-'}, sobran {unknown or '-'}"
+            )
+
+    def render(self, variables: Optional[Dict[str, Any]] = None) -> str:
+        variables = variables or {}
+        self.validate(variables)
+        key = tuple(str(variables[v]) for v in self.variables)
+        text = self._renders.get(key)
+        if text is not None:
+            self._renders.move_to_end(key)
+            self.stats["cache_hits"] += 1
+        else:
+            values = dict(zip(self.variables, key))
+            text = "".join(literal + (values[field] if field is not None else "") for literal, field in self.segments)
+            self._renders[key] = text
+            if len(self._renders) > self._render_cache_size:
+                self._renders.popitem(last=False)
+        self.stats["renders"] += 1
+        self.stats["tokens_total"] += estimate_tokens(text)
+        return text
+
+    def as_dict(self) -> Dict[str, Any]:
+        renders = self.stats["renders"]
+        return {
+            "name": self.name,
+            "description": self.description,
+            "variables": list(self.variables),
+            "static_prefix_tokens": self.static_prefix_tokens,
+            "template_tokens": estimate_tokens(self.template),
+            "renders": renders,
+            "cache_hits": self.stats["cache_hits"],
+            "avg_tokens": round(self.stats["tokens_total"] / renders, 1) if renders else None
+        }
+
+
+class PromptRegistry:
+    """Plantillas por nombre y ensamblado de mensajes para ChatEngine"""
+
+    def __init__(self, cache_min_tokens: int = 1024):
+        self.cache_min_tokens = cache_min_tokens
+        self.templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, template: str, description: str = "") -> PromptTemplate:
+        compiled = PromptTemplate(name, template, description)
+        self.templates[name] = compiled
+        return compiled
+
+    def get(self, name: str) -> PromptTemplate:
+        if name not in self.templates:
+            raise KeyError(f"Plantilla no registrada: {name}")
+        return self.templates[name]
+
+    def render(self, name: str, variables: Optional[Dict[str, Any]] = None) -> str:
+        return self.get(name).render(variables)
+
+    def load_dir(self, directory: str) -> int:
+        """Registra cada `<nombre>.txt` del directorio como plantilla"""
+        path = Path(directory)
+        if not path.is_dir():
+            return 0
+        loaded = 0
+        for file in sorted(path.glob("*.txt")):
+            try:
+                self.register(file.stem, file.read_text(encoding="utf-8"), f"Cargada de {file.name}")
+                loaded += 1
+            except ValueError as e:
+                logger.warning(f"⚠️ {e}")
+        return loaded
+
+    def _system_content(self, template: PromptTemplate, text: str, model: Optional[str]) -> Any:
+        cacheable = (
+            model is not None
+            and model.startswith(_CACHE_CONTROL_PREFIXES)
+            and template.static_prefix_tokens >= self.cache_min_tokens
+        )
+        if not cacheable:
+            return text
+        rest = text[len(template.static_prefix):]
+        content = [{"type": "text", "text": template.static_prefix, "cache_control": {"type": "ephemeral"}}]
+        if rest:
+            content.append({"type": "text", "text": rest})
+        return content
+
+    def messages(
+        self,
+        name: str,
+        user_message: Optional[str] = None,
+        model: Optional[str] = None,
+        variables: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Mensaje de sistema desde la plantilla y, opcionalmente, el del usuario.
+
+        Las variables van en un diccionario aparte: una variable de plantilla
+        llamada `model` o `name` no choca con los parámetros del método.
+        """
+        template = self.get(name)
+        text = template.render(variables)
+        messages = [{"role": "system", "content": self._system_content(template, text, model)}]
+        if user_message is not None:
+            messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: template.as_dict() for name, template in self.templates.items()}
+
+
+def registry_from_env() -> PromptRegistry:
+    """Crea el registro con las plantillas integradas y las de PROMPT_TEMPLATES_DIR"""
+    registry = PromptRegistry(cache_min_tokens=int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "1024")))
+    registry.register(
+        "chroma_agent",
+        "Eres un asistente inteligente llamado Chroma Agent.",
+        "Persona por defecto del chat"
+    )
+    registry.register(
+        "team",
+        "Eres un asistente inteligente llamado Chroma Agent, integrado en el framework "
+        "multiagente de Silhouette. Responde de forma precisa y accionable, en el idioma "
+        "del usuario, indicando supuestos y próximos pasos cuando proceda.\n\n"
+        "Actúas como miembro del equipo {team}. Objetivo del equipo: {goal}",
+        "Prompt de sistema de los equipos de framework_v4"
+    )
+    registry.register(
+        "session_summary",
+        "Resume de forma concisa la siguiente conversación entre un usuario y un asistente, "
+        "conservando hechos, decisiones, nombres y preferencias que sean necesarios para continuarla. "
+        "Responde solo con el resumen.",
+        "Resumen de los turnos que salen de la ventana de una sesión"
+    )
+    loaded = registry.load_dir(os.getenv("PROMPT_TEMPLATES_DIR", "prompts"))
+    if loaded:
+        logger.info(f"📝 {loaded} plantillas de prompts cargadas")
+    return registry
+
+
+# Instancia global
+prompt_registry = registry_from_env()
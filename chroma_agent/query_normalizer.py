@@ -0,0 +1,293 @@
+"""
+SILHOUETTE SEARCH - Normalización de Consultas y Cache
+=================================================
+
+Canonicaliza consultas (mayúsculas, espacios, acentos, orden de palabras y
+stopwords en español e inglés) para que consultas equivalentes compartan la
+misma clave de cache sin perder origen y destino ni palabras repetidas, y
+detecta consultas casi duplicadas mediante MinHash.
+"""
+import os
+import re
+import time
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from chroma_agent.shared_state import SharedStore, shared_store
+
+# Solo palabras que no cambian el sentido de una búsqueda: negaciones
+# ("sin gluten"), comparativos ("mas barato"), preposiciones de orden o
+# posición ("antes de", "under 100") y de dirección no se eliminan
+STOPWORDS_ES = frozenset("""
+algunas algunos ante como con cual cuales cuando de del donde durante e el
+ella ellas ellos en entre era es esa esas ese eso esos esta estas este esto
+estos fue ha hay la las le les lo los me mi mis muy nos o os otra otro pero
+por porque que quien se sea ser si sobre son su sus tambien te tiene tu tus
+un una unas uno unos y ya yo
+""".split())
+
+STOPWORDS_EN = frozenset("""
+about all an and any are as at be been but by can could did do does for
+had has have how i if in is it its just me my of on or our so some such
+that the their them then there these they this those very was we were
+what when where which who why will with would you your
+""".split())
+
+STOPWORDS = STOPWORDS_ES | STOPWORDS_EN
+
+# Preposiciones de origen y destino: con ellas el orden importa ("desde
+# madrid a paris" no es "desde paris a madrid") y la consulta no se reordena
+DIRECTIONAL = frozenset("""
+a al desde hacia hasta para from to into towards
+""".split())
+
+# Palabras que invierten el sentido: dos consultas que se diferencian en
+# ellas nunca son casi duplicadas aunque MinHash las vea parecidas
+NEGATIONS = frozenset("""
+no ni sin nada nunca tampoco not without never nor none
+""".split())
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+# Primo de Mersenne 2^61 - 1 para las permutaciones universales de MinHash
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def strip_accents(text: str) -> str:
+    """Elimina acentos y diacríticos conservando la letra base"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize_query(query: str) -> List[str]:
+    """Tokeniza una consulta en minúsculas, sin acentos ni puntuación"""
+    text = strip_accents(query.casefold())
+    return [token for token in _NON_WORD.split(text) if token and token != "_"]
+
+
+def canonicalize_query(query: str) -> str:
+    """Devuelve la forma canónica de una consulta para usarla como clave de cache"""
+    tokens = tokenize_query(query)
+    meaningful = [token for token in tokens if token not in STOPWORDS]
+    # Si la consulta solo tiene stopwords ("the who") se conservan todas
+    meaningful = meaningful or tokens
+    if DIRECTIONAL.intersection(meaningful):
+        return " ".join(meaningful)
+    # Se ordena sin quitar repetidas: "bora bora" no es "bora"
+    return " ".join(sorted(meaningful))
+
+
+def query_shingles(canonical: str, size: int = 3) -> List[str]:
+    """Genera shingles de palabras y de caracteres para MinHash"""
+    words = canonical.split()
+    shingles = set(words)
+    for word in words:
+        padded = f"#{word}#"
+        if len(padded) <= size:
+            shingles.add(padded)
+            continue
+        for i in range(len(padded) - size + 1):
+            shingles.add(padded[i:i + size])
+    return sorted(shingles)
+
+
+class MinHasher:
+    """Firmas MinHash con bandas LSH para detectar consultas casi duplicadas"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._perms = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"{seed}:{i}".encode(), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], "little") % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], "little") % _MERSENNE_PRIME
+            self._perms.append((a, b))
+
+    @staticmethod
+    def _hash(shingle: str) -> int:
+        return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "little")
+
+    def signature(self, shingles: List[str]) -> Tuple[int, ...]:
+        """Calcula la firma MinHash de un conjunto de shingles"""
+        if not shingles:
+            return tuple([_MAX_HASH] * self.num_perm)
+        hashes = [self._hash(shingle) for shingle in shingles]
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+    def band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        """Divide la firma en bandas para indexarla en las tablas LSH"""
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+        """Estimación de la similitud de Jaccard entre dos firmas"""
+        if not sig_a:
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class QueryCache:
+    """Cache LRU con TTL indexada por consulta canónica y búsqueda de casi duplicados"""
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        max_entries: int = 1024,
+        near_duplicate_threshold: Optional[float] = None,
+        hasher: Optional[MinHasher] = None,
+        shared: Optional[SharedStore] = None,
+        namespace: str = "query"
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.near_duplicate_threshold = near_duplicate_threshold or None
+        self.hasher = hasher or MinHasher()
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[Tuple, set] = {}
+        # Segundo nivel compartido entre workers (SharedStore), solo por clave exacta
+        self.shared = shared
+        self.namespace = namespace
+        self.stats = {"hits": 0, "near_hits": 0, "shared_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _params_key(params: Dict[str, Any]) -> Tuple:
+        return tuple(sorted(params.items()))
+
+    def make_key(self, query: str, **params) -> Tuple:
+        """Clave de cache: consulta canónica más parámetros de la petición"""
+        return (canonicalize_query(query), self._params_key(params))
+
+    def _bucket_keys(self, params_key: Tuple, signature: Tuple[int, ...]) -> List[Tuple]:
+        return [(params_key, band) for band in self.hasher.band_keys(signature)]
+
+    def _remove(self, key: Tuple):
+        entry = self._entries.pop(key, None)
+        if entry and entry.get("signature") is not None:
+            for bucket_key in self._bucket_keys(key[1], entry["signature"]):
+                bucket = self._buckets.get(bucket_key)
+                if bucket:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._buckets[bucket_key]
+
+    def _live_entry(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["stored_at"] > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _near_duplicate(self, canonical: str, params_key: Tuple) -> Optional[Dict[str, Any]]:
+        signature = self.hasher.signature(query_shingles(canonical))
+        candidates = set()
+        for bucket_key in self._bucket_keys(params_key, signature):
+            candidates.update(self._buckets.get(bucket_key, ()))
+        negations = NEGATIONS.intersection(canonical.split())
+        best, best_score = None, self.near_duplicate_threshold
+        for candidate in candidates:
+            if NEGATIONS.intersection(candidate[0].split()) != negations:
+                continue
+            entry = self._live_entry(candidate)
+            if entry is None:
+                continue
+            score = self.hasher.similarity(signature, entry["signature"])
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def get(self, query: str, **params) -> Optional[Any]:
+        """Obtiene un resultado cacheado en este proceso (sin el nivel compartido), o None"""
+        return self._get(self.make_key(query, **params))
+
+    async def aget(self, query: str, **params) -> Optional[Any]:
+        """Como get(), consultando también el nivel compartido entre workers"""
+        key = self.make_key(query, **params)
+        entry = self._live_entry(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry["value"]
+        if self.shared is not None:
+            value = await self.shared.aget(self.namespace, repr(key))
+            if value is not None:
+                self.stats["shared_hits"] += 1
+                self._store(key, value)
+                return value
+        return self._get(key)
+
+    def _get(self, key: Tuple) -> Optional[Any]:
+        entry = self._live_entry(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry["value"]
+        if self.near_duplicate_threshold:
+            entry = self._near_duplicate(*key)
+            if entry is not None:
+                self.stats["near_hits"] += 1
+                return entry["value"]
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, query: str, value: Any, **params):
+        """Guarda un resultado para la consulta"""
+        key = self.make_key(query, **params)
+        self._store(key, value)
+        if self.shared is not None:
+            self.shared.set_later(self.namespace, repr(key), value, self.ttl)
+
+    def _store(self, key: Tuple, value: Any):
+        self._remove(key)
+        signature = None
+        if self.near_duplicate_threshold:
+            signature = self.hasher.signature(query_shingles(key[0]))
+            for bucket_key in self._bucket_keys(key[1], signature):
+                self._buckets.setdefault(bucket_key, set()).add(key)
+        self._entries[key] = {
+            "value": value,
+            "signature": signature,
+            "stored_at": time.monotonic()
+        }
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Vacía la cache"""
+        self._entries.clear()
+        self._buckets.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de aciertos de la cache"""
+        lookups = sum(self.stats.values())
+        hits = self.stats["hits"] + self.stats["near_hits"] + self.stats["shared_hits"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def cache_from_env(prefix: str) -> QueryCache:
+    """Crea una QueryCache configurada desde variables de entorno"""
+    threshold = float(os.getenv(f"{prefix}_NEAR_DUP_THRESHOLD", os.getenv("QUERY_NEAR_DUP_THRESHOLD", "0")))
+    return QueryCache(
+        ttl=float(os.getenv(f"{prefix}_TTL", os.getenv("CACHE_TTL", "3600"))),
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", "1024")),
+        near_duplicate_threshold=threshold if threshold > 0 else None,
+        shared=shared_store,
+        namespace=prefix
+    )
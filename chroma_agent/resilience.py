@@ -0,0 +1,305 @@
+"""
+SILHOUETTE SEARCH - Resiliencia de APIs Externas
+===========================================
+
+Circuit breakers por upstream, timeouts adaptativos según percentiles de
+latencia observados y peticiones "hedged" para llamadas idempotentes.
+"""
+import os
+import time
+import asyncio
+import aiohttp
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Awaitable, Callable, Optional, Tuple
+
+from chroma_agent.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Una llamada a un upstream recibe el timeout a aplicar y devuelve (status, data)
+UpstreamCall = Callable[[aiohttp.ClientTimeout], Awaitable[Tuple[int, Any]]]
+
+
+class CircuitOpenError(Exception):
+    """El circuito del upstream está abierto: se falla rápido sin llamar"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} no disponible temporalmente (circuito abierto)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Ventana deslizante de latencias para calcular percentiles"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentil p (0-100) de la ventana, o None si no hay muestras"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """Circuit breaker con estados cerrado, abierto y semiabierto"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Indica si se permite una llamada; gestiona la transición a semiabierto"""
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                return False
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+        if self.state == HALF_OPEN:
+            if self.half_open_calls >= self.half_open_max_calls:
+                return False
+            self.half_open_calls += 1
+        return True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.half_open_calls = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.half_open_calls = 0
+
+
+class UpstreamGuard:
+    """Protege las llamadas a un upstream con circuit breaker, timeout adaptativo y hedging"""
+
+    def __init__(
+        self,
+        name: str,
+        min_timeout: float = 2.0,
+        max_timeout: float = 30.0,
+        timeout_multiplier: float = 3.0,
+        min_samples: int = 20,
+        hedge: bool = False,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_samples = min_samples
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.stats = {"calls": 0, "failures": 0, "rejected": 0, "hedged": 0, "hedge_wins": 0}
+
+    def current_timeout(self) -> float:
+        """Timeout total basado en el p99 observado, acotado entre min y max"""
+        if len(self.latency.samples) < self.min_samples:
+            return self.max_timeout
+        p99 = self.latency.percentile(99)
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        """Retraso antes de lanzar la petición de respaldo (p95), si hay datos"""
+        if len(self.latency.samples) < self.min_samples:
+            return None
+        return self.latency.percentile(95)
+
+    @staticmethod
+    def is_failure_status(status: int) -> bool:
+        return status >= 500 or status == 429
+
+    async def _attempt(self, call: UpstreamCall) -> Tuple[int, Any]:
+        started = time.monotonic()
+        timeout = self.current_timeout()
+        try:
+            status, data = await call(aiohttp.ClientTimeout(total=timeout))
+        except asyncio.CancelledError:
+            metrics.observe_upstream(self.name, "cancelled", time.monotonic() - started)
+            raise
+        except asyncio.TimeoutError:
+            # Muestra censurada: la latencia real es al menos el timeout aplicado.
+            # Sin ella el p99 nunca supera el timeout y este no puede crecer.
+            self.latency.record(timeout)
+            metrics.observe_upstream(self.name, "error", time.monotonic() - started)
+            raise
+        except Exception:
+            metrics.observe_upstream(self.name, "error", time.monotonic() - started)
+            raise
+        elapsed = time.monotonic() - started
+        if self.is_failure_status(status):
+            metrics.observe_upstream(self.name, "failure", elapsed)
+        else:
+            self.latency.record(elapsed)
+            metrics.observe_upstream(self.name, "ok", elapsed)
+        return status, data
+
+    async def _hedged(self, call: UpstreamCall, delay: float) -> Tuple[int, Any]:
+        primary = asyncio.ensure_future(self._attempt(call))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.stats["hedged"] += 1
+        backup = asyncio.ensure_future(self._attempt(call))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    status, data = task.result()
+                    if self.is_failure_status(status) and pending:
+                        continue
+                    if task is backup:
+                        self.stats["hedge_wins"] += 1
+                    return status, data
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, call: UpstreamCall, hedge: Optional[bool] = None) -> Tuple[int, Any]:
+        """Ejecuta la llamada protegida; lanza CircuitOpenError si el circuito está abierto"""
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.name, self.breaker.retry_after())
+
+        self.stats["calls"] += 1
+        delay = self.hedge_delay() if (self.hedge if hedge is None else hedge) else None
+        try:
+            if delay is not None:
+                status, data = await self._hedged(call, delay)
+            else:
+                status, data = await self._attempt(call)
+        except asyncio.CancelledError:
+            # Una sonda cancelada no cuenta como resultado: se libera su hueco
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.half_open_calls = max(0, self.breaker.half_open_calls - 1)
+            raise
+        except Exception:
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+
+        if self.is_failure_status(status):
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return status, data
+
+    @asynccontextmanager
+    async def track(self):
+        """Protege una llamada de larga duración (streaming) fuera de call().
+
+        El bloque debe asignar outcome["status"] con el código HTTP recibido.
+        """
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.name, self.breaker.retry_after())
+
+        self.stats["calls"] += 1
+        outcome = {"status": None}
+        started = time.monotonic()
+        try:
+            yield outcome
+        except (asyncio.CancelledError, GeneratorExit):
+            metrics.observe_upstream(self.name, "cancelled", time.monotonic() - started)
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.half_open_calls = max(0, self.breaker.half_open_calls - 1)
+            raise
+        except Exception:
+            metrics.observe_upstream(self.name, "error", time.monotonic() - started)
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+            raise
+
+        if outcome["status"] is not None and self.is_failure_status(outcome["status"]):
+            metrics.observe_upstream(self.name, "failure", time.monotonic() - started)
+            self.stats["failures"] += 1
+            self.breaker.record_failure()
+        else:
+            metrics.observe_upstream(self.name, "ok", time.monotonic() - started)
+            self.breaker.record_success()
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado del upstream para diagnóstico"""
+        p50 = self.latency.percentile(50)
+        p99 = self.latency.percentile(99)
+        return {
+            "state": self.breaker.state,
+            "timeout_s": round(self.current_timeout(), 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            **self.stats
+        }
+
+
+def guard_from_env(name: str, min_timeout: float, max_timeout: float, hedge: bool, env_prefix: str = None) -> UpstreamGuard:
+    """Crea un UpstreamGuard configurado desde variables de entorno"""
+    prefix = (env_prefix or name).upper()
+    return UpstreamGuard(
+        name=name,
+        min_timeout=float(os.getenv(f"{prefix}_TIMEOUT_MIN", str(min_timeout))),
+        max_timeout=float(os.getenv(f"{prefix}_TIMEOUT_MAX", str(max_timeout))),
+        hedge=os.getenv(f"{prefix}_HEDGE", str(hedge)).lower() == "true",
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+        )
+    )
+
+
+# Guardas globales por upstream. SERPER y Unsplash cobran y limitan por
+# petición: el hedging duplica llamadas y se activa solo con *_HEDGE=true
+upstreams: Dict[str, UpstreamGuard] = {
+    "serper": guard_from_env("serper", min_timeout=2, max_timeout=10, hedge=False),
+    "unsplash": guard_from_env("unsplash", min_timeout=2, max_timeout=10, hedge=False),
+}
+
+
+def model_guard(model: str) -> UpstreamGuard:
+    """Guarda de OpenRouter para un modelo concreto.
+
+    Cada modelo tiene su propio circuito y timeout: un proveedor degradado no
+    corta el resto de modelos servidos por OpenRouter.
+    """
+    name = f"openrouter:{model}"
+    if name not in upstreams:
+        # La duración de una respuesta de chat depende de su longitud: margen amplio y sin hedging
+        upstreams[name] = guard_from_env(name, min_timeout=15, max_timeout=120, hedge=False, env_prefix="openrouter")
+    return upstreams[name]
+
+
+def get_upstreams_status() -> Dict[str, Any]:
+    """Estado de todos los upstreams"""
+    return {name: guard.get_status() for name, guard in upstreams.items()}
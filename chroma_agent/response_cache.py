@@ -0,0 +1,233 @@
+"""
+SILHOUETTE SEARCH - Cache de Respuestas de Chat
+==========================================
+
+Cache exacta de respuestas de ChatEngine, indexada por modelo + mensajes
+normalizados + parámetros, con búsqueda semántica opcional: vectores TF-IDF
+con hashing de rasgos buscados por similitud coseno con NumPy. Como en
+QueryCache, dos mensajes con distintas negaciones nunca se consideran
+equivalentes.
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from chroma_agent.query_normalizer import tokenize_query, NEGATIONS
+from chroma_agent.serialization import dumps
+from chroma_agent.shared_state import SharedStore, shared_store
+
+try:
+    import numpy as np
+except ImportError:  # sin NumPy solo funciona la cache exacta
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Normaliza espacios de los mensajes conservando rol y mayúsculas"""
+    return [
+        {"role": m.get("role", "user"), "content": _WHITESPACE.sub(" ", str(m.get("content", ""))).strip()}
+        for m in messages
+    ]
+
+
+def _digest(obj: Any) -> str:
+    return hashlib.sha256(dumps(obj)).hexdigest()
+
+
+class HashedTfidfIndex:
+    """Índice de vectores TF con hashing de rasgos; el IDF se aplica al consultar"""
+
+    def __init__(self, capacity: int, dims: int = 4096):
+        self.dims = dims
+        self.tf = np.zeros((capacity, dims), dtype=np.float32)
+        self.df = np.zeros(dims, dtype=np.float32)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.scopes: List[Optional[str]] = [None] * capacity
+        # Negaciones de cada documento: "sin gluten" no responde a "con gluten"
+        self.negations: List[Optional[frozenset]] = [None] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def _features(self, text: str) -> "np.ndarray":
+        tokens = tokenize_query(text)
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for gram in grams:
+            h = int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "little")
+            vector[h % self.dims] += 1.0
+        return vector
+
+    def add(self, scope: str, text: str) -> Optional[int]:
+        """Añade un documento y devuelve su fila, o None si no hay hueco"""
+        if not self.free:
+            return None
+        row = self.free.pop()
+        vector = self._features(text)
+        self.tf[row] = vector
+        self.df += vector > 0
+        self.valid[row] = True
+        self.scopes[row] = scope
+        self.negations[row] = NEGATIONS.intersection(tokenize_query(text))
+        return row
+
+    def remove(self, row: int):
+        self.df -= self.tf[row] > 0
+        self.tf[row] = 0
+        self.valid[row] = False
+        self.scopes[row] = None
+        self.negations[row] = None
+        self.free.append(row)
+
+    def search(self, scope: str, text: str) -> Tuple[Optional[int], float]:
+        """Fila más similar dentro del mismo ámbito y con las mismas negaciones, y su similitud coseno"""
+        negations = NEGATIONS.intersection(tokenize_query(text))
+        mask = self.valid & np.fromiter(
+            (s == scope and n == negations for s, n in zip(self.scopes, self.negations)),
+            dtype=bool,
+            count=len(self.scopes)
+        )
+        if not mask.any():
+            return None, 0.0
+        n_docs = float(self.valid.sum())
+        idf = np.log((1.0 + n_docs) / (1.0 + self.df)) + 1.0
+        query = self._features(text) * idf
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return None, 0.0
+        rows = np.flatnonzero(mask)
+        docs = self.tf[rows] * idf
+        norms = np.linalg.norm(docs, axis=1) * query_norm
+        norms[norms == 0] = 1.0
+        scores = docs @ query / norms
+        best = int(np.argmax(scores))
+        return int(rows[best]), float(scores[best])
+
+
+class ChatResponseCache:
+    """Cache LRU con TTL de respuestas de chat, exacta y semántica"""
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries: int = 1024,
+        semantic_threshold: Optional[float] = None,
+        shared: Optional[SharedStore] = None
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold if (semantic_threshold and np is not None) else None
+        if semantic_threshold and np is None:
+            logger.warning("⚠️ NumPy no instalado: cache semántica de chat desactivada")
+        self.index = HashedTfidfIndex(max_entries) if self.semantic_threshold else None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._rows: Dict[int, str] = {}
+        # Segundo nivel compartido entre workers (SharedStore), solo por clave exacta
+        self.shared = shared
+        self.stats = {"hits": 0, "semantic_hits": 0, "shared_hits": 0, "misses": 0}
+
+    @staticmethod
+    def make_keys(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Tuple[str, str, str]:
+        """Devuelve (clave exacta, ámbito semántico, texto comparable)"""
+        normalized = normalize_messages(messages)
+        exact = _digest({"model": model, "messages": normalized, "params": params})
+        # Solo el último mensaje se compara semánticamente; el resto debe coincidir
+        scope = _digest({"model": model, "context": normalized[:-1], "params": params})
+        return exact, scope, normalized[-1]["content"] if normalized else ""
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry and entry.get("row") is not None:
+            self.index.remove(entry["row"])
+            self._rows.pop(entry["row"], None)
+
+    def _live(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["stored_at"] > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Busca una respuesta en este proceso; añade "cache": "exact"|"semantic" al resultado"""
+        return self._get(*self.make_keys(model, messages, params))
+
+    async def aget(self, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Como get(), consultando también el nivel compartido entre workers"""
+        exact, scope, text = self.make_keys(model, messages, params)
+        if self.shared is not None and self._live(exact) is None:
+            value = await self.shared.aget("chat", exact)
+            if value is not None:
+                self.stats["shared_hits"] += 1
+                self._store(exact, scope, text, value)
+                return {**value, "cache": "exact"}
+        return self._get(exact, scope, text)
+
+    def _get(self, exact: str, scope: str, text: str) -> Optional[Dict[str, Any]]:
+        entry = self._live(exact)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return {**entry["value"], "cache": "exact"}
+
+        if self.index is not None:
+            row, score = self.index.search(scope, text)
+            if row is not None and score >= self.semantic_threshold:
+                entry = self._live(self._rows[row])
+                if entry is not None:
+                    self.stats["semantic_hits"] += 1
+                    return {**entry["value"], "cache": "semantic", "similarity": round(score, 4)}
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, model: str, messages: List[Dict[str, Any]], params: Dict[str, Any], value: Dict[str, Any]):
+        """Guarda una respuesta correcta"""
+        exact, scope, text = self.make_keys(model, messages, params)
+        self._store(exact, scope, text, value)
+        if self.shared is not None:
+            self.shared.set_later("chat", exact, value, self.ttl)
+
+    def _store(self, exact: str, scope: str, text: str, value: Dict[str, Any]):
+        self._remove(exact)
+        while len(self._entries) >= self.max_entries:
+            self._remove(next(iter(self._entries)))
+        row = self.index.add(scope, text) if self.index is not None else None
+        if row is not None:
+            self._rows[row] = exact
+        self._entries[exact] = {"value": value, "row": row, "stored_at": time.monotonic()}
+
+    def clear(self):
+        for key in list(self._entries):
+            self._remove(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = sum(self.stats.values())
+        hits = self.stats["hits"] + self.stats["semantic_hits"] + self.stats["shared_hits"]
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "semantic": self.semantic_threshold is not None,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def chat_cache_from_env() -> Optional[ChatResponseCache]:
+    """Crea la cache de chat desde variables de entorno (None si está desactivada)"""
+    if os.getenv("CHAT_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    threshold = float(os.getenv("CHAT_SEMANTIC_THRESHOLD", "0"))
+    return ChatResponseCache(
+        ttl=float(os.getenv("CHAT_CACHE_TTL", os.getenv("CACHE_TTL", "3600"))),
+        max_entries=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1024")),
+        semantic_threshold=threshold if threshold > 0 else None,
+        shared=shared_store
+    )
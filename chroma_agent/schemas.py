@@ -0,0 +1,89 @@
+"""
+SILHOUETTE SEARCH - Modelos de Respuesta
+===================================
+
+Modelos tipados de los endpoints con más tráfico. Se publican en OpenAPI vía
+`responses=` sin validar cada respuesta en tiempo de ejecución: los endpoints
+devuelven FastJSONResponse directamente y se evita jsonable_encoder.
+"""
+from typing import Dict, Any, List, Optional
+
+from pydantic import BaseModel
+
+
+class SearchInfo(BaseModel):
+    took_ms: Optional[Any] = None
+    api: str = "SERPER"
+
+
+class SearchResponse(BaseModel):
+    success: bool
+    query: Optional[str] = None
+    results: List[Dict[str, Any]] = []
+    count: int = 0
+    search_info: Optional[SearchInfo] = None
+    cached: bool = False
+    page: Optional[int] = None
+    next_cursor: Optional[str] = None
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+
+
+class ImageUrls(BaseModel):
+    small: str
+    regular: str
+    full: str
+
+
+class ImageUser(BaseModel):
+    name: str
+    username: str
+
+
+class ImageLinks(BaseModel):
+    html: str
+    download: str
+
+
+class ImageProxyUrls(BaseModel):
+    small: str
+    regular: str
+
+
+class ImageResult(BaseModel):
+    id: str
+    description: Optional[str] = None
+    alt_description: Optional[str] = None
+    urls: ImageUrls
+    user: ImageUser
+    links: ImageLinks
+    proxy: Optional[ImageProxyUrls] = None
+
+
+class ImageSearchResponse(BaseModel):
+    success: bool
+    query: Optional[str] = None
+    images: List[ImageResult] = []
+    total: int = 0
+    total_pages: int = 0
+    api: str = "UNSPLASH"
+    cached: bool = False
+    page: Optional[int] = None
+    next_cursor: Optional[str] = None
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
+
+
+class ChatResponse(BaseModel):
+    success: bool
+    message: Optional[str] = None
+    response: Optional[str] = None
+    model: Optional[str] = None
+    usage: Dict[str, Any] = {}
+    api: str = "OPENROUTER"
+    cached: bool = False
+    cache: Optional[str] = None
+    similarity: Optional[float] = None
+    fallback_from: Optional[List[str]] = None
+    error: Optional[str] = None
+    retry_after: Optional[float] = None
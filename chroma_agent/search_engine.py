@@ -2,10 +2,17 @@
 SILHOUETTE SEARCH - Motor de Búsqueda Real
 ========================================
 """
-import os
-import aiohttp
+import time
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+from chroma_agent.http_client import http_session
+from chroma_agent.pagination import encode_cursor, decode_cursor, prefetcher_from_env
+from chroma_agent.query_normalizer import cache_from_env
+from chroma_agent.resilience import upstreams, CircuitOpenError
+from chroma_agent.usage_store import usage_recorder
+from chroma_agent.projection import SearchHit, Fields, render_hits
+from chroma_agent.settings import settings, Settings
 
 logger = logging.getLogger(__name__)
 
@@ -13,11 +20,19 @@ class SearchEngine:
     """Motor de búsqueda usando SERPER API"""
     
     def __init__(self):
-        self.api_key = os.getenv("SERPER_API_KEY")
-        self.base_url = "https://google.serper.dev"
+        self._apply_settings(None, settings.current)
+        # Nueva clave o URL sin reiniciar: las peticiones en curso conservan sus cabeceras
+        settings.subscribe(self._apply_settings, {"serper_api_key", "serper_base_url"})
+        self.cache = cache_from_env("SEARCH_CACHE")
+        self.guard = upstreams["serper"]
+        self.prefetcher = prefetcher_from_env()
+    
+    def _apply_settings(self, previous: Optional[Settings], current: Settings, changed=None):
+        self.api_key = current.serper_api_key
+        self.base_url = current.serper_base_url
     
-    async def search(self, query: str, num_results: int = 10) -> Dict[str, Any]:
-        """Realiza búsqueda web real"""
+    async def search(self, query: str, num_results: int = 10, page: int = 1, fields: Fields = None) -> Dict[str, Any]:
+        """Realiza búsqueda web real (fields limita los campos de cada resultado)"""
         if not self.api_key:
             return {
                 "success": False,
@@ -25,6 +40,10 @@ class SearchEngine:
                 "query": query
             }
         
+        cached = await self.cache.aget(query, num=num_results, page=page)
+        if cached is not None:
+            return {**cached, "query": query, "cached": True, "results": render_hits(cached["results"], fields)}
+        
         headers = {
             "X-API-KEY": self.api_key,
             "Content-Type": "application/json"
@@ -34,32 +53,52 @@ class SearchEngine:
             "q": query,
             "num": num_results
         }
+        if page > 1:
+            payload["page"] = page
         
+        async def _request(timeout):
+            async with http_session() as session, session.post(
+                f"{self.base_url}/search", 
+                headers=headers, 
+                json=payload,
+                timeout=timeout
+            ) as response:
+                if response.status == 200:
+                    return response.status, await response.json()
+                return response.status, None
+        
+        started = time.monotonic()
+        status = "error"
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}/search", 
-                    headers=headers, 
-                    json=payload
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return {
-                            "success": True,
-                            "query": query,
-                            "results": data.get("organic", [])[:num_results],
-                            "count": len(data.get("organic", [])),
-                            "search_info": {
-                                "took_ms": data.get("searchParameters", {}).get("totalResults"),
-                                "api": "SERPER"
-                            }
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "error": f"API error: {response.status}",
-                            "query": query
-                        }
+            status, data = await self.guard.call(_request)
+            if status == 200:
+                # La cache guarda los resultados compactos; el JSON se arma al responder
+                result = {
+                    "success": True,
+                    "query": query,
+                    "results": [SearchHit(item) for item in data.get("organic", [])[:num_results]],
+                    "count": len(data.get("organic", [])),
+                    "search_info": {
+                        "took_ms": data.get("searchParameters", {}).get("totalResults"),
+                        "api": "SERPER"
+                    }
+                }
+                self.cache.set(query, result, num=num_results, page=page)
+                return {**result, "results": render_hits(result["results"], fields)}
+            else:
+                return {
+                    "success": False,
+                    "error": f"API error: {status}",
+                    "query": query
+                }
+        except CircuitOpenError as e:
+            status = None
+            return {
+                "success": False,
+                "error": str(e),
+                "retry_after": round(e.retry_after, 1),
+                "query": query
+            }
         except Exception as e:
             logger.error(f"Error en búsqueda: {e}")
             return {
@@ -67,6 +106,43 @@ class SearchEngine:
                 "error": str(e),
                 "query": query
             }
+        finally:
+            # Las llamadas cortadas por el circuito no llegan al upstream
+            if status is not None:
+                usage_recorder.record("serper", status, time.monotonic() - started)
+
+    async def search_page(
+        self,
+        query: Optional[str] = None,
+        cursor: Optional[str] = None,
+        page_size: int = 10,
+        fields: Fields = None
+    ) -> Dict[str, Any]:
+        """Búsqueda paginada con cursor; precarga la página siguiente en la cache"""
+        page = 1
+        if cursor:
+            state = decode_cursor(cursor)
+            query, page, page_size = state["q"], state["p"], state["n"]
+        if not query:
+            raise ValueError("Consulta o cursor requeridos")
+        page_size = max(1, min(page_size, 100))  # máximo de SERPER por página
+        
+        # Si la página se está precargando se espera a que termine y se sirve de la cache
+        await self.prefetcher.join(self.cache.make_key(query, num=page_size, page=page))
+        result = await self.search(query, page_size, page=page, fields=fields)
+        result = {**result, "query": query, "page": page, "next_cursor": None}
+        
+        # SERPER no da el total de páginas: hay más mientras devuelva resultados
+        # orgánicos (pueden ser menos que page_size tras quitar duplicados)
+        if result["success"] and result.get("count", 0) > 0:
+            next_page = page + 1
+            result["next_cursor"] = encode_cursor({"q": query, "p": next_page, "n": page_size})
+            self.prefetcher.schedule(
+                self.cache.make_key(query, num=page_size, page=next_page),
+                next_page,
+                lambda: self.search(query, page_size, page=next_page)
+            )
+        return result
 
 # Instancia global
 search_engine = SearchEngine()
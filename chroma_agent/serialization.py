@@ -0,0 +1,39 @@
+"""
+SILHOUETTE SEARCH - Serialización JSON Rápida
+=======================================
+
+Respuesta JSON basada en orjson (con fallback a json de la librería estándar)
+para usar como `default_response_class` en todas las aplicaciones.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: se degrada a json estándar
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(content: Any) -> bytes:
+    """Serializa a JSON en bytes con el codificador más rápido disponible"""
+    if orjson is not None:
+        return orjson.dumps(content, option=_ORJSON_OPTIONS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que codifica con orjson cuando está instalado"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    """Respuesta para JSON ya codificado en bytes (payloads precalculados)"""
+
+    media_type = "application/json"
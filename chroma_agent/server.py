@@ -6,19 +6,23 @@ SILHOUETTE SEARCH - Servidor Principal con Funcionalidades Reales
 """
 
 import os
+import hmac
+import json
+import time
 import asyncio
 import logging
+import threading
 from pathlib import Path
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, WebSocket, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-import uvicorn
+from chroma_agent.serialization import FastJSONResponse, dumps
+from chroma_agent.schemas import SearchResponse, ImageSearchResponse, ChatResponse
 from dotenv import load_dotenv
 
-# Cargar configuración
-load_dotenv()
+# Cargar configuración (mismo archivo y misma prioridad que settings: el entorno del proceso manda)
+load_dotenv(os.getenv("SETTINGS_ENV_FILE", ".env"))
 
 # Configurar logging
 logging.basicConfig(
@@ -27,25 +31,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Estado del arranque para /readyz
+readiness = {"started": False, "startup_seconds": None}
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Iniciando Silhouette Search...")
     
+    started = time.monotonic()
+    # Primero el monitor del bucle: también detecta bloqueos durante el arranque
+    if loop_monitor is not None:
+        loop_monitor.start()
+    
     # Verificar APIs configuradas
     check_api_keys()
     
-    # Crear directorios necesarios
-    create_directories()
-    
-    # Inicializar navegadores para Playwright
+    # Directorios, archivos estáticos y lotes pendientes en paralelo; el navegador no bloquea el arranque
+    await asyncio.gather(
+        asyncio.to_thread(create_directories),
+        asyncio.to_thread(web_assets.load),
+        asyncio.to_thread(static_assets.load),
+        batch_manager.resume()
+    )
     await initialize_browsers()
     
+    # Recargar claves y límites al editar el .env
+    settings.start()
+    
+    readiness["started"] = True
+    readiness["startup_seconds"] = round(time.monotonic() - started, 3)
+    logger.info(f"✅ Servidor listo en {readiness['startup_seconds']}s")
+    
     yield
     
     # Shutdown
     logger.info("🛑 Deteniendo Silhouette Search...")
+    readiness["started"] = False
+    await settings.close()
     await cleanup_browsers()
+    await batch_manager.close()
+    await session_manager.close()
+    await chat_admission.close()
+    await search_engine.prefetcher.close()
+    await image_engine.prefetcher.close()
+    await usage_recorder.close()
+    await close_session()
+    if shared_store is not None:
+        shared_store.close()
+    if loop_monitor is not None:
+        await loop_monitor.close()
 
 def check_api_keys():
     """Verifica que las APIs críticas estén configuradas"""
@@ -56,7 +91,7 @@ def check_api_keys():
     
     missing = []
     for key, name in required_apis:
-        if not os.getenv(key):
+        if not getattr(settings.current, key.lower()):
             missing.append(f"{name} ({key})")
     
     if missing:
@@ -72,13 +107,19 @@ def create_directories():
         Path(dir_name).mkdir(parents=True, exist_ok=True)
 
 async def initialize_browsers():
-    """Inicializa navegadores Playwright"""
-    try:
-        from chroma_agent.browser_agent import browser_agent
-        await browser_agent.start()
-        logger.info("🌐 Navegador inicializado")
-    except Exception as e:
-        logger.warning(f"⚠️ Error inicializando navegador: {e}")
+    """Inicializa navegadores Playwright según BROWSER_STARTUP"""
+    from chroma_agent.browser_agent import browser_agent
+    if browser_agent.startup_mode == "lazy":
+        logger.info("🌐 Navegador diferido hasta la primera navegación")
+    elif browser_agent.startup_mode == "eager":
+        try:
+            await browser_agent.ensure_started()
+            logger.info("🌐 Navegador inicializado")
+        except Exception as e:
+            logger.warning(f"⚠️ Error inicializando navegador: {e}")
+    else:
+        browser_agent.start_in_background()
+        logger.info("🌐 Navegador iniciándose en segundo plano")
 
 async def cleanup_browsers():
     """Limpia navegadores Playwright"""
@@ -94,7 +135,8 @@ app = FastAPI(
     title="Silhouette Search",
     description="Sistema de IA unificado con funcionalidades reales - Navegación, búsqueda, chat e imágenes",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # CORS middleware
@@ -106,22 +148,91 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas Prometheus por ruta (el middleware más externo mide también CORS)
+from chroma_agent.metrics import metrics, MetricsMiddleware
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 # APIs de funcionalidades reales
 from chroma_agent.browser_agent import browser_agent
 from chroma_agent.search_engine import search_engine
 from chroma_agent.chat_engine import chat_engine
 from chroma_agent.image_engine import image_engine
 from chroma_agent.config_manager import config
+from chroma_agent.ws_chat import ChatMultiplexer
+from chroma_agent.session_store import session_manager
+from chroma_agent.admission import chat_admission, AdmissionRejected, client_key
+from chroma_agent.http_client import close_session
+from chroma_agent.resilience import upstreams, get_upstreams_status, OPEN
+from chroma_agent.usage_store import usage_recorder
+from chroma_agent.batch_jobs import batch_manager, parse_jsonl
+from chroma_agent.prompt_templates import prompt_registry
+from chroma_agent.image_proxy import thumbnail_cache, ImageProxyError
+from chroma_agent.image_dedup import image_scorer, ImageDedupUnavailable
+from chroma_agent.projection import ImageHit, parse_fields
+from chroma_agent.settings import settings
+from chroma_agent.shared_state import shared_store, worker_count
+from chroma_agent.static_assets import web_assets, static_assets
+from chroma_agent.profiling import profiler, memory_tracker, ProfilerBusy
+from chroma_agent.loop_monitor import loop_monitor
 
-@app.get("/")
-async def home():
+BROWSER_STATES = ("stopped", "starting", "ready", "failed")
+
+def register_metrics():
+    """Gauges calculados en cada scrape de /metrics"""
+    metrics.register_gauge(
+        "browser_state", "Estado del navegador (1 en el estado actual)", ["state"],
+        lambda: [((state,), int(browser_agent.state == state)) for state in BROWSER_STATES]
+    )
+    metrics.register_gauge(
+        "browser_launch_seconds", "Segundos que tardó en lanzarse Chromium", [],
+        lambda: [((), browser_agent.launch_seconds)]
+    )
+    metrics.register_gauge(
+        "browser_active_pages", "Navegaciones en curso en este worker", [],
+        lambda: [((), browser_agent.active_pages)]
+    )
+    metrics.register_gauge(
+        "browser_page_slots", "Páginas activas permitidas en todo el host (con varios workers)", [],
+        lambda: [((), browser_agent.slots.slots if browser_agent.slots else None)]
+    )
+    metrics.register_gauge(
+        "browser_slot_waits", "Esperas por un hueco de navegación libre", [],
+        lambda: [((), browser_agent.slots.waits if browser_agent.slots else None)]
+    )
+    metrics.register_gauge(
+        "upstream_circuit_open", "Circuito del upstream abierto (1) o no (0)", ["upstream"],
+        lambda: [((name,), int(guard.breaker.state == OPEN)) for name, guard in list(upstreams.items())]
+    )
+    metrics.register_gauge(
+        "upstream_timeout_seconds", "Timeout adaptativo vigente por upstream", ["upstream"],
+        lambda: [((name,), guard.current_timeout()) for name, guard in list(upstreams.items())]
+    )
+    metrics.register_gauge(
+        "chat_admission_queue_depth", "Peticiones de chat esperando turno", [],
+        lambda: [((), chat_admission.get_stats()["queue_depth"])]
+    )
+
+register_metrics()
+
+async def admit_chat(request: Request, data: dict, model: str = None):
+    """Espera turno en la cola de chat o responde 429 con Retry-After"""
+    priority = request.headers.get("x-priority") or data.get("priority") or "interactive"
+    try:
+        # Sin modelo explícito se reserva turno para el primer candidato del router
+        model = model or chat_engine.router.candidates(data.get("policy"))[0]
+        await chat_admission.admit(model, client_key(request), priority)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
+
+@app.api_route("/", methods=["GET", "HEAD"])
+async def home(request: Request):
     """Página principal"""
-    return FileResponse("web_interface/index.html")
+    return await web_assets.response("index.html", request)
 
-@app.get("/config")
-async def config_page():
+@app.api_route("/config", methods=["GET", "HEAD"])
+async def config_page(request: Request):
     """Página de configuración de APIs"""
-    return FileResponse("web_interface/config.html")
+    return await web_assets.response("config.html", request)
 
 @app.get("/api/status")
 async def status():
@@ -132,9 +243,64 @@ async def status():
         "project": "Silhouette Search",
         "apis_configured": config.get_api_status(),
         "missing_apis": config.get_missing_apis(),
-        "fully_configured": config.is_fully_configured()
+        "fully_configured": config.is_fully_configured(),
+        "cache": {
+            "search": search_engine.cache.get_stats(),
+            "images": image_engine.cache.get_stats(),
+            "chat": chat_engine.cache.get_stats() if chat_engine.cache else None
+        },
+        "upstreams": get_upstreams_status(),
+        "chat_admission": chat_admission.get_stats(),
+        "chat_routing": chat_engine.router.get_stats(),
+        "usage_recorder": usage_recorder.get_stats(),
+        "thumbnails": thumbnail_cache.get_stats(),
+        "settings": settings.get_stats(),
+        "static": web_assets.get_stats(),
+        "event_loop": loop_monitor.get_stats() if loop_monitor else None,
+        "profiling": {"profiler": profiler.get_stats(), "memory": memory_tracker.get_stats()},
+        "shared_state": {
+            "workers": worker_count(),
+            "pid": os.getpid(),
+            "store": shared_store.get_stats() if shared_store else None
+        },
+        "prefetch": {
+            "search": search_engine.prefetcher.get_stats(),
+            "images": image_engine.prefetcher.get_stats()
+        }
     }
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: el proceso atiende peticiones (no comprueba dependencias)"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness por subsistema: 503 hasta que terminen los pasos críticos del arranque.
+    
+    El navegador solo bloquea la disponibilidad con READYZ_REQUIRE_BROWSER=true;
+    sin él siguen funcionando búsqueda, chat e imágenes.
+    """
+    browser = browser_agent.get_status()
+    require_browser = os.getenv("READYZ_REQUIRE_BROWSER", "false").lower() == "true"
+    subsystems = {
+        "startup": {"ready": readiness["started"], "seconds": readiness["startup_seconds"]},
+        "browser": {"ready": browser["state"] == "ready", "critical": require_browser, **browser},
+        "apis": {"ready": config.is_fully_configured(), "critical": False, "missing": config.get_missing_apis()},
+        "settings": {"ready": settings.get_stats()["watching"] or settings.poll_interval <= 0, "critical": False},
+        "batch_jobs": {"ready": readiness["started"], "jobs": len(batch_manager.jobs)}
+    }
+    ready = all(item["ready"] for item in subsystems.values() if item.get("critical", True))
+    return FastJSONResponse(
+        {"ready": ready, "subsystems": subsystems},
+        status_code=200 if ready else 503
+    )
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Métricas en formato Prometheus (503 sin prometheus-client)"""
+    return metrics.response()
+
 @app.post("/api/navegacion/real")
 async def navigate_real(data: dict):
     """Navegación web real con Playwright"""
@@ -165,42 +331,317 @@ async def extract_elements(data: dict):
         logger.error(f"Error extrayendo elementos: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/busqueda/real")
-async def search_real(query: str, num_results: int = 10):
-    """Búsqueda web real con SERPER"""
+def projection(fields: str = None, allowed: dict = None):
+    """Valida `fields=` (lista separada por comas) o responde 400"""
     try:
-        result = await search_engine.search(query, num_results)
-        return result
+        return parse_fields(fields, allowed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/busqueda/real", responses={200: {"model": SearchResponse}})
+async def search_real(query: str, num_results: int = 10, fields: str = None):
+    """Búsqueda web real con SERPER (fields=title,link limita los campos de cada resultado)"""
+    selected = projection(fields)
+    try:
+        result = await search_engine.search(query, num_results, fields=selected)
+        return FastJSONResponse(result)
     except Exception as e:
         logger.error(f"Error en búsqueda: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/chat/real")
-async def chat_real(data: dict):
+@app.get("/api/busqueda/pagina", responses={200: {"model": SearchResponse}})
+async def search_page(query: str = None, cursor: str = None, page_size: int = 10, fields: str = None):
+    """Búsqueda web paginada con cursor y precarga de la página siguiente"""
+    selected = projection(fields)
+    try:
+        return FastJSONResponse(await search_engine.search_page(query, cursor, page_size, selected))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error en búsqueda paginada: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/chat/real", responses={200: {"model": ChatResponse}})
+async def chat_real(data: dict, request: Request):
     """Chat con IA real usando OPENROUTER"""
+    message = data.get("message")
+    model = data.get("model")
+    
+    if not message:
+        raise HTTPException(status_code=400, detail="Mensaje requerido")
+    
+    # Prompt de sistema opcional desde el registro de plantillas
+    messages = None
+    if data.get("template"):
+        variables = data.get("variables") or {}
+        if not isinstance(data["template"], str) or not isinstance(variables, dict):
+            raise HTTPException(status_code=400, detail="template debe ser texto y variables un objeto")
+        try:
+            messages = prompt_registry.messages(
+                data["template"],
+                message,
+                model or chat_engine.router.candidates(data.get("policy"))[0],
+                variables
+            )
+        except (KeyError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e).strip("'\""))
+    
+    await admit_chat(request, data, model)
     try:
-        message = data.get("message")
-        model = data.get("model")
-        
-        if not message:
-            raise HTTPException(status_code=400, detail="Mensaje requerido")
-        
-        result = await chat_engine.chat(message, model)
-        return result
+        if messages is not None:
+            result = await chat_engine.complete(messages, model, data.get("cache", True), policy=data.get("policy"))
+            result = {**result, "message": message}
+        else:
+            result = await chat_engine.chat(message, model, use_cache=data.get("cache", True), policy=data.get("policy"))
+        return FastJSONResponse(result)
     except Exception as e:
         logger.error(f"Error en chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/imagenes/real")
-async def search_images(query: str, per_page: int = 10):
-    """Búsqueda de imágenes real con Unsplash"""
+@app.post("/api/chat/stream")
+async def chat_stream(data: dict, request: Request):
+    """Chat con IA en streaming (Server-Sent Events) usando OPENROUTER"""
+    message = data.get("message")
+    model = data.get("model")
+    
+    if not message:
+        raise HTTPException(status_code=400, detail="Mensaje requerido")
+    
+    await admit_chat(request, data, model)
+    
+    async def event_stream():
+        # StreamingResponse espera a que cada evento se envíe antes de pedir el
+        # siguiente, así un cliente lento frena también la lectura del upstream
+        async for event in chat_engine.chat_stream(message, model, policy=data.get("policy")):
+            yield b"event: " + event["type"].encode() + b"\ndata: " + dumps(event) + b"\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/chat/sesiones")
+async def create_chat_session(data: dict = None):
+    """Crea una conversación guardada en el servidor"""
+    data = data or {}
+    session_id = await session_manager.store.create(data.get("model"), data.get("system_prompt"))
+    return {"success": True, "session_id": session_id}
+
+@app.post("/api/chat/sesiones/{session_id}")
+async def chat_session_message(session_id: str, data: dict, request: Request):
+    """Envía un mensaje a una conversación; el historial lo mantiene el servidor"""
+    message = data.get("message")
+    if not message:
+        raise HTTPException(status_code=400, detail="Mensaje requerido")
+    await admit_chat(request, data, data.get("model"))
     try:
-        result = await image_engine.search_images(query, per_page)
-        return result
+        return FastJSONResponse(await session_manager.send(session_id, message, data.get("model")))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    except Exception as e:
+        logger.error(f"Error en sesión de chat: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/chat/sesiones/{session_id}")
+async def get_chat_session(session_id: str):
+    """Devuelve la sesión con su resumen y turnos"""
+    session = await session_manager.store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    return {**session, "turns": await session_manager.store.turns(session_id)}
+
+@app.delete("/api/chat/sesiones/{session_id}")
+async def delete_chat_session(session_id: str):
+    """Elimina una conversación"""
+    if not await session_manager.store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Sesión no encontrada")
+    return {"success": True, "session_id": session_id}
+
+@app.post("/api/chat/lotes")
+async def create_batch_job(request: Request, model: str = None, policy: str = None, max_tokens: int = 1000):
+    """Crea un lote de chat: JSON {"prompts": [...]} o un fichero JSONL/texto (un prompt por línea)"""
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            data = json.loads(body)
+            if isinstance(data, dict):
+                items = data.get("prompts", [])
+                model = data.get("model", model)
+                policy = data.get("policy", policy)
+                max_tokens = data.get("max_tokens", max_tokens)
+            elif isinstance(data, list):
+                items = data
+            else:
+                raise ValueError("Se esperaba una lista de prompts o un objeto con prompts")
+        else:
+            items = parse_jsonl(body.decode("utf-8"))
+        job = await batch_manager.create(items, client_key(request), model, policy, max_tokens)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **batch_manager.status(job)}
+
+@app.get("/api/chat/lotes/{job_id}")
+async def get_batch_job(job_id: str):
+    """Estado y progreso de un lote"""
+    job = batch_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return batch_manager.status(job)
+
+@app.get("/api/chat/lotes/{job_id}/resultados")
+async def get_batch_results(job_id: str):
+    """Descarga los resultados del lote (JSONL) a medida que se leen del disco"""
+    job = batch_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return StreamingResponse(
+        batch_manager.stream_results(job),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{job_id}.jsonl"'}
+    )
+
+@app.delete("/api/chat/lotes/{job_id}")
+async def cancel_batch_job(job_id: str):
+    """Cancela un lote en curso; los resultados ya obtenidos se conservan"""
+    job = batch_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    if not await batch_manager.cancel(job):
+        raise HTTPException(status_code=409, detail=f"El lote ya está {job.meta['status']}")
+    return {"success": True, **batch_manager.status(job)}
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """Chat multiplexado: varias conversaciones en streaming sobre un WebSocket"""
+    await ChatMultiplexer(websocket, chat_engine, admission=chat_admission).run()
+
+@app.get("/api/imagenes/real", responses={200: {"model": ImageSearchResponse}})
+async def search_images(query: str, per_page: int = 10, fields: str = None):
+    """Búsqueda de imágenes real con Unsplash (fields=id,urls.small limita los campos de cada imagen)"""
+    selected = projection(fields, ImageHit.FIELDS)
+    try:
+        result = await image_engine.search_images(query, per_page, fields=selected)
+        return FastJSONResponse(result)
     except Exception as e:
         logger.error(f"Error buscando imágenes: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/imagenes/pagina", responses={200: {"model": ImageSearchResponse}})
+async def search_images_page(query: str = None, cursor: str = None, per_page: int = 10, fields: str = None):
+    """Búsqueda de imágenes paginada con cursor y precarga de la página siguiente"""
+    selected = projection(fields, ImageHit.FIELDS)
+    try:
+        return FastJSONResponse(await image_engine.search_images_page(query, cursor, per_page, selected))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error en búsqueda de imágenes paginada: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/prompts")
+async def list_prompt_templates():
+    """Plantillas de prompts registradas con sus variables y tamaño en tokens"""
+    return {"templates": prompt_registry.get_stats(), "cache_min_tokens": prompt_registry.cache_min_tokens}
+
+@app.get("/api/uso")
+async def usage_report(
+    granularity: str = "hour",
+    since: float = None,
+    until: float = None,
+    upstream: str = None,
+    model: str = None
+):
+    """Uso de APIs agregado por hora o día (llamadas, tokens, coste, latencia)"""
+    try:
+        rows = await usage_recorder.query(granularity, since, until, upstream, model)
+        return FastJSONResponse({"success": True, "granularity": granularity, "rows": rows})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error consultando uso: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/imagenes/multi")
+async def search_images_many(query: str, target: int = 100, per_page: int = 30, stream: bool = True, fields: str = None):
+    """Reúne hasta `target` imágenes de varias páginas en paralelo (NDJSON incremental)"""
+    if not 1 <= target <= 1000:
+        raise HTTPException(status_code=400, detail="target debe estar entre 1 y 1000")
+    events = image_engine.search_images_many(query, target, per_page, projection(fields, ImageHit.FIELDS))
+    
+    if stream:
+        async def ndjson():
+            async for event in events:
+                yield dumps(event) + b"\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    
+    images = []
+    async for event in events:
+        kind = event.pop("type")
+        if kind == "images":
+            images.extend(event["images"])
+        elif kind == "error":
+            return FastJSONResponse({"success": False, "query": query, **event})
+        else:
+            return FastJSONResponse({"success": True, **event, "images": images})
+
+@app.post("/api/imagenes/dedup")
+async def dedup_images(data: dict):
+    """Elimina imágenes casi duplicadas (pHash/dHash) y ordena por calidad.
+    
+    Acepta {"images": [...]} (resultados de búsqueda o URLs) o
+    {"query", "target"} para buscar primero en varias páginas.
+    """
+    images = data.get("images")
+    if images is None:
+        if not data.get("query") or not isinstance(data["query"], str):
+            raise HTTPException(status_code=400, detail="images o query requeridos")
+        target = data.get("target", 100)
+        # Mismo límite que /api/imagenes/multi
+        if isinstance(target, bool) or not isinstance(target, int) or not 1 <= target <= 1000:
+            raise HTTPException(status_code=400, detail="target debe ser un entero entre 1 y 1000")
+        images = []
+        async for event in image_engine.search_images_many(data["query"], target):
+            if event["type"] == "images":
+                images.extend(event["images"])
+            elif event["type"] == "error":
+                return FastJSONResponse({"success": False, "query": data["query"], "error": event["error"]})
+    elif not isinstance(images, list):
+        raise HTTPException(status_code=400, detail="images debe ser una lista")
+    else:
+        images = [{"url": image} if isinstance(image, str) else image for image in images]
+        for index, image in enumerate(images):
+            if not isinstance(image, dict) or not image_scorer.image_url(image):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"images[{index}] debe ser una URL o un objeto con urls.small, thumb o url"
+                )
+    
+    try:
+        result = await image_scorer.score(images)
+    except ImageDedupUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return FastJSONResponse({
+        "success": True,
+        "total": len(images),
+        "unique": len(result["images"]),
+        **result
+    })
+
+@app.get("/api/imagenes/proxy")
+async def image_proxy(url: str, request: Request):
+    """Sirve una imagen de Unsplash desde la cache local en disco"""
+    try:
+        entry = await thumbnail_cache.get(url)
+    except ImageProxyError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    etag = f'"{entry["content_hash"]}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={int(thumbnail_cache.ttl)}"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return thumbnail_cache.response(entry, headers)
+
 @app.get("/api/config/status")
 async def config_status():
     """Estado de configuración de APIs"""
@@ -208,24 +649,164 @@ async def config_status():
         "required_apis": config.get_required_apis(),
         "optional_apis": config.get_optional_apis(),
         "configured_status": config.get_api_status(),
-        "missing_apis": config.get_missing_apis()
+        "missing_apis": config.get_missing_apis(),
+        "settings": settings.current.as_dict()
+    }
+
+@app.post("/api/config/reload")
+async def config_reload():
+    """Relee el .env sin esperar al vigilante y aplica los cambios"""
+    changed = settings.reload()
+    return {
+        "success": True,
+        "version": settings.current.version,
+        "changed": sorted(changed),
+        "configured_status": config.get_api_status()
+    }
+
+@app.post("/api/config/keys")
+async def config_save_keys(request: Request):
+    """Guarda claves de API en el .env y las aplica (solo desde la propia máquina)"""
+    if request.client is None or request.client.host not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Las claves solo se pueden guardar desde localhost")
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Se esperaba un objeto JSON")
+    unknown = set(data) - set(config.required_apis)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Claves no admitidas: {', '.join(sorted(unknown))}")
+    if not all(isinstance(value, str) for value in data.values()):
+        raise HTTPException(status_code=400, detail="Los valores deben ser texto")
+    # Un campo vacío en la página deja la clave como estaba
+    values = {key: value.strip() for key, value in data.items() if value.strip()}
+    if not values:
+        raise HTTPException(status_code=400, detail="No hay claves que guardar")
+    try:
+        await asyncio.to_thread(settings.write, values)
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    changed = settings.reload()
+    return {
+        "success": True,
+        "saved": sorted(values),
+        # Fijadas en el entorno del proceso: el .env no las cambia
+        "overridden": sorted(settings.overridden(set(values))),
+        "changed": sorted(changed),
+        "configured_status": config.get_api_status()
     }
 
-# Montar archivos estáticos si existen
-try:
-    app.mount("/static", StaticFiles(directory="static"), name="static")
-except:
-    pass  # Directorio static no existe, continuar
+def require_debug_token(request: Request):
+    """Los endpoints /debug solo existen con DEBUG_TOKEN y exigen la cabecera X-Debug-Token"""
+    token = os.getenv("DEBUG_TOKEN")
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-debug-token", "").encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="X-Debug-Token inválido")
+
+@app.get("/debug/profile")
+async def debug_profile(
+    request: Request,
+    seconds: float = 5,
+    mode: str = "sample",
+    interval_ms: float = 10,
+    threads: str = "loop",
+    idle: bool = False,
+    sort: str = "cumulative",
+    format: str = "text"
+):
+    """Perfil del proceso en vivo durante `seconds`.
+    
+    mode=sample: pilas agregadas en formato collapsed (flamegraph.pl, speedscope);
+    threads=loop muestrea solo el bucle de eventos, threads=all todos los hilos.
+    mode=cprofile: pstats en texto, o volcado .prof con format=prof.
+    """
+    require_debug_token(request)
+    try:
+        if mode == "sample":
+            thread_ids = {threading.get_ident()} if threads == "loop" else None
+            counts = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000, thread_ids, idle)
+            return Response(profiler.collapsed(counts), media_type="text/plain; charset=utf-8")
+        if mode == "cprofile":
+            profile = await profiler.cprofile(seconds)
+            if format == "prof":
+                return Response(
+                    profiler.pstats_dump(profile),
+                    media_type="application/octet-stream",
+                    headers={"Content-Disposition": 'attachment; filename="silhouette.prof"'}
+                )
+            return Response(profiler.pstats_text(profile, sort), media_type="text/plain; charset=utf-8")
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Orden de pstats desconocido: {sort}")
+    raise HTTPException(status_code=400, detail="mode debe ser sample o cprofile")
+
+@app.get("/debug/loop")
+async def debug_loop(request: Request):
+    """Lag del bucle de eventos y pilas de los últimos bloqueos"""
+    require_debug_token(request)
+    if loop_monitor is None:
+        raise HTTPException(status_code=409, detail="Monitor del bucle desactivado (LOOP_MONITOR_ENABLED=false)")
+    return loop_monitor.get_stats(stacks=True)
+
+@app.post("/debug/tracemalloc/start")
+async def debug_tracemalloc_start(request: Request, frames: int = None):
+    """Activa tracemalloc (las asignaciones anteriores no se registran)"""
+    require_debug_token(request)
+    memory_tracker.start(frames)
+    return memory_tracker.get_stats()
+
+@app.post("/debug/tracemalloc/stop")
+async def debug_tracemalloc_stop(request: Request):
+    require_debug_token(request)
+    memory_tracker.stop()
+    return memory_tracker.get_stats()
+
+@app.post("/debug/tracemalloc/snapshot")
+async def debug_tracemalloc_snapshot(request: Request, key: str = "lineno", limit: int = None):
+    """Instantánea de referencia y mayores consumos (key: lineno, filename o traceback)"""
+    require_debug_token(request)
+    if key not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="key debe ser lineno, filename o traceback")
+    try:
+        # Recorrer todas las trazas lleva tiempo: fuera del bucle de eventos
+        return await asyncio.to_thread(memory_tracker.snapshot, key, limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/debug/tracemalloc/diff")
+async def debug_tracemalloc_diff(request: Request, key: str = "lineno", limit: int = None, reset: bool = False):
+    """Crecimiento de memoria desde la instantánea de referencia"""
+    require_debug_token(request)
+    if key not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="key debe ser lineno, filename o traceback")
+    try:
+        return await asyncio.to_thread(memory_tracker.diff, key, limit, reset)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def static_files(path: str, request: Request):
+    """Archivos estáticos precomprimidos (404 si el directorio static no existe)"""
+    return await static_assets.response(path, request)
 
 if __name__ == "__main__":
+    import uvicorn
+    
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "localhost")
     debug = os.getenv("DEBUG", "false").lower() == "true"
+    # Varios workers: caches, límites y lotes se coordinan vía chroma_agent.shared_state
+    workers = 1 if debug else worker_count()
     
     uvicorn.run(
         "server:app",
         host=host,
         port=port,
         reload=debug,
+        workers=workers,
         log_level="info"
     )
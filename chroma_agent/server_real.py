@@ -23,6 +23,12 @@ from playwright.async_api import async_playwright
 import aiohttp
 import os
 
+from chroma_agent.prompt_templates import prompt_registry
+
+SERPER_BASE_URL = os.getenv("SERPER_BASE_URL", "https://google.serper.dev").rstrip("/")
+UNSPLASH_BASE_URL = os.getenv("UNSPLASH_BASE_URL", "https://api.unsplash.com").rstrip("/")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+
 class RealChromaAgent:
     """Chroma Agent con funcionalidades REALES implementadas"""
     
@@ -57,7 +63,7 @@ class RealChromaAgent:
         try:
             async with aiohttp.ClientSession() as session:
                 async with session.post(
-                    "https://google.serper.dev/search",
+                    f"{SERPER_BASE_URL}/search",
                     headers={"X-API-KEY": serper_api_key},
                     json={
                         "q": query,
@@ -79,39 +85,64 @@ class RealChromaAgent:
         except Exception as e:
             return [{"error": f"Error en búsqueda: {e}"}]
     
-    async def search_images_real(self, query: str, count: int = 20) -> List[Dict]:
-        """Búsqueda de imágenes REAL usando Unsplash API"""
+    async def search_images_real(self, query: str, count: int = 20, max_concurrency: int = 4) -> List[Dict]:
+        """Búsqueda de imágenes REAL usando Unsplash API
+        
+        Unsplash devuelve como mucho 30 fotos por página: si count es mayor se
+        piden varias páginas en paralelo (máx. max_concurrency) y se eliminan
+        las fotos repetidas por id.
+        """
         unsplash_key = os.getenv("UNSPLASH_ACCESS_KEY")
         
         if not unsplash_key:
             return [{"error": "UNSPLASH_ACCESS_KEY no configurada"}]
         
-        try:
-            async with aiohttp.ClientSession() as session:
+        per_page = min(count, 30)
+        pages = -(-count // per_page)
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def fetch_page(session: aiohttp.ClientSession, page: int) -> List[Dict]:
+            async with semaphore:
                 async with session.get(
-                    f"https://api.unsplash.com/search/photos",
+                    f"{UNSPLASH_BASE_URL}/search/photos",
                     headers={"Authorization": f"Client-ID {unsplash_key}"},
                     params={
                         "query": query,
-                        "per_page": count,
+                        "per_page": per_page,
+                        "page": page,
                         "orientation": "landscape"
                     }
                 ) as response:
+                    if response.status == 429:
+                        # Límite de Unsplash alcanzado: se devuelve lo ya obtenido
+                        return []
                     data = await response.json()
-                    
-                    results = []
-                    for photo in data.get("results", []):
-                        results.append({
-                            "id": photo.get("id", ""),
-                            "url": photo.get("urls", {}).get("regular", ""),
-                            "thumb": photo.get("urls", {}).get("thumb", ""),
-                            "description": photo.get("description", ""),
-                            "alt_description": photo.get("alt_description", ""),
-                            "author": photo.get("user", {}).get("name", ""),
-                            "downloads": photo.get("downloads", 0)
-                        })
-                    
-                    return results
+                    return data.get("results", [])
+        
+        try:
+            async with aiohttp.ClientSession() as session:
+                first = await fetch_page(session, 1)
+                rest = []
+                if pages > 1 and len(first) == per_page:
+                    rest = await asyncio.gather(*(fetch_page(session, page) for page in range(2, pages + 1)))
+                
+                results = []
+                seen = set()
+                for photo in first + [photo for page in rest for photo in page]:
+                    if photo.get("id") in seen:
+                        continue
+                    seen.add(photo.get("id"))
+                    results.append({
+                        "id": photo.get("id", ""),
+                        "url": photo.get("urls", {}).get("regular", ""),
+                        "thumb": photo.get("urls", {}).get("thumb", ""),
+                        "description": photo.get("description", ""),
+                        "alt_description": photo.get("alt_description", ""),
+                        "author": photo.get("user", {}).get("name", ""),
+                        "downloads": photo.get("downloads", 0)
+                    })
+                
+                return results[:count]
         except Exception as e:
             return [{"error": f"Error en búsqueda de imágenes: {e}"}]
     
@@ -124,25 +155,23 @@ class RealChromaAgent:
         
         try:
             async with aiohttp.ClientSession() as session:
-                messages = [
-                    {
-                        "role": "system",
-                        "content": system_prompt or "Eres un asistente inteligente llamado Chroma Agent."
-                    },
-                    {
-                        "role": "user", 
-                        "content": message
-                    }
-                ]
+                model = "anthropic/claude-3.5-sonnet"
+                if system_prompt:
+                    messages = [
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": message}
+                    ]
+                else:
+                    messages = prompt_registry.messages("chroma_agent", message, model)
                 
                 async with session.post(
-                    "https://openrouter.ai/api/v1/chat/completions",
+                    f"{OPENROUTER_BASE_URL}/chat/completions",
                     headers={
                         "Authorization": f"Bearer {openrouter_key}",
                         "Content-Type": "application/json"
                     },
                     json={
-                        "model": "anthropic/claude-3.5-sonnet",
+                        "model": model,
                         "messages": messages,
                         "max_tokens": 1000
                     }
@@ -0,0 +1,246 @@
+"""
+SILHOUETTE SEARCH - Sesiones de Conversación
+=======================================
+
+Conversaciones guardadas en el servidor (SQLite vía aiosqlite) para que los
+clientes envíen solo el mensaje nuevo. Cada petición al modelo lleva una
+ventana deslizante acotada en tokens; los turnos que quedan fuera se
+resumen automáticamente en segundo plano.
+"""
+import os
+import time
+import uuid
+import zlib
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiosqlite
+
+from chroma_agent.chat_engine import chat_engine
+from chroma_agent.prompt_templates import prompt_registry, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Los contenidos largos se guardan comprimidos con zlib
+_COMPRESS_MIN_BYTES = 512
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    model TEXT,
+    system_prompt TEXT,
+    summary TEXT,
+    summary_tokens INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content BLOB NOT NULL,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    tokens INTEGER NOT NULL,
+    summarized INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_session ON turns(session_id, id);
+"""
+
+
+def _pack(text: str) -> Tuple[bytes, int]:
+    raw = text.encode("utf-8")
+    if len(raw) >= _COMPRESS_MIN_BYTES:
+        return zlib.compress(raw, 6), 1
+    return raw, 0
+
+
+def _unpack(content: bytes, compressed: int) -> str:
+    return (zlib.decompress(content) if compressed else content).decode("utf-8")
+
+
+class SessionStore:
+    """Persistencia de sesiones y turnos en SQLite"""
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.getenv("SESSION_DB_PATH", "data/sessions.db")
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self) -> aiosqlite.Connection:
+        if self._db is None:
+            async with self._lock:
+                if self._db is None:
+                    Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+                    db = await aiosqlite.connect(self.db_path)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA foreign_keys=ON")
+                    await db.executescript(_SCHEMA)
+                    await db.commit()
+                    self._db = db
+        return self._db
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def create(self, model: str = None, system_prompt: str = None) -> str:
+        db = await self.connect()
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        await db.execute(
+            "INSERT INTO sessions (id, model, system_prompt, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (session_id, model, system_prompt, now, now)
+        )
+        await db.commit()
+        return session_id
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        db = await self.connect()
+        async with db.execute(
+            "SELECT id, model, system_prompt, summary, summary_tokens, created_at, updated_at FROM sessions WHERE id = ?",
+            (session_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        keys = ("id", "model", "system_prompt", "summary", "summary_tokens", "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    async def delete(self, session_id: str) -> bool:
+        db = await self.connect()
+        cursor = await db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        await db.commit()
+        return cursor.rowcount > 0
+
+    async def add_turn(self, session_id: str, role: str, content: str) -> int:
+        db = await self.connect()
+        packed, compressed = _pack(content)
+        now = time.time()
+        cursor = await db.execute(
+            "INSERT INTO turns (session_id, role, content, compressed, tokens, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (session_id, role, packed, compressed, estimate_tokens(content), now)
+        )
+        await db.execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+        await db.commit()
+        return cursor.lastrowid
+
+    async def turns(self, session_id: str, include_summarized: bool = True) -> List[Dict[str, Any]]:
+        """Turnos de la sesión en orden cronológico"""
+        db = await self.connect()
+        query = "SELECT id, role, content, compressed, tokens, summarized FROM turns WHERE session_id = ?"
+        if not include_summarized:
+            query += " AND summarized = 0"
+        async with db.execute(query + " ORDER BY id", (session_id,)) as cursor:
+            rows = await cursor.fetchall()
+        return [
+            {"id": r[0], "role": r[1], "content": _unpack(r[2], r[3]), "tokens": r[4], "summarized": bool(r[5])}
+            for r in rows
+        ]
+
+    async def save_summary(self, session_id: str, summary: str, turn_ids: List[int]):
+        db = await self.connect()
+        await db.execute(
+            "UPDATE sessions SET summary = ?, summary_tokens = ? WHERE id = ?",
+            (summary, estimate_tokens(summary), session_id)
+        )
+        await db.executemany("UPDATE turns SET summarized = 1 WHERE id = ?", [(i,) for i in turn_ids])
+        await db.commit()
+
+
+class SessionManager:
+    """Gestiona conversaciones con ventana de contexto y resumen automático"""
+
+    def __init__(self, store: SessionStore = None, engine=None):
+        self.store = store or SessionStore()
+        self.engine = engine or chat_engine
+        self.context_tokens = int(os.getenv("SESSION_CONTEXT_TOKENS", "3000"))
+        self.summary_max_tokens = int(os.getenv("SESSION_SUMMARY_MAX_TOKENS", "300"))
+        self._summarizing: Dict[str, asyncio.Task] = {}
+
+    def build_window(self, session: Dict[str, Any], turns: List[Dict[str, Any]]) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]], int]:
+        """Devuelve (mensajes a enviar, turnos que quedan fuera, tokens de la ventana)"""
+        messages: List[Dict[str, str]] = []
+        used = 0
+        if session.get("system_prompt"):
+            messages.append({"role": "system", "content": session["system_prompt"]})
+            used += estimate_tokens(session["system_prompt"])
+        if session.get("summary"):
+            messages.append({"role": "system", "content": f"Resumen de la conversación anterior: {session['summary']}"})
+            used += session["summary_tokens"]
+
+        window: List[Dict[str, Any]] = []
+        # El turno más reciente (el mensaje nuevo) siempre entra
+        for index in range(len(turns) - 1, -1, -1):
+            turn = turns[index]
+            if window and used + turn["tokens"] > self.context_tokens:
+                return messages + [{"role": t["role"], "content": t["content"]} for t in window], turns[:index + 1], used
+            window.insert(0, turn)
+            used += turn["tokens"]
+        return messages + [{"role": t["role"], "content": t["content"]} for t in window], [], used
+
+    async def _summarize(self, session_id: str, overflow: List[Dict[str, Any]]):
+        session = await self.store.get(session_id)
+        if session is None:
+            return
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in overflow)
+        if session.get("summary"):
+            transcript = f"Resumen previo: {session['summary']}\n\n{transcript}"
+        model = session.get("model")
+        result = await self.engine.complete(
+            prompt_registry.messages("session_summary", transcript, model or self.engine.default_model),
+            model,
+            use_cache=False,
+            max_tokens=self.summary_max_tokens
+        )
+        if result.get("success"):
+            await self.store.save_summary(session_id, result["response"], [t["id"] for t in overflow])
+            logger.info(f"📝 Sesión {session_id}: {len(overflow)} turnos resumidos")
+        else:
+            logger.warning(f"⚠️ No se pudo resumir la sesión {session_id}: {result.get('error')}")
+
+    def _schedule_summary(self, session_id: str, overflow: List[Dict[str, Any]]):
+        if not overflow or session_id in self._summarizing:
+            return
+        task = asyncio.create_task(self._summarize(session_id, overflow))
+        self._summarizing[session_id] = task
+        task.add_done_callback(lambda _: self._summarizing.pop(session_id, None))
+
+    async def send(self, session_id: str, message: str, model: str = None) -> Dict[str, Any]:
+        """Añade un mensaje a la sesión y obtiene la respuesta del modelo"""
+        session = await self.store.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+
+        # El mensaje nuevo se guarda solo si el modelo responde: así un
+        # reintento tras un fallo no deja el turno del usuario duplicado
+        turns = await self.store.turns(session_id, include_summarized=False)
+        pending = {"id": None, "role": "user", "content": message, "tokens": estimate_tokens(message)}
+        messages, overflow, context_tokens = self.build_window(session, turns + [pending])
+
+        result = await self.engine.complete(messages, model or session.get("model"))
+        if result.get("success"):
+            await self.store.add_turn(session_id, "user", message)
+            await self.store.add_turn(session_id, "assistant", result["response"])
+            # El resumen se genera después de responder para no añadir latencia
+            self._schedule_summary(session_id, overflow)
+
+        return {
+            **result,
+            "session_id": session_id,
+            "message": message,
+            "context_tokens": context_tokens,
+            "context_messages": len(messages)
+        }
+
+    async def close(self):
+        for task in list(self._summarizing.values()):
+            task.cancel()
+        await self.store.close()
+
+
+# Instancia global
+session_manager = SessionManager()
@@ -0,0 +1,240 @@
+"""
+SILHOUETTE SEARCH - Configuración Recargable en Caliente
+===================================================
+
+Instantánea inmutable y tipada de la configuración (claves de API, URLs
+base y límites del pool HTTP). Un vigilante comprueba el mtime de `.env`
+y, si cambia, lo vuelve a leer, publica una instantánea nueva y avisa a los
+suscriptores. Los motores cambian así de clave sin reiniciar el servidor
+(ni relanzar Chromium) y sin cerrar las conexiones abiertas: las peticiones
+en curso terminan con la instantánea con la que empezaron.
+
+Las variables definidas en el entorno del proceso tienen prioridad sobre
+el `.env`, al arrancar y al recargar (como load_dotenv sin override); el
+resto de os.environ se actualiza con el `.env` para el código que aún lee
+con os.getenv. write() guarda claves en el `.env` (página /config).
+"""
+import os
+import asyncio
+import logging
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Dict, Any, List, Tuple, Callable, Optional, Mapping, Set, FrozenSet
+
+from dotenv import dotenv_values, load_dotenv
+
+logger = logging.getLogger(__name__)
+
+
+def _text(name: str):
+    return lambda env: env.get(name) or None
+
+
+def _url(name: str, default: str):
+    return lambda env: (env.get(name) or default).rstrip("/")
+
+
+def _int(name: str, default: int):
+    def read(env: Mapping[str, str]) -> int:
+        try:
+            return int(env.get(name) or default)
+        except ValueError:
+            logger.warning(f"⚠️ {name} no es un entero, se usa {default}")
+            return default
+    return read
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Instantánea inmutable de la configuración"""
+
+    openrouter_api_key: Optional[str] = field(default=None, metadata={"env": "OPENROUTER_API_KEY", "read": _text("OPENROUTER_API_KEY"), "secret": True})
+    serper_api_key: Optional[str] = field(default=None, metadata={"env": "SERPER_API_KEY", "read": _text("SERPER_API_KEY"), "secret": True})
+    unsplash_access_key: Optional[str] = field(default=None, metadata={"env": "UNSPLASH_ACCESS_KEY", "read": _text("UNSPLASH_ACCESS_KEY"), "secret": True})
+    openrouter_base_url: str = field(default="https://openrouter.ai/api/v1", metadata={"env": "OPENROUTER_BASE_URL", "read": _url("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")})
+    serper_base_url: str = field(default="https://google.serper.dev", metadata={"env": "SERPER_BASE_URL", "read": _url("SERPER_BASE_URL", "https://google.serper.dev")})
+    unsplash_base_url: str = field(default="https://api.unsplash.com", metadata={"env": "UNSPLASH_BASE_URL", "read": _url("UNSPLASH_BASE_URL", "https://api.unsplash.com")})
+    max_connections: int = field(default=100, metadata={"env": "MAX_CONNECTIONS", "read": _int("MAX_CONNECTIONS", 100)})
+    max_connections_per_host: int = field(default=0, metadata={"env": "MAX_CONNECTIONS_PER_HOST", "read": _int("MAX_CONNECTIONS_PER_HOST", 0)})
+    version: int = field(default=0, compare=False)
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str], version: int = 0) -> "Settings":
+        values = {f.name: f.metadata["read"](env) for f in fields(cls) if "read" in f.metadata}
+        return cls(version=version, **values)
+
+    def diff(self, other: "Settings") -> Set[str]:
+        """Nombres de atributo que cambian respecto a `other`"""
+        return {
+            f.name for f in fields(self)
+            if f.compare and getattr(self, f.name) != getattr(other, f.name)
+        }
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Vista publicable: las claves secretas solo indican si están configuradas"""
+        data = {}
+        for f in fields(self):
+            value = getattr(self, f.name)
+            data[f.name] = bool(value) if f.metadata.get("secret") else value
+        return data
+
+
+Subscriber = Callable[[Settings, Settings, Set[str]], None]
+
+
+def _quote(value: str) -> str:
+    # Entre comillas simples python-dotenv no interpreta nada
+    if "'" not in value:
+        return f"'{value}'"
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+class SettingsManager:
+    """Publica instantáneas de Settings y las recarga cuando cambia el .env"""
+
+    def __init__(self, env_file: str = ".env", poll_interval: float = 2.0):
+        self.env_file = Path(env_file)
+        self.poll_interval = poll_interval
+        load_dotenv(self.env_file)
+        self._current = Settings.from_env(os.environ)
+        self._subscribers: List[Tuple[Subscriber, Optional[FrozenSet[str]]]] = []
+        # Claves que vienen del .env: si desaparecen del archivo se quitan de os.environ
+        self._file_keys: Set[str] = set()
+        self._mtime = self._stat()
+        if self._mtime is not None:
+            self._file_keys = {
+                key for key, value in dotenv_values(self.env_file).items()
+                if value is not None and os.environ.get(key) == value
+            }
+        # Definidas por el proceso: el .env no las sustituye tampoco al recargar
+        self._process_keys: Set[str] = set(os.environ) - self._file_keys
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"reloads": 0, "errors": 0, "last_reload": None}
+
+    @property
+    def current(self) -> Settings:
+        return self._current
+
+    def subscribe(self, callback: Subscriber, keys: Optional[Set[str]] = None) -> Subscriber:
+        """Llama a callback(anterior, nueva, cambios) tras cada recarga.
+
+        Con `keys` solo se avisa si cambia alguno de esos atributos.
+        """
+        self._subscribers.append((callback, frozenset(keys) if keys else None))
+        return callback
+
+    def unsubscribe(self, callback: Subscriber):
+        self._subscribers = [(cb, keys) for cb, keys in self._subscribers if cb is not callback]
+
+    def _stat(self) -> Optional[int]:
+        try:
+            return self.env_file.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _apply_file(self, values: Dict[str, Optional[str]]):
+        values = {key: value for key, value in values.items() if value is not None and key not in self._process_keys}
+        for key in self._file_keys - set(values):
+            os.environ.pop(key, None)
+        os.environ.update(values)
+        self._file_keys = set(values)
+
+    def overridden(self, keys: Set[str]) -> Set[str]:
+        """Claves que el entorno del proceso fija y que el .env no puede cambiar"""
+        return keys & self._process_keys
+
+    def write(self, values: Dict[str, str]):
+        """Guarda valores en el .env conservando el resto de líneas (bloqueante).
+
+        Llamar después a reload() desde el bucle para aplicarlos.
+        """
+        for key, value in values.items():
+            if not key.isidentifier() or "\n" in value or "\r" in value:
+                raise ValueError(f"Valor no válido para {key}")
+        lines = self.env_file.read_text(encoding="utf-8").splitlines() if self.env_file.exists() else []
+        pending = dict(values)
+        for i, line in enumerate(lines):
+            key = line.split("=", 1)[0].strip()
+            if key.startswith("export "):
+                key = key[len("export "):].strip()
+            if "=" in line and key in pending and not line.lstrip().startswith("#"):
+                lines[i] = f"{key}={_quote(pending.pop(key))}"
+        lines.extend(f"{key}={_quote(value)}" for key, value in pending.items())
+        # Escritura atómica: el vigilante nunca lee un .env a medias
+        tmp = self.env_file.with_name(self.env_file.name + ".tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, self.env_file)
+
+    def reload(self) -> Set[str]:
+        """Relee el .env y publica una instantánea nueva si algo cambió"""
+        self._mtime = self._stat()
+        try:
+            values = dotenv_values(self.env_file) if self._mtime is not None else {}
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"❌ Error leyendo {self.env_file}: {e}")
+            return set()
+
+        self._apply_file(values)
+        previous = self._current
+        snapshot = Settings.from_env(os.environ, previous.version + 1)
+        changed = snapshot.diff(previous)
+        if not changed:
+            return changed
+
+        self._current = snapshot
+        self.stats["reloads"] += 1
+        self.stats["last_reload"] = sorted(changed)
+        logger.info(f"🔄 Configuración recargada (v{snapshot.version}): {', '.join(sorted(changed))}")
+
+        for callback, keys in list(self._subscribers):
+            if keys is not None and not keys & changed:
+                continue
+            try:
+                callback(previous, snapshot, changed)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"❌ Error aplicando configuración en {callback!r}: {e}")
+        return changed
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self._stat() != self._mtime:
+                self.reload()
+
+    def start(self):
+        """Arranca el vigilante del .env (requiere un bucle de eventos activo)"""
+        if self.poll_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._watch())
+            logger.info(f"👀 Vigilando {self.env_file} cada {self.poll_interval}s")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "env_file": str(self.env_file),
+            "watching": self._task is not None and not self._task.done(),
+            "version": self._current.version,
+            **self.stats
+        }
+
+
+def settings_from_env() -> SettingsManager:
+    """Crea el gestor de configuración desde variables de entorno"""
+    return SettingsManager(
+        env_file=os.getenv("SETTINGS_ENV_FILE", ".env"),
+        poll_interval=float(os.getenv("SETTINGS_RELOAD_INTERVAL", "2"))
+    )
+
+
+# Instancia global
+settings = settings_from_env()
@@ -0,0 +1,290 @@
+"""
+SILHOUETTE SEARCH - Estado Compartido entre Workers
+==============================================
+
+Con varios workers de uvicorn (WEB_CONCURRENCY > 1) cada proceso tiene sus
+propias instancias globales. Este módulo pone en común lo que debe verse
+igual desde todos:
+
+- SharedStore: clave/valor con caducidad y token buckets atómicos sobre
+  SQLite en modo WAL (lecturas concurrentes, escrituras serializadas con
+  BEGIN IMMEDIATE). Las caches de consultas y de chat lo usan como segundo
+  nivel y los límites de tasa lo usan para que la cuota sea por host, no
+  por proceso. Desde el bucle de eventos se usa solo a través de su pool de
+  hilos (aget, set_later, try_take): una espera por el bloqueo de SQLite no
+  detiene al worker.
+- ProcessSlots: semáforo entre procesos con flock sobre N archivos; el
+  sistema libera el hueco si un worker muere. Limita las páginas de
+  navegador activas en todo el host.
+
+Con un solo worker no se crea nada y todo sigue en memoria.
+"""
+import os
+import time
+import random
+import pickle
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin coordinación entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class SharedStore:
+    """Clave/valor con TTL y token buckets en SQLite (WAL) compartido por los workers"""
+
+    def __init__(self, db_path: str, purge_interval: float = 300.0, threads: int = 4):
+        self.db_path = db_path
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+        # Pool propio: acota las conexiones abiertas (una por hilo)
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="shared-state")
+        self._connections = []
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "errors": 0, "rejected_takes": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        # Una conexión por hilo: el bucle de eventos y los hilos de to_thread
+        db = getattr(self._local, "db", None)
+        if db is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            # check_same_thread=False solo para poder cerrarla desde close()
+            db = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._local.db = db
+            self._connections.append(db)
+        return db
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def aget(self, namespace: str, key: str) -> Optional[Any]:
+        """get() en el pool de hilos del almacén"""
+        return await self._run(self.get, namespace, key)
+
+    def set_later(self, namespace: str, key: str, value: Any, ttl: float):
+        """set() en segundo plano sin esperar (el valor no debe modificarse después)"""
+        self._executor.submit(self.set, namespace, key, value, ttl)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Valor guardado y vigente, o None"""
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM kv WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ Estado compartido no disponible: {e}")
+            return None
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return pickle.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float):
+        try:
+            db = self._connect()
+            now = time.time()
+            db.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + ttl)
+            )
+            self.stats["writes"] += 1
+            if now - self._last_purge > self.purge_interval:
+                self._last_purge = now
+                db.execute("DELETE FROM kv WHERE expires_at <= ?", (now,))
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ No se pudo escribir en el estado compartido: {e}")
+
+    def delete(self, namespace: str, key: str):
+        try:
+            self._connect().execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ No se pudo borrar del estado compartido: {e}")
+
+    def _try_take(self, buckets: Sequence["SharedTokenBucket"]) -> bool:
+        db = self._connect()
+        try:
+            # Todos los buckets se leen y descuentan en la misma transacción
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            levels = []
+            for bucket in buckets:
+                row = db.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (bucket.key,)).fetchone()
+                levels.append(bucket.capacity if row is None else min(bucket.capacity, row[0] + (now - row[1]) * bucket.rate))
+            taken = all(tokens >= 1 for tokens in levels)
+            if taken:
+                levels = [tokens - 1 for tokens in levels]
+                db.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                    [(bucket.key, tokens, now) for bucket, tokens in zip(buckets, levels)]
+                )
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            self.stats["errors"] += 1
+            logger.warning(f"⚠️ Token bucket compartido no disponible: {e}")
+            # Sin estado compartido no se bloquea el tráfico
+            return True
+        for bucket, tokens in zip(buckets, levels):
+            bucket.observe(tokens, now)
+        if not taken:
+            self.stats["rejected_takes"] += 1
+        return taken
+
+    async def try_take(self, buckets: Sequence["SharedTokenBucket"]) -> bool:
+        """Consume un token de cada bucket solo si todos tienen uno, de forma atómica entre procesos.
+
+        Actualiza además el estado local de cada bucket para que wait_time()
+        estime la espera sin consultar SQLite.
+        """
+        return await self._run(self._try_take, buckets)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for db in self._connections:
+            db.close()
+        self._connections.clear()
+        self._local = threading.local()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"db_path": self.db_path, **self.stats}
+
+
+class SharedTokenBucket:
+    """Token bucket por host; se consume con SharedStore.try_take.
+
+    wait_time() no toca SQLite: estima desde el último estado observado.
+    Los demás workers solo pueden gastar tokens, así que la estimación nunca
+    es más pesimista que la real; try_take() la corrige si se quedó corta.
+    """
+
+    def __init__(self, store: SharedStore, key: str, rate: float, capacity: float):
+        self.store = store
+        self.key = key
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.time()
+
+    def observe(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+
+    def wait_time(self) -> float:
+        tokens = min(self.capacity, self.tokens + (time.time() - self.updated_at) * self.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+def try_lock_file(path: Path) -> Optional[int]:
+    """Bloqueo exclusivo sin espera de un archivo (None si lo tiene otro proceso).
+
+    El bloqueo dura hasta unlock_file() o hasta que el proceso termine. Sin
+    fcntl devuelve -1: se asume un único proceso.
+    """
+    if fcntl is None:
+        return -1
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except OSError:
+        os.close(fd)
+        return None
+
+
+def unlock_file(fd: Optional[int]):
+    if fd is not None and fd >= 0:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class ProcessSlots:
+    """Semáforo entre procesos: N archivos bloqueados con flock"""
+
+    def __init__(self, directory: str, slots: int, name: str = "slot"):
+        self.directory = Path(directory)
+        self.slots = slots
+        self.name = name
+        self.waits = 0
+
+    def _try_lock(self) -> Optional[int]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for index in random.sample(range(self.slots), self.slots):
+            fd = try_lock_file(self.directory / f"{self.name}-{index}.lock")
+            if fd is not None:
+                return fd
+        return None
+
+    async def acquire(self, timeout: float = 60.0) -> Optional[int]:
+        """Espera un hueco libre; devuelve el descriptor a pasar a release()"""
+        if fcntl is None or self.slots <= 0:
+            return None
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            fd = self._try_lock()
+            if fd is not None:
+                return fd
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Sin huecos libres en {self.name} ({self.slots}) tras {timeout}s")
+            self.waits += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def release(self, fd: Optional[int]):
+        unlock_file(fd)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"slots": self.slots, "waits": self.waits, "coordinated": fcntl is not None}
+
+
+def worker_count() -> int:
+    """Workers configurados (WEB_CONCURRENCY, la variable que lee uvicorn)"""
+    try:
+        return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+def shared_store_from_env() -> Optional[SharedStore]:
+    """Crea el almacén compartido si hay varios workers (o SHARED_STATE_ENABLED=true)"""
+    enabled = os.getenv("SHARED_STATE_ENABLED", "auto").lower()
+    if enabled == "false" or (enabled == "auto" and worker_count() == 1):
+        return None
+    return SharedStore(os.getenv("SHARED_STATE_PATH", "data/shared_state.db"))
+
+
+# Instancia global (None con un solo worker)
+shared_store = shared_store_from_env()
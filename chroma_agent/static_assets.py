@@ -0,0 +1,285 @@
+"""
+SILHOUETTE SEARCH - Archivos Estáticos Precomprimidos
+================================================
+
+Sirve web_interface/ (y static/ si existe) sin leer ni comprimir en cada
+petición. Al arrancar se recorre el directorio una vez:
+
+- cada archivo se comprime con gzip y, si está instalado el paquete
+  `brotli`, con brotli; solo se guarda la variante si ocupa menos;
+- los archivos pequeños quedan en memoria con todas sus variantes; los
+  grandes se sirven desde disco (las variantes, desde STATIC_CACHE_DIR);
+- el ETag es fuerte (hash del contenido) y distinto por codificación, y
+  If-None-Match responde 304 sin cuerpo;
+- HEAD devuelve las mismas cabeceras sin cuerpo y las peticiones Range de
+  archivos grandes se sirven desde disco con FileResponse;
+- un archivo que no estaba al arrancar se indexa la primera vez que se pide;
+- cada STATIC_CHECK_INTERVAL segundos se comprueban mtime y tamaño del
+  archivo pedido: si cambió se vuelve a indexar (cuerpo y ETag nuevos) y si
+  se borró responde 404.
+
+Los nombres con hash de contenido (`app.3f9a1c2b.js`) se cachean un año
+como immutable; el resto (HTML) se revalida siempre con el ETag.
+"""
+import os
+import re
+import gzip
+import time
+import asyncio
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from starlette.requests import Request
+from starlette.responses import Response, FileResponse
+
+try:
+    import brotli
+except ImportError:  # sin brotli solo se precomprime con gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# nombre.<hash hex de 8 o más>.ext
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Accept-Encoding -> {codificación: q}"""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match: lista de ETags o * (comparación débil, como pide RFC 9110)"""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class StaticAsset:
+    """Un archivo con sus variantes precomprimidas"""
+
+    __slots__ = ("path", "content_type", "digest", "cache_control", "variants", "sizes", "files", "stamp", "checked_at")
+
+    def __init__(self, path: Path, content_type: str, digest: str, cache_control: str, stamp: tuple):
+        self.path = path
+        self.content_type = content_type
+        self.digest = digest
+        self.cache_control = cache_control
+        # (mtime_ns, tamaño) del archivo cuando se indexó
+        self.stamp = stamp
+        self.checked_at = time.monotonic()
+        # codificación ("identity", "gzip", "br") -> bytes en memoria
+        self.variants: Dict[str, bytes] = {}
+        # codificación -> ruta en disco (archivos grandes)
+        self.files: Dict[str, Path] = {}
+        self.sizes: Dict[str, int] = {}
+
+    def etag(self, encoding: str) -> str:
+        suffix = "" if encoding == "identity" else f"-{encoding}"
+        return f'"{self.digest}{suffix}"'
+
+    def choose(self, accept_encoding: str) -> str:
+        """Variante más pequeña entre las aceptadas por el cliente"""
+        accepted = accepted_encodings(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best = "identity"
+        for encoding in self.sizes:
+            if encoding == "identity" or accepted.get(encoding, wildcard) <= 0:
+                continue
+            if self.sizes[encoding] < self.sizes[best]:
+                best = encoding
+        return best
+
+
+class StaticAssets:
+    """Índice en memoria de un directorio de archivos estáticos"""
+
+    def __init__(
+        self,
+        directory: str,
+        max_memory_bytes: int = 256 * 1024,
+        min_compress_bytes: int = 512,
+        cache_dir: str = "data/static_cache",
+        check_interval: float = 1.0
+    ):
+        self.directory = Path(directory)
+        self.max_memory_bytes = max_memory_bytes
+        self.min_compress_bytes = min_compress_bytes
+        self.cache_dir = Path(cache_dir)
+        self.check_interval = check_interval
+        self.assets: Dict[str, StaticAsset] = {}
+        self.loaded = False
+        self.stats = {"hits": 0, "not_modified": 0, "bytes_saved": 0}
+
+    @property
+    def encodings(self) -> List[str]:
+        return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+    def load(self):
+        """Lee y precomprime todos los archivos del directorio"""
+        assets = {}
+        if self.directory.is_dir():
+            for path in sorted(self.directory.rglob("*")):
+                if path.is_file():
+                    name = path.relative_to(self.directory).as_posix()
+                    assets[name] = self._build(path, name)
+        self.assets = assets
+        self.loaded = True
+        if assets:
+            total = sum(a.sizes["identity"] for a in assets.values())
+            smallest = sum(min(a.sizes.values()) for a in assets.values())
+            logger.info(
+                f"📄 {self.directory}: {len(assets)} archivos precomprimidos "
+                f"({total} -> {smallest} bytes, {', '.join(self.encodings)})"
+            )
+
+    def _build(self, path: Path, name: str) -> StaticAsset:
+        # stat antes de leer: si el archivo cambia entre medias, la próxima
+        # comprobación verá otro mtime y lo volverá a indexar
+        stat = path.stat()
+        data = path.read_bytes()
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        cache_control = IMMUTABLE if _HASHED_NAME.search(name) else REVALIDATE
+        asset = StaticAsset(path, content_type, digest, cache_control, (stat.st_mtime_ns, stat.st_size))
+
+        in_memory = len(data) <= self.max_memory_bytes
+        asset.sizes["identity"] = len(data)
+        if in_memory:
+            asset.variants["identity"] = data
+        else:
+            asset.files["identity"] = path
+
+        if len(data) >= self.min_compress_bytes and content_type.startswith(_COMPRESSIBLE):
+            for encoding in self.encodings:
+                compressed = _compress(data, encoding)
+                if len(compressed) >= len(data):
+                    continue
+                asset.sizes[encoding] = len(compressed)
+                if in_memory:
+                    asset.variants[encoding] = compressed
+                else:
+                    target = self.cache_dir / f"{digest}.{encoding}"
+                    if not target.exists():
+                        target.parent.mkdir(parents=True, exist_ok=True)
+                        tmp = target.with_suffix(".tmp")
+                        tmp.write_bytes(compressed)
+                        os.replace(tmp, target)
+                    asset.files[encoding] = target
+        return asset
+
+    def _load_new(self, name: str) -> Optional[StaticAsset]:
+        """Indexa un archivo creado después de load() (None si no existe o sale del directorio)"""
+        root = self.directory.resolve()
+        path = (root / name).resolve()
+        if not path.is_relative_to(root) or not path.is_file():
+            return None
+        asset = self._build(path, path.relative_to(root).as_posix())
+        self.assets[name] = asset
+        return asset
+
+    def _current(self, name: str) -> Optional[StaticAsset]:
+        """Entrada de `name` al día con el disco: se reindexa si cambió y se quita si se borró"""
+        asset = self.assets.get(name)
+        if asset is None:
+            return self._load_new(name)
+        try:
+            stat = asset.path.stat()
+        except OSError:
+            self.assets.pop(name, None)
+            return None
+        if (stat.st_mtime_ns, stat.st_size) == asset.stamp:
+            asset.checked_at = time.monotonic()
+            return asset
+        asset = self._build(asset.path, name)
+        self.assets[name] = asset
+        logger.info(f"📄 {self.directory}/{name} modificado: reindexado")
+        return asset
+
+    async def response(self, name: str, request: Request) -> Response:
+        """Respuesta para `name` según Accept-Encoding, If-None-Match y Range (404 si no existe)"""
+        if not self.loaded:
+            await asyncio.to_thread(self.load)
+        asset = self.assets.get(name)
+        if asset is None or time.monotonic() - asset.checked_at >= self.check_interval:
+            asset = await asyncio.to_thread(self._current, name)
+            if asset is None:
+                return Response(status_code=404)
+
+        if request.headers.get("range") and "identity" in asset.files:
+            # FileResponse atiende Range/If-Range sobre el archivo original
+            encoding = "identity"
+        else:
+            encoding = asset.choose(request.headers.get("accept-encoding", ""))
+        etag = asset.etag(encoding)
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        self.stats["hits"] += 1
+        self.stats["bytes_saved"] += asset.sizes["identity"] - asset.sizes[encoding]
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if encoding in asset.variants:
+            body = asset.variants[encoding]
+            if request.method == "HEAD":
+                headers["Content-Length"] = str(len(body))
+                body = b""
+            return Response(body, media_type=asset.content_type, headers=headers)
+        # FileResponse ya responde a HEAD sin cuerpo
+        return FileResponse(asset.files[encoding], media_type=asset.content_type, headers=headers)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "directory": str(self.directory),
+            "files": len(self.assets),
+            "in_memory": sum(1 for a in self.assets.values() if a.variants),
+            "encodings": self.encodings,
+            **self.stats
+        }
+
+
+def static_assets_from_env(directory: str) -> StaticAssets:
+    """Crea el índice de archivos estáticos desde variables de entorno"""
+    return StaticAssets(
+        directory,
+        max_memory_bytes=int(os.getenv("STATIC_MAX_MEMORY_BYTES", str(256 * 1024))),
+        min_compress_bytes=int(os.getenv("STATIC_MIN_COMPRESS_BYTES", "512")),
+        cache_dir=os.getenv("STATIC_CACHE_DIR", "data/static_cache"),
+        check_interval=float(os.getenv("STATIC_CHECK_INTERVAL", "1"))
+    )
+
+
+# Instancias globales
+web_assets = static_assets_from_env("web_interface")
+static_assets = static_assets_from_env("static")
@@ -0,0 +1,282 @@
+"""
+SILHOUETTE SEARCH - Contabilidad de Uso de APIs
+==========================================
+
+Registra cada llamada a un upstream (SERPER, UNSPLASH, OPENROUTER) con
+modelo, tokens, coste, latencia y estado. Las llamadas se acumulan en memoria
+y se escriben en SQLite por lotes desde una tarea en segundo plano, junto con
+agregados por hora; los agregados diarios se calculan a partir de los horarios.
+"""
+import os
+import time
+import asyncio
+import logging
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    upstream TEXT NOT NULL,
+    model TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    latency_ms REAL NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_usage_calls_ts ON usage_calls(ts);
+CREATE TABLE IF NOT EXISTS usage_hourly (
+    hour INTEGER NOT NULL,
+    upstream TEXT NOT NULL,
+    model TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    cost REAL NOT NULL,
+    latency_sum_ms REAL NOT NULL,
+    latency_max_ms REAL NOT NULL,
+    PRIMARY KEY (hour, upstream, model)
+);
+"""
+
+_UPSERT_HOURLY = """
+INSERT INTO usage_hourly VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hour, upstream, model) DO UPDATE SET
+    calls = calls + excluded.calls,
+    errors = errors + excluded.errors,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    total_tokens = total_tokens + excluded.total_tokens,
+    cost = cost + excluded.cost,
+    latency_sum_ms = latency_sum_ms + excluded.latency_sum_ms,
+    latency_max_ms = MAX(latency_max_ms, excluded.latency_max_ms)
+"""
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+
+
+class UsageRecorder:
+    """Acumula llamadas en memoria y las escribe por lotes en SQLite"""
+
+    def __init__(
+        self,
+        db_path: str = None,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        max_pending: int = 10000,
+        retention_days: float = 7.0,
+        enabled: bool = True
+    ):
+        self.db_path = db_path or os.getenv("USAGE_DB_PATH", "data/usage.db")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.retention_days = retention_days
+        self.enabled = enabled
+        self._pending: List[Tuple] = []
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._last_prune = 0.0
+        self.stats = {"recorded": 0, "written": 0, "dropped": 0, "flushes": 0}
+
+    async def connect(self) -> aiosqlite.Connection:
+        if self._db is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            db = await aiosqlite.connect(self.db_path)
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute("PRAGMA synchronous=NORMAL")
+            await db.executescript(_SCHEMA)
+            await db.commit()
+            self._db = db
+        return self._db
+
+    def record(
+        self,
+        upstream: str,
+        status: Any,
+        latency: float,
+        model: str = None,
+        usage: Optional[Dict[str, Any]] = None,
+        cost: Optional[float] = None
+    ):
+        """Registra una llamada sin bloquear; la escritura ocurre en segundo plano"""
+        if not self.enabled:
+            return
+        usage = usage or {}
+        self._pending.append((
+            time.time(),
+            upstream,
+            model or "",
+            str(status),
+            1 if status == 200 else 0,
+            round(latency * 1000, 2),
+            int(usage.get("prompt_tokens") or 0),
+            int(usage.get("completion_tokens") or 0),
+            int(usage.get("total_tokens") or 0),
+            float(cost or 0.0)
+        ))
+        self.stats["recorded"] += 1
+        if len(self._pending) > self.max_pending:
+            # Si SQLite no da abasto se pierden las llamadas más antiguas
+            overflow = len(self._pending) - self.max_pending
+            del self._pending[:overflow]
+            self.stats["dropped"] += overflow
+
+        self._ensure_flusher()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error escribiendo contabilidad de uso: {e}")
+
+    @staticmethod
+    def _rollup(rows: List[Tuple]) -> List[Tuple]:
+        """Agrega un lote por (hora, upstream, modelo) antes de escribirlo"""
+        buckets: Dict[Tuple, List] = {}
+        for ts, upstream, model, _, success, latency_ms, prompt, completion, total, cost in rows:
+            key = (int(ts // 3600) * 3600, upstream, model)
+            bucket = buckets.setdefault(key, [0, 0, 0, 0, 0, 0.0, 0.0, 0.0])
+            bucket[0] += 1
+            bucket[1] += 0 if success else 1
+            bucket[2] += prompt
+            bucket[3] += completion
+            bucket[4] += total
+            bucket[5] += cost
+            bucket[6] += latency_ms
+            bucket[7] = max(bucket[7], latency_ms)
+        return [key + tuple(values) for key, values in buckets.items()]
+
+    async def flush(self):
+        """Escribe las llamadas pendientes y actualiza los agregados horarios"""
+        async with self._lock:
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            db = await self.connect()
+            await db.executemany(
+                "INSERT INTO usage_calls (ts, upstream, model, status, success, latency_ms, "
+                "prompt_tokens, completion_tokens, total_tokens, cost) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            await db.executemany(_UPSERT_HOURLY, self._rollup(rows))
+            await self._prune(db)
+            await db.commit()
+            self.stats["written"] += len(rows)
+            self.stats["flushes"] += 1
+
+    async def _prune(self, db: aiosqlite.Connection):
+        # El detalle por llamada se conserva `retention_days`; los agregados, siempre
+        now = time.time()
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        await db.execute("DELETE FROM usage_calls WHERE ts < ?", (now - self.retention_days * 86400,))
+
+    async def query(
+        self,
+        granularity: str = "hour",
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        upstream: Optional[str] = None,
+        model: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Agregados por hora o por día, filtrables por upstream y modelo"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Granularidad inválida: {granularity} (hour, day)")
+        await self.flush()
+        db = await self.connect()
+
+        now = time.time()
+        since = now - 86400 if since is None else since
+        until = now if until is None else until
+        period = GRANULARITIES[granularity]
+        conditions = ["hour >= ?", "hour < ?"]
+        params: List[Any] = [int(since // 3600) * 3600, until]
+        if upstream:
+            conditions.append("upstream = ?")
+            params.append(upstream)
+        if model:
+            conditions.append("model = ?")
+            params.append(model)
+
+        sql = (
+            f"SELECT (hour / {period}) * {period} AS period, upstream, model, SUM(calls), SUM(errors), "
+            "SUM(prompt_tokens), SUM(completion_tokens), SUM(total_tokens), SUM(cost), "
+            "SUM(latency_sum_ms), MAX(latency_max_ms) FROM usage_hourly "
+            f"WHERE {' AND '.join(conditions)} GROUP BY period, upstream, model ORDER BY period, upstream, model"
+        )
+        async with db.execute(sql, params) as cursor:
+            rows = await cursor.fetchall()
+        return [
+            {
+                "period_start": r[0],
+                "upstream": r[1],
+                "model": r[2] or None,
+                "calls": r[3],
+                "errors": r[4],
+                "error_rate": round(r[4] / r[3], 4) if r[3] else 0.0,
+                "prompt_tokens": r[5],
+                "completion_tokens": r[6],
+                "total_tokens": r[7],
+                "cost": round(r[8], 6),
+                "latency_avg_ms": round(r[9] / r[3], 1) if r[3] else None,
+                "latency_max_ms": round(r[10], 1)
+            }
+            for r in rows
+        ]
+
+    async def close(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error escribiendo contabilidad de uso: {e}")
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "pending": len(self._pending), **self.stats}
+
+
+def recorder_from_env() -> UsageRecorder:
+    """Crea el registro de uso desde variables de entorno"""
+    return UsageRecorder(
+        batch_size=int(os.getenv("USAGE_BATCH_SIZE", "200")),
+        flush_interval=float(os.getenv("USAGE_FLUSH_INTERVAL", "2")),
+        max_pending=int(os.getenv("USAGE_MAX_PENDING", "10000")),
+        retention_days=float(os.getenv("USAGE_RETENTION_DAYS", "7")),
+        enabled=os.getenv("USAGE_ENABLED", "true").lower() == "true"
+    )
+
+
+# Instancia global
+usage_recorder = recorder_from_env()
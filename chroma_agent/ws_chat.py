@@ -0,0 +1,134 @@
+"""
+SILHOUETTE SEARCH - Chat Multiplexado por WebSocket
+==============================================
+
+Varias conversaciones concurrentes sobre una sola conexión WebSocket.
+
+Mensajes del cliente:
+    {"type": "chat", "id": "m1", "message": "...", "model": "...", "policy": "fastest"}
+    {"type": "cancel", "id": "m1"}
+    {"type": "ping"}
+
+Mensajes del servidor (todos llevan el "id" de la conversación):
+    {"type": "delta", "id", "content"}   fragmento de la respuesta
+    {"type": "done", "id", "usage", ...} fin con contabilidad de uso
+    {"type": "error", "id", "error"}
+    {"type": "cancelled", "id"}
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, Any
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from chroma_agent.admission import AdmissionRejected, client_key
+from chroma_agent.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+class ChatMultiplexer:
+    """Atiende una conexión WebSocket con múltiples conversaciones en paralelo"""
+
+    def __init__(self, websocket: WebSocket, engine, max_concurrent: int = None, admission=None):
+        self.websocket = websocket
+        self.engine = engine
+        self.admission = admission
+        self.max_concurrent = max_concurrent or int(os.getenv("WS_MAX_CONCURRENT_CHATS", "8"))
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Los envíos de distintas conversaciones no deben intercalarse
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, payload: Dict[str, Any]):
+        async with self._send_lock:
+            await self.websocket.send_text(dumps(payload).decode("utf-8"))
+
+    async def _stream(
+        self,
+        message_id: str,
+        message: str,
+        model: str = None,
+        priority: str = "interactive",
+        policy: str = None
+    ):
+        try:
+            if self.admission is not None:
+                # Misma clave que las peticiones HTTP: API key de la cabecera o IP
+                await self.admission.admit(
+                    model or self.engine.router.candidates(policy)[0], client_key(self.websocket), priority
+                )
+            async for event in self.engine.chat_stream(message, model, policy=policy):
+                await self.send({**event, "id": message_id})
+        except asyncio.CancelledError:
+            raise
+        except AdmissionRejected as e:
+            await self.send({"type": "error", "id": message_id, "error": str(e), "retry_after": round(e.retry_after, 1)})
+        except Exception as e:
+            logger.error(f"Error en conversación WebSocket {message_id}: {e}")
+            await self.send({"type": "error", "id": message_id, "error": str(e)})
+        finally:
+            # Si se canceló y el id ya se reutilizó, la entrada es de la tarea nueva
+            if self.tasks.get(message_id) is asyncio.current_task():
+                del self.tasks[message_id]
+
+    async def _handle(self, data: Any):
+        if not isinstance(data, dict):
+            await self.send({"type": "error", "error": "Se esperaba un objeto JSON"})
+            return
+        kind = data.get("type")
+        message_id = str(data.get("id", ""))
+
+        if kind == "ping":
+            await self.send({"type": "pong"})
+        elif kind == "chat":
+            if not message_id or not data.get("message"):
+                await self.send({"type": "error", "id": message_id, "error": "id y message requeridos"})
+            elif message_id in self.tasks:
+                await self.send({"type": "error", "id": message_id, "error": "id ya en uso"})
+            elif len(self.tasks) >= self.max_concurrent:
+                await self.send({"type": "error", "id": message_id, "error": "Demasiadas conversaciones simultáneas"})
+            else:
+                self.tasks[message_id] = asyncio.create_task(
+                    self._stream(
+                        message_id,
+                        data["message"],
+                        data.get("model"),
+                        data.get("priority", "interactive"),
+                        data.get("policy")
+                    )
+                )
+        elif kind == "cancel":
+            task = self.tasks.pop(message_id, None)
+            if task is not None:
+                task.cancel()
+                await self.send({"type": "cancelled", "id": message_id})
+        else:
+            await self.send({"type": "error", "id": message_id, "error": f"Tipo de mensaje desconocido: {kind}"})
+
+    async def run(self):
+        """Bucle principal de la conexión hasta que el cliente se desconecta"""
+        await self.websocket.accept()
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+                raw = message.get("text")
+                if raw is None:
+                    # Un frame binario no cierra la conexión ni sus conversaciones
+                    await self.send({"type": "error", "error": "Solo se admiten mensajes de texto"})
+                    continue
+                try:
+                    data = json.loads(raw)
+                except json.JSONDecodeError:
+                    await self.send({"type": "error", "error": "JSON inválido"})
+                    continue
+                await self._handle(data)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in list(self.tasks.values()):
+                task.cancel()
+            self.tasks.clear()
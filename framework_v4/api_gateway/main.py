@@ -10,11 +10,17 @@ Fecha: 2025-11-10
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:
+    DefaultJSONResponse = JSONResponse
 import uvicorn
 import asyncio
 import json
 from typing import Dict, Any, List
 from datetime import datetime
+from contextlib import asynccontextmanager
 import sys
 import os
 
@@ -24,10 +30,30 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Importar orquestador
 from core.orchestrator.main import SilhouetteV4Orchestrator
 
+# Métricas compartidas con chroma_agent (en la raíz del repositorio)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+try:
+    from chroma_agent.metrics import metrics, MetricsMiddleware
+    from chroma_agent.loop_monitor import loop_monitor
+except ImportError:
+    metrics = None
+    loop_monitor = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Lag del bucle de eventos en /metrics
+    if loop_monitor is not None:
+        loop_monitor.start()
+    yield
+    if loop_monitor is not None:
+        await loop_monitor.close()
+
 app = FastAPI(
     title="Silhouette V4.0 API Gateway",
     description="Framework Multi-Agente Empresarial - 78+ Equipos Especializados",
-    version="4.0.0"
+    version="4.0.0",
+    lifespan=lifespan,
+    default_response_class=DefaultJSONResponse
 )
 
 # CORS middleware
@@ -38,6 +64,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if metrics is not None:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
 
 # Inicializar orquestador
 orchestrator = SilhouetteV4Orchestrator()
@@ -61,6 +89,13 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Métricas Prometheus del gateway"""
+    if metrics is None:
+        return JSONResponse({"error": "Métricas no disponibles"}, status_code=503)
+    return metrics.response()
+
 @app.get("/teams")
 async def get_teams():
     return {
@@ -86,7 +121,7 @@ async def execute_task(task_data: Dict[str, Any]):
         )
         
         result = await orchestrator.execute_task(task)
-        return JSONResponse(content=result)
+        return DefaultJSONResponse(content=result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error ejecutando tarea: {str(e)}")
@@ -96,7 +131,7 @@ async def execute_workflow(workflow_data: Dict[str, Any]):
     """Ejecuta un workflow completo"""
     try:
         result = await orchestrator.process_workflow(workflow_data)
-        return JSONResponse(content=result)
+        return DefaultJSONResponse(content=result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error ejecutando workflow: {str(e)}")
@@ -163,6 +198,7 @@ if __name__ == "__main__":
     print(f"🔗 Endpoints disponibles:")
     print(f"   - GET  /")
     print(f"   - GET  /health")
+    print(f"   - GET  /metrics")
     print(f"   - GET  /teams")
     print(f"   - POST /task")
     print(f"   - POST /workflow")
@@ -4,6 +4,10 @@ import json
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
+from chroma_agent.serialization import FastJSONResponse, RawJSONResponse, dumps
+from contextlib import asynccontextmanager
+from chroma_agent.metrics import metrics, MetricsMiddleware
+from chroma_agent.loop_monitor import loop_monitor
 
 V4_TEAMS = {
   "audiovisual_team": {
@@ -712,10 +716,31 @@ V4_TEAMS = {
   }
 }
 
+V4_CATEGORIES = {"equipos_principales": 25, "sistema_audiovisual": 11, "workflows_dinamicos": 19, "core": 4, "infraestructura": 5}
+
+# V4_TEAMS es estático: se codifica una sola vez y cada petición solo añade el timestamp
+_TEAMS_PAYLOAD_PREFIX = (
+    b'{"teams":' + dumps(V4_TEAMS)
+    + b',"total":' + dumps(len(V4_TEAMS))
+    + b',"categories":' + dumps(V4_CATEGORIES)
+    + b',"timestamp":'
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Lag del bucle de eventos en /metrics
+    if loop_monitor is not None:
+        loop_monitor.start()
+    yield
+    if loop_monitor is not None:
+        await loop_monitor.close()
+
 app = FastAPI(
     title="Silhouette Unified V4.0",
     description="Framework Multi-Agente con 64 equipos",
-    version="4.0.0"
+    version="4.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -725,6 +750,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, metrics=metrics)
 
 @app.get("/")
 async def home():
@@ -732,26 +758,29 @@ async def home():
         "status": "online",
         "version": "4.0.0",
         "teams_count": len(V4_TEAMS),
-        "categories": {"equipos_principales": 25, "sistema_audiovisual": 11, "workflows_dinamicos": 19, "core": 4, "infraestructura": 5},
+        "categories": V4_CATEGORIES,
         "message": "Silhouette Unified V4.0 activo"
     }
 
 @app.get("/v4/teams")
 async def get_teams():
-    return {
-        "teams": V4_TEAMS,
-        "total": len(V4_TEAMS),
-        "categories": {"equipos_principales": 25, "sistema_audiovisual": 11, "workflows_dinamicos": 19, "core": 4, "infraestructura": 5},
-        "timestamp": datetime.now().isoformat()
-    }
+    return RawJSONResponse(_TEAMS_PAYLOAD_PREFIX + dumps(datetime.now().isoformat()) + b"}")
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return metrics.response()
 
 if __name__ == "__main__":
     import uvicorn
     import asyncio
     
+    # El catálogo de equipos es de solo lectura: cada worker sirve su copia.
+    # Con varios workers uvicorn necesita la ruta de importación de la app
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    
     # Configuración optimizada de uvicorn para evitar timeouts
     config = {
-        "app": app,
+        "app": "optimized_server:app" if workers > 1 else app,
         "host": "0.0.0.0",
         "port": 8000,
         "timeout_keep_alive": 120,  # 2 minutos
@@ -760,7 +789,7 @@ if __name__ == "__main__":
         "log_level": "info",
         "loop": "auto",
         "reload": False,  # Desactivar reload en producción
-        "workers": 1,  # Un solo worker para evitar conflictos de puerto
+        "workers": workers,  # WEB_CONCURRENCY; uvicorn reparte el puerto entre procesos
     }
     
     print("🚀 Iniciando Silhouette Unified V4.0 Server...")
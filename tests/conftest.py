@@ -0,0 +1,24 @@
+"""Entorno aislado para los tests: datos en un directorio temporal y sin vigilantes"""
+import os
+import tempfile
+
+_DATA = tempfile.mkdtemp(prefix="silhouette-tests-")
+
+for name, value in {
+    "SETTINGS_ENV_FILE": os.path.join(_DATA, ".env"),
+    "SETTINGS_RELOAD_INTERVAL": "0",
+    "SESSION_DB_PATH": os.path.join(_DATA, "sessions.db"),
+    "USAGE_DB_PATH": os.path.join(_DATA, "usage.db"),
+    "BATCH_JOBS_DIR": os.path.join(_DATA, "batch_jobs"),
+    "IMAGE_PROXY_DIR": os.path.join(_DATA, "thumbnails"),
+    "STATIC_CACHE_DIR": os.path.join(_DATA, "static_cache"),
+    "BROWSER_SLOTS_DIR": os.path.join(_DATA, "browser_slots"),
+    "PROMPT_TEMPLATES_DIR": os.path.join(_DATA, "prompts"),
+    "SHARED_STATE_ENABLED": "false",
+    "BROWSER_STARTUP": "lazy",
+    "LOOP_MONITOR_ENABLED": "false",
+    "OPENROUTER_API_KEY": "test",
+    "SERPER_API_KEY": "test",
+    "UNSPLASH_ACCESS_KEY": "test",
+}.items():
+    os.environ[name] = value
@@ -0,0 +1,75 @@
+"""Lotes de chat: validación de la entrada y fallos aislados por prompt"""
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from chroma_agent.batch_jobs import BatchJobManager, parse_prompts, COMPLETED
+
+
+class FakeEngine:
+    """ChatEngine mínimo: falla con una excepción en los prompts que contienen 'boom'"""
+
+    def __init__(self):
+        self.router = SimpleNamespace(stats={}, candidates=lambda policy=None: ["test/model"])
+
+    async def complete(self, messages, model=None, max_tokens=1000, policy=None):
+        if "boom" in messages[-1]["content"]:
+            raise AttributeError("'str' object has no attribute 'get'")
+        return {"success": True, "response": messages[-1]["content"].upper(), "model": "test/model"}
+
+
+class FakeAdmission:
+    model_rate = key_rate = 100.0
+
+    async def admit(self, model, client, priority):
+        return None
+
+
+@pytest.mark.parametrize("item", [
+    {"messages": "hola"},
+    {"messages": []},
+    {"messages": [{"role": "user"}]},
+    {"messages": [{"role": "user", "content": 5}]},
+    {"messages": ["hola"]},
+    {"message": 5},
+    {"message": "hola", "model": 3},
+    7,
+])
+def test_parse_prompts_rejects_malformed_items(item):
+    with pytest.raises(ValueError):
+        parse_prompts([item])
+
+
+def test_parse_prompts_normalizes_text_and_messages():
+    prompts = parse_prompts(["hola", {"id": "x", "messages": [{"role": "user", "content": "adiós"}]}])
+    assert [p["id"] for p in prompts] == ["0", "x"]
+    assert prompts[0]["messages"] == [{"role": "user", "content": "hola"}]
+
+
+def test_failing_prompt_does_not_fail_the_job(tmp_path):
+    async def scenario():
+        manager = BatchJobManager(
+            jobs_dir=str(tmp_path), engine=FakeEngine(), admission=FakeAdmission(), checkpoint_interval=0
+        )
+        job = await manager.create(["uno", "boom", "tres"], "cliente")
+        await job.task
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.meta["status"] == COMPLETED
+    assert (job.meta["completed"], job.meta["failed"]) == (2, 1)
+    lines = [json.loads(line) for line in job.results_path.read_text().splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2]
+    failed = next(line for line in lines if line["index"] == 1)
+    assert failed["success"] is False and "attribute" in failed["error"]
+    meta = json.loads((job.directory / "meta.json").read_text())
+    assert meta["status"] == COMPLETED and "api_key" not in meta
+
+
+def test_create_validates_max_tokens(tmp_path):
+    manager = BatchJobManager(jobs_dir=str(tmp_path), engine=FakeEngine(), admission=FakeAdmission())
+    for max_tokens in (0, 10 ** 6, "9", True):
+        with pytest.raises(ValueError):
+            asyncio.run(manager.create(["hola"], "cliente", max_tokens=max_tokens))
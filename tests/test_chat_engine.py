@@ -0,0 +1,84 @@
+"""Motor de chat: fallback solo ante fallos transitorios del upstream"""
+import asyncio
+
+import aiohttp
+import pytest
+
+from chroma_agent import chat_engine as chat_engine_module
+from chroma_agent.chat_engine import ChatEngine
+from chroma_agent.model_router import ModelRouter
+from chroma_agent.resilience import CircuitOpenError
+
+MODELS = ["model/a", "model/b"]
+
+
+class FakeGuard:
+    """Guarda que devuelve un estado fijo (o lanza) sin hacer la petición"""
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    async def call(self, request):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        if self.outcome == 200:
+            return 200, {"choices": [{"message": {"content": "ok"}}], "usage": {}}
+        return self.outcome, None
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = ChatEngine()
+    engine.router = ModelRouter(allowed_models=list(MODELS))
+    engine.cache = None
+    engine.outcomes = {}
+    monkeypatch.setattr(chat_engine_module, "model_guard", lambda model: FakeGuard(engine.outcomes[model]))
+    return engine
+
+
+def complete(engine):
+    return asyncio.run(engine.complete([{"role": "user", "content": "hola"}]))
+
+
+@pytest.mark.parametrize("outcome", [500, 503, 429, asyncio.TimeoutError(), aiohttp.ClientConnectionError("reset")])
+def test_transient_failure_falls_back(engine, outcome):
+    engine.outcomes = {"model/a": outcome, "model/b": 200}
+    result = complete(engine)
+    assert result["success"] and result["model"] == "model/b"
+    assert result["fallback_from"] == ["model/a"]
+    assert engine.router.stats["model/a"].failures == 1
+
+
+@pytest.mark.parametrize("status", [400, 401, 413])
+def test_client_error_does_not_fall_back(engine, status):
+    engine.outcomes = {"model/a": status, "model/b": 200}
+    result = complete(engine)
+    assert not result["success"] and result["model"] == "model/a"
+    assert result["error"] == f"API error: {status}"
+    assert "fallback_from" not in result
+    assert engine.router.stats["model/a"].calls == 0
+    assert engine.router.stats["model/b"].calls == 0
+
+
+def test_open_circuit_falls_back_without_recording(engine):
+    engine.outcomes = {"model/a": CircuitOpenError("openrouter:model/a", 5.0), "model/b": 200}
+    result = complete(engine)
+    assert result["success"] and result["fallback_from"] == ["model/a"]
+    assert engine.router.stats["model/a"].calls == 0
+
+
+def test_stream_stops_on_client_error(engine):
+    calls = []
+
+    async def stream_with(model, messages):
+        calls.append(model)
+        yield {"type": "error", "error": "API error: 401", "retryable": False, "model": model}
+
+    engine._stream_with = stream_with
+
+    async def collect():
+        return [event async for event in engine.chat_stream("hola")]
+
+    events = asyncio.run(collect())
+    assert calls == ["model/a"]
+    assert events == [{"type": "error", "error": "API error: 401", "retryable": False, "model": "model/a"}]
@@ -0,0 +1,36 @@
+"""Plantillas de prompts: variables con nombres de parámetros del registro"""
+import pytest
+
+from chroma_agent.prompt_templates import PromptRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = PromptRegistry()
+    registry.register("team", "Equipo {team}. Objetivo: {goal}")
+    registry.register("reserved", "Modelo {model}, nombre {name}, mensaje {user_message}")
+    return registry
+
+
+def test_messages_renders_system_and_user(registry):
+    messages = registry.messages("team", "hola", "openai/gpt-4o", {"team": "datos", "goal": "informe"})
+    assert messages == [
+        {"role": "system", "content": "Equipo datos. Objetivo: informe"},
+        {"role": "user", "content": "hola"}
+    ]
+
+
+def test_variables_named_like_parameters_do_not_collide(registry):
+    variables = {"model": "m", "name": "n", "user_message": "u"}
+    messages = registry.messages("reserved", "hola", "openai/gpt-4o", variables)
+    assert messages[0]["content"] == "Modelo m, nombre n, mensaje u"
+
+
+def test_reserved_name_as_unknown_variable_is_a_value_error(registry):
+    with pytest.raises(ValueError):
+        registry.messages("team", "hola", "openai/gpt-4o", {"team": "a", "goal": "b", "model": "x"})
+
+
+def test_unknown_template_is_a_key_error(registry):
+    with pytest.raises(KeyError):
+        registry.messages("nope", "hola")
@@ -0,0 +1,33 @@
+"""Normalización de consultas: claves de cache y casi duplicados"""
+from chroma_agent.query_normalizer import QueryCache, canonicalize_query
+
+
+def test_equivalent_queries_share_key():
+    assert canonicalize_query("Restaurantes  en Madrid") == canonicalize_query("madrid restaurantes")
+    assert canonicalize_query("Café de Colombia") == canonicalize_query("cafe colombia")
+
+
+def test_negation_changes_key():
+    assert canonicalize_query("restaurantes sin gluten") != canonicalize_query("restaurantes gluten")
+    assert canonicalize_query("hoteles no fumadores") != canonicalize_query("hoteles fumadores")
+    assert canonicalize_query("not found") != canonicalize_query("found")
+
+
+def test_negation_is_not_near_duplicate():
+    cache = QueryCache(near_duplicate_threshold=0.5)
+    cache.set("restaurantes gluten", "con gluten")
+    assert cache.get("restaurantes sin gluten") is None
+    cache.set("restaurantes sin gluten", "sin gluten")
+    assert cache.get("restaurantes sin gluten") == "sin gluten"
+    assert cache.get("restaurantes gluten") == "con gluten"
+
+
+def test_direction_is_kept():
+    assert canonicalize_query("vuelos desde madrid a paris") != canonicalize_query("vuelos desde paris a madrid")
+    assert canonicalize_query("flights from london to rome") != canonicalize_query("flights from rome to london")
+    assert canonicalize_query("Vuelos desde Madrid a París") == canonicalize_query("vuelos desde madrid a paris")
+
+
+def test_repeated_words_are_kept():
+    assert canonicalize_query("bora bora") != canonicalize_query("bora")
+    assert canonicalize_query("hoteles en Bora Bora") == canonicalize_query("bora bora hoteles")
@@ -0,0 +1,26 @@
+"""Cache de respuestas de chat: aciertos semánticos y negaciones"""
+from chroma_agent.response_cache import ChatResponseCache
+
+PARAMS = {"max_tokens": 100}
+
+
+def ask(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_semantic_hit_for_paraphrase():
+    cache = ChatResponseCache(semantic_threshold=0.5)
+    cache.set("m", ask("receta de pan casero con masa madre"), PARAMS, {"response": "pan"})
+    hit = cache.get("m", ask("receta de pan casero con masa madre rápida"), PARAMS)
+    assert hit is not None and hit["cache"] == "semantic"
+
+
+def test_negation_is_not_semantic_hit():
+    cache = ChatResponseCache(semantic_threshold=0.5)
+    cache.set("m", ask("receta de pan casero con gluten"), PARAMS, {"response": "con gluten"})
+    assert cache.get("m", ask("receta de pan casero sin gluten"), PARAMS) is None
+
+    cache.set("m", ask("receta de pan casero sin gluten"), PARAMS, {"response": "sin gluten"})
+    hit = cache.get("m", ask("receta de pan casero sin gluten, por favor"), PARAMS)
+    assert hit["response"] == "sin gluten"
+    assert cache.get("m", ask("receta pan casero con gluten por favor"), PARAMS)["response"] == "con gluten"
@@ -0,0 +1,61 @@
+"""Validación de entrada de los endpoints: errores del cliente son 400, nunca 500"""
+import pytest
+from fastapi.testclient import TestClient
+
+from chroma_agent.server import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Sin lifespan: solo se ejercita la validación, que responde antes de llamar a upstreams
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("variables", [
+    {"team": "a", "goal": "b", "model": "x"},
+    {"team": "a", "goal": "b", "name": "x"},
+    {"team": "a", "goal": "b", "user_message": "x"},
+    [1],
+    "texto",
+])
+def test_chat_template_variables_are_validated(client, variables):
+    response = client.post("/api/chat/real", json={"message": "hola", "template": "team", "variables": variables})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("body", [
+    1,
+    {"prompts": "abc"},
+    {"prompts": [{"messages": "hi"}]},
+    {"prompts": ["a"], "max_tokens": 0},
+])
+def test_batch_job_input_is_validated(client, body):
+    assert client.post("/api/chat/lotes", json=body).status_code == 400
+
+
+@pytest.mark.parametrize("images", [
+    [5],
+    [None],
+    [""],
+    [{"id": "sin-url"}],
+    [{"urls": "https://images.example/a.jpg"}],
+    [{"url": 5}],
+    ["https://images.example/a.jpg", ["https://images.example/b.jpg"]],
+])
+def test_dedup_images_items_are_validated(client, images):
+    assert client.post("/api/imagenes/dedup", json={"images": images}).status_code == 400
+
+
+def test_dedup_images_accepts_urls_and_objects(client, monkeypatch):
+    from chroma_agent import server
+
+    async def score(images):
+        return {"images": images, "duplicates": [], "failed": []}
+
+    monkeypatch.setattr(server.image_scorer, "score", score)
+    response = client.post("/api/imagenes/dedup", json={"images": [
+        "https://images.example/a.jpg",
+        {"id": "b", "urls": {"small": "https://images.example/b.jpg"}},
+    ]})
+    assert response.status_code == 200
+    assert response.json()["images"][0] == {"url": "https://images.example/a.jpg"}
@@ -0,0 +1,40 @@
+"""Sesiones: el turno del usuario solo se guarda si el modelo responde"""
+import asyncio
+
+from chroma_agent.session_store import SessionManager, SessionStore
+
+
+class FlakyEngine:
+    """ChatEngine mínimo que falla en la primera llamada"""
+
+    default_model = "test/model"
+
+    def __init__(self):
+        self.calls = []
+
+    async def complete(self, messages, model=None, **kwargs):
+        self.calls.append(messages)
+        if len(self.calls) == 1:
+            return {"success": False, "error": "upstream 503"}
+        return {"success": True, "response": "respuesta", "model": "test/model"}
+
+
+def test_failed_send_does_not_duplicate_user_turn(tmp_path):
+    async def scenario():
+        engine = FlakyEngine()
+        manager = SessionManager(SessionStore(str(tmp_path / "sessions.db")), engine)
+        session_id = await manager.store.create(system_prompt="sé breve")
+        try:
+            failed = await manager.send(session_id, "hola")
+            assert not failed["success"]
+            assert await manager.store.turns(session_id) == []
+
+            ok = await manager.send(session_id, "hola")
+            assert ok["success"]
+            turns = await manager.store.turns(session_id)
+            assert [(t["role"], t["content"]) for t in turns] == [("user", "hola"), ("assistant", "respuesta")]
+            assert [m["content"] for m in engine.calls[1]] == ["sé breve", "hola"]
+        finally:
+            await manager.close()
+
+    asyncio.run(scenario())
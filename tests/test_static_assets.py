@@ -0,0 +1,72 @@
+"""Archivos estáticos: precompresión, ETag y archivos modificados en disco"""
+import os
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from chroma_agent.static_assets import StaticAssets
+
+
+def make_request(**headers):
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "query_string": b"",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def get(assets, name, **headers):
+    return asyncio.run(assets.response(name, make_request(**headers)))
+
+
+@pytest.fixture
+def assets(tmp_path):
+    directory = tmp_path / "web"
+    directory.mkdir()
+    return StaticAssets(str(directory), max_memory_bytes=1024, cache_dir=str(tmp_path / "cache"), check_interval=0)
+
+
+def test_gzip_variant_and_not_modified(assets):
+    (assets.directory / "app.js").write_text("console.log('hola');\n" * 100)
+    response = get(assets, "app.js", accept_encoding="gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert get(assets, "app.js", accept_encoding="gzip", if_none_match=etag).status_code == 304
+
+
+@pytest.mark.parametrize("size", [10, 4096])
+def test_modified_file_is_served_fresh(assets, size):
+    path = assets.directory / "index.html"
+    path.write_bytes(b"a" * size)
+    first = get(assets, "index.html")
+
+    path.write_bytes(b"b" * size)
+    stat = path.stat()
+    # Mismo tamaño: el cambio se detecta por mtime
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = get(assets, "index.html")
+    assert second.headers["etag"] != first.headers["etag"]
+    if size <= assets.max_memory_bytes:
+        assert second.body == b"b" * size
+    assert get(assets, "index.html", if_none_match=first.headers["etag"]).status_code == 200
+
+
+def test_deleted_file_is_not_found(assets):
+    path = assets.directory / "old.css"
+    path.write_text("body {}")
+    assert get(assets, "old.css").status_code == 200
+    path.unlink()
+    assert get(assets, "old.css").status_code == 404
+    assert "old.css" not in assets.assets
+
+
+def test_check_interval_throttles_stat(assets):
+    assets.check_interval = 3600
+    path = assets.directory / "index.html"
+    path.write_text("uno")
+    first = get(assets, "index.html")
+    path.write_text("dos!")
+    assert get(assets, "index.html").headers["etag"] == first.headers["etag"]
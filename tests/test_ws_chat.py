@@ -0,0 +1,47 @@
+"""Chat por WebSocket: la admisión usa la misma clave de cliente que HTTP"""
+import asyncio
+from types import SimpleNamespace
+
+from chroma_agent.admission import client_digest
+from chroma_agent.ws_chat import ChatMultiplexer
+
+
+class FakeWebSocket:
+    def __init__(self, headers):
+        self.headers = headers
+        self.client = SimpleNamespace(host="10.0.0.1")
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+class FakeEngine:
+    router = SimpleNamespace(candidates=lambda policy=None: ["test/model"])
+
+    async def chat_stream(self, message, model=None, policy=None):
+        yield {"type": "done", "model": "test/model"}
+
+
+class RecordingAdmission:
+    def __init__(self):
+        self.clients = []
+
+    async def admit(self, model, client, priority):
+        self.clients.append(client)
+
+
+def admitted_client(headers):
+    admission = RecordingAdmission()
+    mux = ChatMultiplexer(FakeWebSocket(headers), FakeEngine(), admission=admission)
+    asyncio.run(mux._stream("m1", "hola"))
+    return admission.clients[0]
+
+
+def test_admission_keyed_on_api_key_digest():
+    assert admitted_client({"x-api-key": "secreta"}) == client_digest("secreta")
+    assert admitted_client({"authorization": "Bearer abc"}) == client_digest("Bearer abc")
+
+
+def test_admission_falls_back_to_ip_digest():
+    assert admitted_client({}) == client_digest("10.0.0.1")